@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增强管道注册表
+增强管道在 augment_pipelines.json（或 YAML）中声明，按名称编译成 albumentations 管道并缓存，
+各脚本通过名称取用，不再在代码里硬编码 A.Compose。
+
+规格格式:
+    {
+      "pipelines": {
+        "名称": {
+          "description": "说明",
+          "transforms": [
+            {"type": "Affine", "rotate": [-5, 5], "interpolation": "$interpolation", "p": 0.5},
+            {"type": "OneOf", "p": 0.5, "transforms": [...]}
+          ]
+        }
+      },
+      "sets": {"集合名": ["名称", ...]}
+    }
+
+    - type 为 albumentations 中的类名，其余字段作为构造参数
+    - "$interpolation" 替换为当前质量档位的 OpenCV 插值方式
+    - 规格文件路径可由环境变量 ICDATASET_AUGMENT_SPEC 指定
+
+命令行选择管道和权重: "轻微变换:2 中等变换 综合效果:0.5"（不写权重时为 1）
+"""
+
+import json
+import os
+import random
+
+import albumentations as A
+
+import quality_presets
+
+DEFAULT_SPEC_PATH = os.environ.get(
+    "ICDATASET_AUGMENT_SPEC", os.path.join(os.path.dirname(os.path.abspath(__file__)), "augment_pipelines.json"))
+
+# 规格中的占位符 -> 取值函数
+PLACEHOLDERS = {
+    "$interpolation": lambda: quality_presets.get_preset().cv2_interpolation_flag,
+}
+
+
+def load_spec_file(path):
+    """读取 JSON 或 YAML 规格文件"""
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("读取 YAML 规格需要安装 PyYAML: pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _resolve(value):
+    if isinstance(value, str) and value in PLACEHOLDERS:
+        return PLACEHOLDERS[value]()
+    return value
+
+
+def compile_transform(node):
+    """把一个变换节点编译成 albumentations 变换（OneOf/SomeOf/Sequential 等递归编译子变换）"""
+    params = dict(node)
+    type_name = params.pop("type")
+    transform_class = getattr(A, type_name, None)
+    if transform_class is None:
+        raise ValueError(f"未知的增强类型: {type_name}")
+    if "transforms" in params:
+        params["transforms"] = [compile_transform(child) for child in params["transforms"]]
+    return transform_class(**{key: _resolve(value) for key, value in params.items()})
+
+
+class PipelineRegistry:
+    """
+    管道注册表
+
+    Args:
+        spec_path: 规格文件路径，None 表示不从文件加载（只使用 register 注册的管道）
+    """
+
+    def __init__(self, spec_path=None):
+        self.reload(spec_path)
+
+    def reload(self, spec_path=None):
+        """清空注册表并重新加载规格文件"""
+        self.spec_path = spec_path
+        self._specs = {}
+        self._sets = {}
+        self._compiled = {}
+        if spec_path:
+            self.load(spec_path)
+
+    def load(self, spec_path):
+        """加载规格文件中的管道，同名管道会被覆盖"""
+        spec = load_spec_file(spec_path)
+        for name, pipeline_spec in spec.get("pipelines", {}).items():
+            self.register(name, pipeline_spec)
+        self._sets.update(spec.get("sets", {}))
+
+    def register(self, name, pipeline_spec):
+        """注册一个管道规格 {'description', 'transforms': [...]}"""
+        self._specs[name] = pipeline_spec
+        self._compiled = {key: value for key, value in self._compiled.items() if key[0] != name}
+
+    def names(self):
+        return list(self._specs)
+
+    def spec(self, name):
+        if name not in self._specs:
+            raise KeyError(f"未注册的增强管道: {name}，可选: {', '.join(self._specs)}")
+        return self._specs[name]
+
+    def pipeline_set(self, name):
+        """规格文件 sets 中定义的管道名称列表"""
+        return list(self._sets[name])
+
+    def compile(self, name):
+        """编译一个新的管道对象（需要独立随机状态时使用，例如每个线程一份）"""
+        return A.Compose([compile_transform(node) for node in self.spec(name)["transforms"]])
+
+    def get(self, name):
+        """取已编译的管道，按 (名称, 质量档位) 缓存"""
+        key = (name, quality_presets.get_preset().name)
+        pipeline = self._compiled.get(key)
+        if pipeline is None:
+            pipeline = self._compiled[key] = self.compile(name)
+        return pipeline
+
+    def mix(self, weighted):
+        """按 [(名称, 权重), ...] 构建按权重随机选择管道的 PipelineMix"""
+        return PipelineMix([(name, weight, self.compile(name)) for name, weight in weighted])
+
+
+class PipelineMix:
+    """
+    按权重从多个管道中选择一个执行，接口与 A.Compose 一致（set_random_seed / __call__）
+    设置种子时同时决定本次使用的管道，相同种子总是选中同一个管道
+    """
+
+    def __init__(self, pipelines):
+        if not pipelines:
+            raise ValueError("至少需要一个增强管道")
+        self.pipelines = pipelines
+        self._current = pipelines[0]
+
+    @property
+    def current_name(self):
+        return self._current[0]
+
+    def _choose(self, rng):
+        weights = [weight for _, weight, _ in self.pipelines]
+        return rng.choices(self.pipelines, weights=weights)[0]
+
+    def pick_name(self, seed):
+        """按种子选择的管道名称，与 set_random_seed 的选择一致"""
+        if len(self.pipelines) == 1:
+            return self.pipelines[0][0]
+        return self._choose(random.Random(seed))[0]
+
+    def set_random_seed(self, seed):
+        if len(self.pipelines) > 1:
+            self._current = self._choose(random.Random(seed))
+        pipeline = self._current[2]
+        if hasattr(pipeline, "set_random_seed"):
+            pipeline.set_random_seed(seed)
+
+    def __call__(self, **data):
+        return self._current[2](**data)
+
+    def to_dict(self):
+        """用于计算配置哈希；单个管道时与 A.to_dict(管道) 相同"""
+        if len(self.pipelines) == 1:
+            return A.to_dict(self.pipelines[0][2])
+        return {"mix": [{"name": name, "weight": weight, "pipeline": A.to_dict(pipeline)}
+                        for name, weight, pipeline in self.pipelines]}
+
+
+def parse_weighted(values):
+    """
+    解析命令行的管道选择 ["轻微变换:2", "中等变换"] -> [("轻微变换", 2.0), ("中等变换", 1.0)]
+    """
+    weighted = []
+    for value in values:
+        name, _, weight = value.rpartition(":") if ":" in value else (value, "", "1")
+        weighted.append((name, float(weight)))
+    return weighted
+
+
+registry = PipelineRegistry(DEFAULT_SPEC_PATH)
+
+
+def use_spec(spec_path):
+    """改用指定的规格文件（脚本的 --spec 参数）"""
+    registry.reload(spec_path)
+    return registry
+
+
+def get_pipeline(name):
+    """从当前注册表取已编译的管道"""
+    return registry.get(name)
+
+
+if __name__ == "__main__":
+    for pipeline_name in registry.names():
+        print(f"{pipeline_name}: {registry.spec(pipeline_name).get('description', '')}")
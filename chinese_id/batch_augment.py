@@ -1,185 +1,586 @@
 import albumentations as A
+import argparse
 import cv2
+import hashlib
+import json
 import os
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import numpy as np
+import augment_registry
+import batch_kernels
+import image_io
+import quality_presets
+from stage_pipeline import Stage, StagePipeline
 
 # 设置环境变量解决OpenMP问题
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 
-# 定义一个简化的增强管道
-transform = A.Compose([
-    A.Affine(rotate=(-5, 5), p=0.5),
-    A.GaussianBlur(blur_limit=(3, 5), p=0.3),
-    A.GaussNoise(p=0.2),
-    A.ColorJitter(brightness=0.2, contrast=0.2, p=0.5),
-])
+IMAGE_SUFFIXES = ['.jpg', '.jpeg', '.png']
+
+# 每个用户输出目录下的增强清单，记录每个增强文件对应的源图片哈希和增强配置哈希
+AUGMENT_MANIFEST = '.augment_manifest.json'
+MANIFEST_VERSION = 1
+
+# augment_pipelines.json 中的默认管道
+DEFAULT_PIPELINE = 'batch_augment'
+
+# 增强引擎: auto 在管道全部由 batch_kernels 支持时使用批量内核，否则逐张 albumentations
+ENGINES = ('auto', 'albumentations', 'batched')
+
+def build_transform(pipelines=None):
+    """
+    构建增强管道（规格见 augment_pipelines.json，插值方式跟随当前质量档位）
+    
+    Args:
+        pipelines: [(管道名称, 权重), ...]，多个管道时每个增强版本按种子和权重选择其一，默认只用 batch_augment
+    """
+    return augment_registry.registry.mix(pipelines or [(DEFAULT_PIPELINE, 1.0)])
+
+transform = build_transform()
+
+def variant_seed(base_seed, person_name, image_name, index):
+    """
+    由 (基础种子, 用户, 文件名, 版本号) 派生稳定的随机种子
+    与处理顺序、进程无关，并行和串行生成的图片完全一致
+    """
+    key = f"{base_seed}/{person_name}/{image_name}/{index}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=4).digest(), "little")
+
+def seed_transform(pipeline, seed):
+    """为下一次增强设置种子"""
+    random.seed(seed)
+    np.random.seed(seed)
+    # albumentations 2.x 的管道使用自己的随机数生成器
+    if hasattr(pipeline, "set_random_seed"):
+        pipeline.set_random_seed(seed)
 
 # 应用增强
-def augment_image(image):
-    augmented = transform(image=image)
+def augment_image(image, pipeline=None, seed=None):
+    pipeline = pipeline or transform
+    if seed is not None:
+        seed_transform(pipeline, seed)
+    augmented = pipeline(image=image)
     return augmented['image']
 
-def read_image_safe(image_path):
+def build_augmenters(pipeline, engine):
     """
-    安全地读取图片，处理编码问题
+    按引擎构建批量增强内核，逐张模式或管道含不支持的变换时返回 None（回退到 albumentations）
     """
-    try:
-        # 方法1: 使用numpy读取（在Windows中文路径下最可靠）
-        try:
-            image_data = np.fromfile(str(image_path), dtype=np.uint8)
-            image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-            if image is not None:
-                return image
-        except:
-            pass
-        
-        # 方法2: 直接使用cv2.imread
-        image = cv2.imread(str(image_path))
-        if image is not None:
-            return image
-        
-        # 方法3: 使用绝对路径
-        abs_path = os.path.abspath(str(image_path))
-        image = cv2.imread(abs_path)
-        if image is not None:
-            return image
-        
+    if engine == 'albumentations':
         return None
-    except Exception as e:
-        print(f"      ❌ 读取图片失败: {e}")
+    try:
+        return batch_kernels.build_augmenters(pipeline)
+    except batch_kernels.UnsupportedTransform as e:
+        if engine == 'batched':
+            print(f"   ⚠️  {e}，回退到逐张 albumentations 增强")
         return None
 
+def augment_variants(image, seeds, pipeline, augmenters=None):
+    """
+    按种子列表生成同一张图片的多个增强版本
+
+    Args:
+        augmenters: build_augmenters 的返回值，None 表示逐张调用 albumentations
+    """
+    if augmenters is not None:
+        return batch_kernels.augment_images([image] * len(seeds), seeds, augmenters, pipeline)
+    return [augment_image(image, pipeline, seed) for seed in seeds]
+
+def parse_size(value):
+    """解析命令行尺寸 '1024x768' -> (1024, 768)"""
+    width, height = (int(v) for v in value.lower().split('x'))
+    return width, height
+
+def encode_png(image):
+    """按当前质量档位把 BGR 图片编码为 PNG 字节，失败返回 None"""
+    encode_param = [int(cv2.IMWRITE_PNG_COMPRESSION), quality_presets.get_preset().cv2_png_compression]
+    result, encoded_img = cv2.imencode('.png', image, encode_param)
+    return encoded_img.tobytes() if result else None
+
 def save_image_safe(image, output_path):
     """安全地保存图片"""
     try:
         # 使用numpy编码保存
-        encode_param = [int(cv2.IMWRITE_PNG_COMPRESSION), 9]
-        result, encoded_img = cv2.imencode('.png', image, encode_param)
+        data = encode_png(image)
         
-        if result:
-            with open(output_path, 'wb') as f:
-                f.write(encoded_img.tobytes())
+        if data is not None:
+            image_io.write_bytes(output_path, data)
             return True
         else:
             return False
     except Exception as e:
         return False
 
-def batch_augment_images(input_dir, output_dir, num_augmentations=3, max_users=3):
+def file_hash(path):
+    """文件内容哈希"""
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+def transform_spec_hash(pipeline, seed, engine='albumentations', target_size=None):
     """
-    批量增强图片，按姓名存储
-    
-    Args:
-        input_dir: 输入图片目录（chinese_ids目录）
-        output_dir: 输出图片目录
-        num_augmentations: 每张图片生成的增强版本数量
-        max_users: 最大处理用户数量（用于测试）
+    增强配置哈希：管道定义（含 albumentations 版本）、随机种子、PNG 压缩级别、增强引擎和目标尺寸
+    任何一项变化都会使已有的增强文件失效
     """
-    # 使用Path对象处理路径，避免编码问题
-    input_path = Path(input_dir)
-    output_path = Path(output_dir)
+    spec = {
+        "pipeline": pipeline.to_dict() if hasattr(pipeline, "to_dict") else A.to_dict(pipeline),
+        "seed": seed,
+        "png_compression": quality_presets.get_preset().cv2_png_compression,
+    }
+    if engine == 'batched':
+        # 批量内核的随机数序列与 albumentations 不同，输出不能混用
+        spec["engine"] = {"name": engine, "kernel_version": batch_kernels.KERNEL_VERSION}
+    if target_size:
+        spec["target_size"] = list(target_size)
+    return hashlib.blake2b(json.dumps(spec, sort_keys=True, default=str).encode("utf-8"), digest_size=16).hexdigest()
+
+def output_name(image_file, index):
+    """增强版本的输出文件名"""
+    return f"{image_file.stem}_aug_{index:02d}.png"
+
+def load_augment_manifest(person_output_dir):
+    """读取用户输出目录下的增强清单，不存在或损坏时返回空清单"""
+    try:
+        with open(person_output_dir / AUGMENT_MANIFEST, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': MANIFEST_VERSION, 'sources': {}, 'outputs': {}}
+
+def save_augment_manifest(person_output_dir, manifest):
+    """先写临时文件再替换，中断时不会留下半个清单"""
+    path = person_output_dir / AUGMENT_MANIFEST
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def source_hash(image_file, manifest):
+    """源图片内容哈希；文件大小和修改时间未变时直接使用清单中记录的值"""
+    stat = image_file.stat()
+    cached = manifest['sources'].get(image_file.name)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['hash']
+    digest = file_hash(image_file)
+    manifest['sources'][image_file.name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest}
+    return digest
+
+def record_output(manifest, image_file, digest, spec_hash, index):
+    """记录一个已写出的增强版本"""
+    manifest['outputs'][output_name(image_file, index)] = {
+        'source': image_file.name, 'source_hash': digest, 'spec_hash': spec_hash, 'index': index}
+
+def plan_person(person_dir, person_output_dir, num_augmentations, spec_hash, gc=True):
+    """
+    对比清单和源图片，找出缺失或过期的增强版本，并清理孤立的输出文件
     
-    # 创建输出目录
-    output_path.mkdir(exist_ok=True)
+    Returns:
+        tuple: ([(源图片, 内容哈希, [待生成的版本号, ...]), ...], 清单, 清理的文件数)
+    """
+    manifest = load_augment_manifest(person_output_dir)
+    image_files = sorted(f for f in person_dir.iterdir() if f.suffix.lower() in IMAGE_SUFFIXES)
+    existing = {f.name for f in person_output_dir.iterdir() if f.is_file()}
     
-    print(f"🔍 扫描目录: {input_path}")
-    print(f"📁 输出目录: {output_path}")
-    print(f"🎯 每张图片生成 {num_augmentations} 个增强版本")
-    print(f"👥 最大处理用户数: {max_users}")
+    tasks = []
+    expected = set()
+    for image_file in image_files:
+        digest = source_hash(image_file, manifest)
+        stale = []
+        for index in range(1, num_augmentations + 1):
+            name = output_name(image_file, index)
+            expected.add(name)
+            entry = manifest['outputs'].get(name)
+            if (name not in existing or not entry or entry['source'] != image_file.name
+                    or entry['source_hash'] != digest or entry['spec_hash'] != spec_hash):
+                stale.append(index)
+        if stale:
+            tasks.append((image_file, digest, stale))
     
-    total_generated = 0
-    total_processed = 0
-    user_count = 0
+    source_names = {f.name for f in image_files}
+    manifest['sources'] = {name: info for name, info in manifest['sources'].items() if name in source_names}
     
-    # 遍历chinese_ids目录下的所有姓名子目录
+    removed = 0
+    if gc:
+        # 源图片被删除、或 num_augmentations 调小后多出来的增强文件
+        for name in existing:
+            if '_aug_' in name and name not in expected:
+                (person_output_dir / name).unlink()
+                removed += 1
+        manifest['outputs'] = {name: entry for name, entry in manifest['outputs'].items() if name in expected}
+    return tasks, manifest, removed
+
+def remove_orphan_person_dirs(input_path, output_path):
+    """删除源用户目录已不存在的增强输出（只删除清单中记录的文件），返回清理的文件数"""
+    removed = 0
+    for person_output_dir in output_path.iterdir():
+        if not person_output_dir.is_dir() or (input_path / person_output_dir.name).is_dir():
+            continue
+        if not (person_output_dir / AUGMENT_MANIFEST).exists():
+            continue
+        manifest = load_augment_manifest(person_output_dir)
+        for name in manifest['outputs']:
+            path = person_output_dir / name
+            if path.exists():
+                path.unlink()
+                removed += 1
+        (person_output_dir / AUGMENT_MANIFEST).unlink()
+        if not any(person_output_dir.iterdir()):
+            person_output_dir.rmdir()
+        print(f"   🗑️  源目录已不存在，清理用户 {person_output_dir.name} 的增强文件")
+    return removed
+
+def collect_person_jobs(input_path, output_path, max_users, num_augmentations, spec_hash, gc=True):
+    """
+    扫描用户目录，返回待处理的 [(用户目录, 输出目录, 任务列表, 清单), ...] 和清理的文件数
+    增强文件都是最新的、或没有图片的用户不计入 max_users
+    """
+    jobs = []
+    removed = remove_orphan_person_dirs(input_path, output_path) if gc else 0
     for person_dir in input_path.iterdir():
         if not person_dir.is_dir():
             continue
             
         # 限制处理用户数量
-        if user_count >= max_users:
+        if len(jobs) >= max_users:
             print(f"\n⏹️  已达到最大用户数量限制 ({max_users})")
             break
             
         person_name = person_dir.name
-        print(f"\n👤 处理用户: {person_name}")
         
         # 为每个用户创建对应的输出目录
         person_output_dir = output_path / person_name
         person_output_dir.mkdir(exist_ok=True)
-        print(f"📁 创建用户目录: {person_output_dir}")
-        
-        # 检查是否已经有增强文件
-        existing_files = [f for f in person_output_dir.iterdir() if f.is_file() and '_aug_' in f.name]
-        if existing_files:
-            print(f"   ⏭️  用户 {person_name} 已有增强文件 ({len(existing_files)} 个)，跳过处理")
-            continue
-            
-        # 获取该用户目录下的所有图片文件
-        image_files = [f for f in person_dir.iterdir() if f.suffix.lower() in ['.jpg', '.jpeg', '.png']]
         
-        if not image_files:
+        # 对比清单，找出缺失或过期的增强版本
+        tasks, manifest, person_removed = plan_person(person_dir, person_output_dir, num_augmentations, spec_hash, gc)
+        removed += person_removed
+        if not manifest['sources']:
             print(f"   ⚠️  用户 {person_name} 目录下没有找到图片文件")
             continue
+        if not tasks:
+            # 保存源文件哈希缓存和清理结果
+            save_augment_manifest(person_output_dir, manifest)
+            print(f"   ⏭️  用户 {person_name} 的增强文件都是最新的，跳过处理")
+            continue
             
-        print(f"   📸 找到 {len(image_files)} 张图片")
+        jobs.append((person_dir, person_output_dir, tasks, manifest))
+    return jobs, removed
+
+def augment_person(person_dir, person_output_dir, tasks, manifest, spec_hash, seed, pipeline, verbose=True,
+                   augmenters=None, target_size=None):
+    """
+    为一个用户生成缺失或过期的增强版本，并更新清单
+    
+    Args:
+        augmenters: 批量增强内核（build_augmenters），None 表示逐张增强
+        target_size: (宽, 高)，源图片先缩小到该尺寸以内再增强
+    
+    Returns:
+        dict: {'person', 'processed', 'generated', 'failed'}
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    stats = {'person': person_dir.name, 'processed': 0, 'generated': 0, 'failed': 0}
+    
+    log(f"\n👤 处理用户: {person_dir.name}")
+    log(f"   📸 {len(tasks)} 张图片需要生成增强版本")
+    
+    # 先读取该用户的所有图片；批量模式下所有源图片的所有版本一次增强
+    loaded = []
+    for i, (image_file, digest, indices) in enumerate(tasks, 1):
+        log(f"    读取第 {i}/{len(tasks)} 张: {image_file.name}")
+        # 一次读取、一次解码（见 image_io）
+        image = image_io.read_image(image_file, target_size)
+        if image is None:
+            print(f"      ❌ 无法读取图片 {person_dir.name}/{image_file.name}")
+            stats['failed'] += 1
+            continue
+        # 每个版本使用独立的确定性种子
+        seeds = [variant_seed(seed, person_dir.name, image_file.name, j) for j in indices]
+        loaded.append((image_file, digest, indices, cv2.cvtColor(image, cv2.COLOR_BGR2RGB), seeds))
+    
+    batch = None
+    if augmenters is not None and loaded:
+        images = [image_rgb for _, _, indices, image_rgb, _ in loaded for _ in indices]
+        try:
+            batch = iter(batch_kernels.augment_images(
+                images, [s for *_, seeds in loaded for s in seeds], augmenters, pipeline))
+        except Exception as e:
+            # 逐张增强的输出与批量引擎不同，不能记在同一个配置哈希下，整个用户记为失败
+            print(f"      ❌ 批量增强失败: {e}")
+            stats['failed'] += len(images)
+            loaded = []
+    
+    for image_file, digest, indices, image_rgb, seeds in loaded:
+        log(f"    处理: {image_file.name}")
         
-        # 处理该用户的每张图片
-        for i, image_file in enumerate(image_files, 1):
-            print(f"    处理第 {i}/{len(image_files)} 张: {image_file.name}")
-            
+        # 生成缺失或过期的增强版本
+        for k, j in enumerate(indices):
             try:
-                # 使用安全的图片读取方法
-                image = read_image_safe(image_file)
-                
-                if image is None:
-                    print(f"      ❌ 无法读取图片 {image_file.name}")
-                    continue
-                    
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                # 应用增强
+                augmented_image = next(batch) if batch is not None else augment_image(image_rgb, pipeline, seeds[k])
                 
-                # 生成多个增强版本
-                for j in range(num_augmentations):
-                    try:
-                        # 应用增强
-                        augmented_image = augment_image(image_rgb)
-                        
-                        # 生成输出文件名
-                        name_without_ext = image_file.stem
-                        output_filename = f"{name_without_ext}_aug_{j+1:02d}.png"
-                        output_file_path = person_output_dir / output_filename
-                        
-                        # 保存增强后的图片
-                        if save_image_safe(cv2.cvtColor(augmented_image, cv2.COLOR_RGB2BGR), str(output_file_path)):
-                            total_generated += 1
-                            print(f"      ✅ 生成增强版本 {j+1}: {output_filename}")
-                        else:
-                            print(f"      ❌ 保存增强版本 {j+1} 失败: {output_file_path}")
-                        
-                    except Exception as e:
-                        print(f"      ❌ 生成增强版本 {j+1} 失败: {e}")
+                # 生成输出文件名
+                output_filename = output_name(image_file, j)
+                output_file_path = person_output_dir / output_filename
                 
-                total_processed += 1
+                # 保存增强后的图片
+                if save_image_safe(cv2.cvtColor(augmented_image, cv2.COLOR_RGB2BGR), str(output_file_path)):
+                    record_output(manifest, image_file, digest, spec_hash, j)
+                    stats['generated'] += 1
+                    log(f"      ✅ 生成增强版本 {j}: {output_filename}")
+                else:
+                    stats['failed'] += 1
+                    print(f"      ❌ 保存增强版本 {j} 失败: {output_file_path}")
                 
             except Exception as e:
-                print(f"      ❌ 处理图片 {image_file.name} 失败: {e}")
-                continue
+                stats['failed'] += 1
+                print(f"      ❌ 生成增强版本 {j} 失败: {e}")
         
-        user_count += 1
+        stats['processed'] += 1
+    
+    save_augment_manifest(person_output_dir, manifest)
+    return stats
+
+# 每个工作进程构建一次的增强管道和批量内核
+_worker_transform = None
+_worker_augmenters = None
+
+def _init_worker(quality, cv2_threads, spec_path, pipelines, engine='auto'):
+    """工作进程初始化：同步质量档位和管道规格、限制 OpenCV 线程数、构建增强管道"""
+    global _worker_transform, _worker_augmenters
+    quality_presets.set_preset(quality)
+    if spec_path != augment_registry.registry.spec_path:
+        augment_registry.use_spec(spec_path)
+    cv2.setNumThreads(cv2_threads)
+    _worker_transform = build_transform(pipelines)
+    _worker_augmenters = build_augmenters(_worker_transform, engine)
+
+def _augment_person_in_worker(person_dir, person_output_dir, tasks, manifest, spec_hash, seed, target_size=None):
+    stats = augment_person(person_dir, person_output_dir, tasks, manifest, spec_hash, seed,
+                           _worker_transform, verbose=False, augmenters=_worker_augmenters, target_size=target_size)
+    stats['worker'] = os.getpid()
+    stats['io'] = image_io.take_io_stats()
+    return stats
+
+def augment_jobs_pipelined(jobs, spec_hash, seed, stage_workers=None, queue_size=16, pipelines=None,
+                           engine='auto', target_size=None):
+    """
+    用 读取 → 增强 → 编码 → 写出 四阶段流水线处理所有用户
+    读盘和 PNG 压缩与增强计算重叠，阶段之间用有界队列连接
+    
+    Args:
+        jobs: collect_person_jobs 返回的任务列表
+        stage_workers: 各阶段线程数 {'read', 'augment', 'encode', 'write'}，缺省为 1
+        queue_size: 阶段之间队列的容量
+        pipelines: [(管道名称, 权重), ...]
+        engine: 增强引擎（ENGINES）
+        target_size: (宽, 高)，源图片先缩小到该尺寸以内再增强
+    
+    Returns:
+        tuple: (每个用户的统计列表, StagePipeline)
+    """
+    stage_workers = stage_workers or {}
+    processed = Counter()
+    expected = Counter()
+    generated = Counter()
+    counter_lock = threading.Lock()
+    # Compose 设置种子会修改内部状态，每个增强线程使用自己的管道
+    local = threading.local()
+    
+    def read(job):
+        person_dir, person_output_dir, image_file, digest, indices = job
+        image = image_io.read_image(image_file, target_size)
+        if image is None:
+            raise IOError(f"无法读取图片 {person_dir.name}/{image_file.name}")
+        with counter_lock:
+            processed[person_dir.name] += 1
+            expected[person_dir.name] += len(indices)
+        yield job + (cv2.cvtColor(image, cv2.COLOR_BGR2RGB),)
+    
+    def augment(item):
+        person_dir, person_output_dir, image_file, digest, indices, image_rgb = item
+        if not hasattr(local, 'pipeline'):
+            local.pipeline = build_transform(pipelines)
+            local.augmenters = build_augmenters(local.pipeline, engine)
+        seeds = [variant_seed(seed, person_dir.name, image_file.name, j) for j in indices]
+        for j, augmented_image in zip(indices, augment_variants(image_rgb, seeds, local.pipeline, local.augmenters)):
+            yield person_dir.name, person_output_dir, image_file, digest, j, \
+                cv2.cvtColor(augmented_image, cv2.COLOR_RGB2BGR)
+    
+    def encode(item):
+        image = item[-1]
+        data = encode_png(image)
+        if data is None:
+            raise IOError(f"编码失败: {item[1] / output_name(item[2], item[4])}")
+        yield item[:-1] + (data,)
+    
+    def write(item):
+        person_name, person_output_dir, image_file, digest, j, data = item
+        image_io.write_bytes(person_output_dir / output_name(image_file, j), data)
+        yield person_name, image_file, digest, j
+    
+    pipeline = StagePipeline([
+        Stage("read", read, stage_workers.get('read', 1)),
+        Stage("augment", augment, stage_workers.get('augment', 1)),
+        Stage("encode", encode, stage_workers.get('encode', 1)),
+        Stage("write", write, stage_workers.get('write', 1)),
+    ], queue_size=queue_size)
+    
+    manifests = {person_dir.name: manifest for person_dir, _, _, manifest in jobs}
+    items = ((person_dir, person_output_dir, image_file, digest, indices)
+             for person_dir, person_output_dir, tasks, _ in jobs for image_file, digest, indices in tasks)
+    for person_name, image_file, digest, j in pipeline.run(items):
+        record_output(manifests[person_name], image_file, digest, spec_hash, j)
+        generated[person_name] += 1
+    
+    results = []
+    for person_dir, person_output_dir, tasks, manifest in jobs:
+        save_augment_manifest(person_output_dir, manifest)
+        name = person_dir.name
+        # 读取失败的图片 + 已读取但未写出的增强版本
+        failed = len(tasks) - processed[name] + expected[name] - generated[name]
+        results.append({'person': name, 'processed': processed[name], 'generated': generated[name],
+                        'failed': failed})
+    return results, pipeline
+
+def batch_augment_images(input_dir, output_dir, num_augmentations=3, max_users=3, workers=1, seed=0, cv2_threads=1,
+                         stage_workers=None, queue_size=16, gc=True, pipelines=None, engine='auto',
+                         target_size=None):
+    """
+    批量增强图片，按姓名存储
+    
+    Args:
+        input_dir: 输入图片目录（chinese_ids目录）
+        output_dir: 输出图片目录
+        num_augmentations: 每张图片生成的增强版本数量
+        max_users: 最大处理用户数量（用于测试）
+        workers: 工作进程数，大于 1 时按用户目录分片并行处理
+        seed: 基础随机种子，相同种子下并行和串行的输出一致
+        cv2_threads: 并行模式下每个工作进程的 OpenCV 线程数，避免线程过度订阅
+        stage_workers: 单进程流水线模式下各阶段线程数 {'read', 'augment', 'encode', 'write'}，
+                       None 表示逐张顺序处理
+        queue_size: 流水线阶段之间队列的容量
+        gc: 清理源图片已删除或版本号超出 num_augmentations 的增强文件
+        pipelines: [(管道名称, 权重), ...]，默认只用 batch_augment 管道
+        engine: 'auto' 管道全部受 batch_kernels 支持时批量增强，否则逐张；'albumentations' 总是逐张；
+                'batched' 每个用户的所有图片、所有版本用 batch_kernels 一起增强
+                （参数分布相同但随机数序列不同，输出与逐张模式不一致，切换引擎时会按配置变化重建）
+        target_size: (宽, 高)，大于该尺寸的源图片（例如 4000x3000 的背景合成图）按 OpenCV 缩小模式解码，
+                     再缩放到该尺寸以内后增强，None 表示按原尺寸
+    
+    只重新生成缺失或过期的增强版本：源图片内容、增强管道、种子或压缩级别变化时对应文件会重建，
+    中断的用户目录下次运行会补齐。
+    """
+    # 使用Path对象处理路径，避免编码问题
+    input_path = Path(input_dir)
+    output_path = Path(output_dir)
+    
+    # 创建输出目录
+    output_path.mkdir(exist_ok=True)
+    
+    print(f"🔍 扫描目录: {input_path}")
+    print(f"📁 输出目录: {output_path}")
+    print(f"🎯 每张图片生成 {num_augmentations} 个增强版本")
+    print(f"👥 最大处理用户数: {max_users}")
+    
+    pipeline = build_transform(pipelines)
+    print(f"🧩 增强管道: " + ", ".join(f"{name}×{weight:g}" for name, weight, _ in pipeline.pipelines))
+    augmenters = build_augmenters(pipeline, engine)
+    engine = 'batched' if augmenters is not None else 'albumentations'
+    print(f"🧮 增强引擎: {engine}")
+    if target_size:
+        print(f"📐 目标尺寸: {target_size[0]}x{target_size[1]} 以内（大图缩小解码）")
+    spec_hash = transform_spec_hash(pipeline, seed, engine, target_size)
+    jobs, removed = collect_person_jobs(input_path, output_path, max_users, num_augmentations, spec_hash, gc)
+    results = []
+    
+    if workers <= 1 and stage_workers:
+        print(f"⚙️  流水线模式: " + ", ".join(f"{k} {v} 线程" for k, v in stage_workers.items()))
+        results, stage_pipeline = augment_jobs_pipelined(jobs, spec_hash, seed, stage_workers, queue_size, pipelines,
+                                                         engine, target_size)
+        stage_pipeline.print_summary()
+    elif workers <= 1:
+        for person_dir, person_output_dir, tasks, manifest in jobs:
+            results.append(augment_person(person_dir, person_output_dir, tasks, manifest, spec_hash, seed, pipeline,
+                                          augmenters=augmenters, target_size=target_size))
+    else:
+        print(f"⚙️  并行模式: {workers} 个工作进程，每个进程 OpenCV 线程数 {cv2_threads}")
+        if stage_workers:
+            print("   ⚠️  多进程模式下不使用流水线，各进程内逐张处理")
+        worker_stats = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(quality_presets.get_preset().name, cv2_threads,
+                                           augment_registry.registry.spec_path, pipelines, engine)) as executor:
+            futures = [executor.submit(_augment_person_in_worker, person_dir, person_output_dir, tasks, manifest,
+                                       spec_hash, seed, target_size)
+                       for person_dir, person_output_dir, tasks, manifest in jobs]
+            for done, future in enumerate(as_completed(futures), 1):
+                stats = future.result()
+                image_io.merge_io_stats(stats.pop('io'))
+                results.append(stats)
+                worker = worker_stats.setdefault(stats['worker'], {'persons': 0, 'processed': 0, 'generated': 0})
+                worker['persons'] += 1
+                worker['processed'] += stats['processed']
+                worker['generated'] += stats['generated']
+                print(f"   [{done}/{len(jobs)}] 👤 {stats['person']}: 处理 {stats['processed']} 张，"
+                      f"生成 {stats['generated']} 张（进程 {stats['worker']}）")
+        
+        print(f"\n🧵 各工作进程统计:")
+        for pid, worker in sorted(worker_stats.items()):
+            print(f"   • 进程 {pid}: 用户 {worker['persons']}，图片 {worker['processed']}，生成 {worker['generated']}")
     
     print(f"\n🎉 批量增强完成！")
     print(f"📊 统计信息:")
-    print(f"   • 处理用户数量: {user_count}")
-    print(f"   • 处理图片数量: {total_processed}")
-    print(f"   • 生成增强图片数量: {total_generated}")
+    print(f"   • 处理用户数量: {len(results)}")
+    print(f"   • 处理图片数量: {sum(r['processed'] for r in results)}")
+    print(f"   • 生成增强图片数量: {sum(r['generated'] for r in results)}")
+    print(f"   • 失败数量: {sum(r['failed'] for r in results)}")
+    print(f"   • 清理孤立文件数量: {removed}")
     print(f"   • 输出目录: {output_path}")
+    image_io.print_io_stats()
     print(f"\n💡 增强后的图片已按姓名分类存储，便于管理和使用")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量身份证图片增强")
+    parser.add_argument("--input", default="chinese_ids", help="身份证图片根目录")
+    parser.add_argument("--output", default="e:/dataset/generated/chinese_ids_augmented", help="增强后的图片根目录")
+    parser.add_argument("--num-augmentations", type=int, default=3, help="每张图片生成的增强版本数量")
+    parser.add_argument("--max-users", type=int, default=200, help="最大处理用户数量")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数（默认串行）")
+    parser.add_argument("--cv2-threads", type=int, default=1, help="并行模式下每个进程的 OpenCV 线程数")
+    parser.add_argument("--seed", type=int, default=0, help="基础随机种子")
+    parser.add_argument("--pipeline", action="store_true", help="单进程内使用 读取→增强→编码→写出 流水线")
+    parser.add_argument("--read-workers", type=int, default=2, help="流水线读取线程数")
+    parser.add_argument("--augment-workers", type=int, default=2, help="流水线增强线程数")
+    parser.add_argument("--encode-workers", type=int, default=2, help="流水线编码线程数")
+    parser.add_argument("--write-workers", type=int, default=1, help="流水线写出线程数")
+    parser.add_argument("--queue-size", type=int, default=16, help="流水线阶段之间的队列容量")
+    parser.add_argument("--pipelines", nargs="+", metavar="NAME[:WEIGHT]",
+                        help="使用的增强管道和权重，例如 轻微变换:2 中等变换（默认 batch_augment）")
+    parser.add_argument("--engine", choices=ENGINES, default='auto',
+                        help="增强引擎：auto 在管道受支持时用批量内核（默认）；albumentations 逐张增强，"
+                             "输出与 virtual_augment.py 逐像素一致；batched 批量内核（输出与逐张模式不同）")
+    parser.add_argument("--target-size", type=parse_size, metavar="WxH",
+                        help="增强前把源图片缩小到该尺寸以内，大图按缩小模式解码（例如 1024x768）")
+    parser.add_argument("--spec", help="增强管道规格文件（JSON/YAML，默认 augment_pipelines.json）")
+    parser.add_argument("--keep-orphans", action="store_true", help="不清理源图片已删除的增强文件")
+    parser.add_argument("--quality", choices=list(quality_presets.PRESETS), help="质量档位（默认读取 ID_QUALITY）")
+    args = parser.parse_args()
+    
+    if args.quality:
+        quality_presets.set_preset(args.quality)
+    if args.spec:
+        augment_registry.use_spec(args.spec)
+    pipelines = augment_registry.parse_weighted(args.pipelines) if args.pipelines else None
+    
     # 设置输入和输出目录
-    input_directory = "chinese_ids"  # 身份证图片根目录
-    output_directory = "e:/dataset/generated/chinese_ids_augmented"  # 增强后的图片根目录
+    input_directory = args.input  # 身份证图片根目录
+    output_directory = args.output  # 增强后的图片根目录
     
     # 检查输入目录
     if not os.path.exists(input_directory):
@@ -187,11 +588,21 @@ if __name__ == "__main__":
         print("请确保 chinese_ids 目录存在并包含身份证图片")
         exit(1)
     
-    # 执行批量增强（限制处理前3个用户进行测试）
-    batch_augment_images(input_directory, output_directory, num_augmentations=3, max_users=200)
+    stage_workers = None
+    if args.pipeline:
+        stage_workers = {'read': args.read_workers, 'augment': args.augment_workers,
+                         'encode': args.encode_workers, 'write': args.write_workers}
+    
+    # 执行批量增强
+    batch_augment_images(input_directory, output_directory, num_augmentations=args.num_augmentations,
+                         max_users=args.max_users, workers=args.workers, seed=args.seed,
+                         cv2_threads=args.cv2_threads, stage_workers=stage_workers, queue_size=args.queue_size,
+                         gc=not args.keep_orphans, pipelines=pipelines, engine=args.engine,
+                         target_size=args.target_size)
     
     print(f"\n🔍 使用建议:")
     print("1. 增强后的图片按姓名分类存储，便于查找")
     print("2. 每个增强版本都有唯一的编号 (_aug_01, _aug_02, ...)")
     print("3. 可以用于训练数据增强或测试不同场景")
     print("4. 建议检查几个样本，确保增强效果符合预期")
+    print("5. 用户较多时可加 --workers N 并行处理，相同 --seed 下结果与串行一致")
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量增强内核
+一次处理一批图片（不同来源、不同尺寸都可以），参数按种子整批采样，像素处理按图片逐张完成，
+一张图片的所有变换连续执行，数据始终留在缓存里:
+    - 亮度、对比度、伽马: 相邻的变换合并成一张 0-255 查找表，每张图片只做一次 cv2.LUT；
+      对比度需要的灰度均值用 cv2.mean 在当前图片上计算
+    - Affine、Perspective: 相邻的几何变换合并成一个矩阵，每张图片只调用一次 cv2.warpAffine/warpPerspective
+    - 高斯噪声: 随机字节经过正态分位数查找表变成 int16 噪声（256 级），比 cv2.randn 快约一倍
+    - 饱和度、色相、GaussianBlur: 逐张在 uint8 上调用 OpenCV
+    - 图片第一次被修改时才分配输出，之后原地更新；没有被任何变换选中的版本直接返回输入，
+      同一张原图的多个版本共用灰度均值
+
+参数范围取自 albumentations 管道本身（A.to_dict 的解析结果），与逐张增强的分布一致
+（ColorJitter 的四个子变换也按每张图片随机的顺序执行），但随机数序列不同，
+因此输出与 albumentations 不逐像素相同。每张图片的参数只由它自己的种子决定，与批次大小、分组方式无关。
+
+支持的变换: Affine、Perspective、ColorJitter、RandomBrightnessContrast、RandomGamma、GaussNoise、GaussianBlur。
+管道中含其他变换（OneOf、RandomShadow、MotionBlur 等）时 build_augmenters 抛出 UnsupportedTransform，
+调用方应回退到逐张增强。
+
+基准:
+    python batch_kernels.py --count 16 --size 1006x627
+"""
+
+import argparse
+import json
+import time
+from statistics import NormalDist
+
+import albumentations as A
+import cv2
+import numpy as np
+
+# 内核实现变化时递增，batch_augment 的配置哈希包含此版本
+KERNEL_VERSION = 2
+
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+IDENTITY_LUT = np.arange(256, dtype=np.float32)
+
+# 标准正态分布的 256 个分位数（归一化到单位方差），随机字节查表即得到正态噪声
+NORMAL_QUANTILES = np.array([NormalDist().inv_cdf((k + 0.5) / 256) for k in range(256)], dtype=np.float32)
+NORMAL_QUANTILES /= NORMAL_QUANTILES.std()
+
+
+class UnsupportedTransform(ValueError):
+    """管道中含有批量内核不支持的变换"""
+
+
+def _range(value):
+    return float(value[0]), float(value[1])
+
+
+def _gray_mean(image):
+    """灰度均值（按通道均值加权，与先转灰度再求均值相差不到 0.5）"""
+    means = cv2.mean(image)
+    if image.ndim == 2 or image.shape[2] == 1:
+        return means[0]
+    return float(np.dot(means[:3], GRAY_WEIGHTS))
+
+
+class _LutStep:
+    """
+    逐像素、逐通道的亮度类变换，可以表示为 0-255 的查找表
+    相邻的查找表步骤合并成一张表，每张图片只做一次 cv2.LUT；needs_mean 的步骤先把之前的表应用到图片上
+    """
+    needs_mean = False
+
+    def update(self, lut, value, mean):
+        raise NotImplementedError
+
+
+class _Multiply(_LutStep):
+    def update(self, lut, value, mean):
+        return lut * value
+
+
+class _Contrast(_LutStep):
+    """以灰度均值为中心缩放"""
+    needs_mean = True
+
+    def update(self, lut, value, mean):
+        return (lut - mean) * value + mean
+
+
+class _AlphaBeta(_LutStep):
+    """RandomBrightnessContrast: alpha * v + beta"""
+
+    def __init__(self, by_max):
+        self.by_max = by_max
+        self.needs_mean = not by_max
+
+    def update(self, lut, value, mean):
+        alpha, beta = value
+        return lut * alpha + (beta * 255.0 if self.by_max else beta * mean)
+
+
+class _Power(_LutStep):
+    def update(self, lut, value, mean):
+        return np.power(lut / 255.0, value) * 255.0
+
+
+class _ImageStep:
+    """
+    逐张执行的步骤: func(图片, 参数, dst) -> 图片
+    inplace=False 的函数（warp）不能把结果写回输入，总是分配新数组
+    """
+
+    def __init__(self, func, inplace=True):
+        self.func = func
+        self.inplace = inplace
+
+
+def _saturation(image, factor, dst=None):
+    gray = cv2.cvtColor(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY), cv2.COLOR_GRAY2RGB)
+    return cv2.addWeighted(image, factor, gray, 1.0 - factor, 0, dst=dst)
+
+
+def _hue(image, shift, dst=None):
+    hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV, dst=dst)
+    # OpenCV 的 8 位色相范围是 0-179，查找表与 albumentations 相同
+    lut = np.mod(np.arange(256, dtype=np.int16) + 180 * shift, 180).astype(np.uint8)
+    hsv[..., 0] = cv2.LUT(hsv[..., 0], lut)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB, dst=hsv)
+
+
+class _ColorJitter:
+    """
+    与 albumentations ColorJitter 相同: 亮度、对比度、饱和度、色相四个子变换按每张图片随机的顺序执行，
+    系数为 1（色相为 0）的子变换跳过
+    """
+    BRIGHTNESS = _Multiply()
+    CONTRAST = _Contrast()
+    SATURATION = _ImageStep(_saturation)
+    HUE = _ImageStep(_hue)
+
+    def __init__(self, args):
+        self.p = args["p"]
+        self.brightness = _range(args["brightness"])
+        self.contrast = _range(args["contrast"])
+        self.saturation = _range(args["saturation"])
+        self.hue = _range(args["hue"])
+
+    def sample(self, rng):
+        if rng.random() >= self.p:
+            return None
+        return (rng.uniform(*self.brightness), rng.uniform(*self.contrast),
+                rng.uniform(*self.saturation), rng.uniform(*self.hue), rng.permutation(4))
+
+    def steps(self, value):
+        brightness, contrast, saturation, hue, order = value
+        steps = [(self.BRIGHTNESS, brightness, brightness != 1.0),
+                 (self.CONTRAST, contrast, contrast != 1.0),
+                 (self.SATURATION, saturation, saturation != 1.0),
+                 (self.HUE, hue, hue != 0.0)]
+        return [steps[k][:2] for k in order if steps[k][2]]
+
+
+class _BrightnessContrast:
+    def __init__(self, args):
+        self.p = args["p"]
+        self.brightness = _range(args["brightness_limit"])
+        self.contrast = _range(args["contrast_limit"])
+        self.step = _AlphaBeta(args.get("brightness_by_max", True))
+
+    def sample(self, rng):
+        if rng.random() >= self.p:
+            return None
+        return 1.0 + rng.uniform(*self.contrast), rng.uniform(*self.brightness)
+
+    def steps(self, value):
+        return [(self.step, value)]
+
+
+class _Gamma:
+    STEP = _Power()
+
+    def __init__(self, args):
+        self.p = args["p"]
+        self.limit = _range(args["gamma_limit"])
+
+    def sample(self, rng):
+        if rng.random() >= self.p:
+            return None
+        return rng.uniform(*self.limit) / 100.0
+
+    def steps(self, value):
+        return [(self.STEP, value)]
+
+
+class _GaussNoise:
+    def __init__(self, args):
+        if "std_range" not in args:
+            raise UnsupportedTransform("GaussNoise 需要 albumentations 2.x 的 std_range 参数")
+        self.p = args["p"]
+        self.std = _range(args["std_range"])
+        self.mean = _range(args.get("mean_range", (0.0, 0.0)))
+        self.per_channel = args.get("per_channel", True)
+        self.step = _ImageStep(self.add_noise)
+
+    def sample(self, rng):
+        if rng.random() >= self.p:
+            return None
+        # 噪声图由单独的种子生成，只在应用时展开
+        return rng.uniform(*self.std) * 255.0, rng.uniform(*self.mean) * 255.0, int(rng.integers(2 ** 31))
+
+    def add_noise(self, image, value, dst=None):
+        std, mean, noise_seed = value
+        shape = image.shape if self.per_channel or image.ndim == 2 else image.shape[:2]
+        table = np.rint(NORMAL_QUANTILES * std + mean).astype(np.int16)
+        noise = cv2.LUT(np.random.default_rng(noise_seed).integers(0, 256, shape, dtype=np.uint8), table)
+        if noise.ndim < image.ndim:
+            noise = cv2.merge([noise] * image.shape[2])
+        return cv2.add(image, noise, dst=dst, dtype=cv2.CV_8U)
+
+    def steps(self, value):
+        return [(self.step, value)]
+
+
+class _GaussianBlur:
+    def __init__(self, args):
+        self.p = args["p"]
+        low, high = args["blur_limit"]
+        self.kernel_sizes = [k for k in range(max(3, int(low)), int(high) + 1) if k % 2 == 1] or [3]
+        self.sigma = _range(args.get("sigma_limit", (0.5, 3.0)))
+        self.step = _ImageStep(self.blur)
+
+    def sample(self, rng):
+        if rng.random() >= self.p:
+            return None
+        return int(rng.choice(self.kernel_sizes)), rng.uniform(*self.sigma)
+
+    @staticmethod
+    def blur(image, value, dst=None):
+        ksize, sigma = value
+        return cv2.GaussianBlur(image, (ksize, ksize), sigma, dst=dst)
+
+    def steps(self, value):
+        return [(self.step, value)]
+
+
+class _Affine:
+    """旋转、缩放、平移，围绕图片中心，返回 3x3 矩阵"""
+    geometric = True
+
+    def __init__(self, args):
+        shear = args.get("shear") or {}
+        if any(v != 0 for axis in shear.values() for v in axis) or args.get("fit_output"):
+            raise UnsupportedTransform("Affine 的 shear / fit_output 不支持批量处理")
+        self.p = args["p"]
+        self.interpolation = args.get("interpolation", cv2.INTER_LINEAR)
+        self.rotate = _range(args["rotate"])
+        self.scale_x = _range(args["scale"]["x"])
+        self.scale_y = _range(args["scale"]["y"])
+        self.keep_ratio = args.get("keep_ratio", False)
+        self.translate_percent = args.get("translate_percent")
+        self.translate_px = args.get("translate_px") or {"x": [0, 0], "y": [0, 0]}
+
+    def sample(self, rng, size):
+        if rng.random() >= self.p:
+            return None
+        width, height = size
+        angle = rng.uniform(*self.rotate)
+        sx = rng.uniform(*self.scale_x)
+        sy = sx if self.keep_ratio else rng.uniform(*self.scale_y)
+        if self.translate_percent:
+            tx = rng.uniform(*self.translate_percent["x"]) * width
+            ty = rng.uniform(*self.translate_percent["y"]) * height
+        else:
+            tx = rng.uniform(*self.translate_px["x"])
+            ty = rng.uniform(*self.translate_px["y"])
+
+        cx, cy = width / 2.0, height / 2.0
+        radians = np.deg2rad(angle)
+        cos, sin = np.cos(radians), np.sin(radians)
+        linear = np.array([[cos * sx, -sin * sy], [sin * sx, cos * sy]])
+        matrix = np.eye(3)
+        matrix[:2, :2] = linear
+        matrix[:2, 2] = np.array([cx + tx, cy + ty]) - linear @ np.array([cx, cy])
+        return matrix
+
+
+class _Perspective:
+    """四个角向内随机收缩，再拉伸回原尺寸（keep_size），返回 3x3 矩阵"""
+    geometric = True
+
+    def __init__(self, args):
+        if args.get("fit_output") or not args.get("keep_size", True):
+            raise UnsupportedTransform("Perspective 的 fit_output / keep_size=False 不支持批量处理")
+        self.p = args["p"]
+        self.interpolation = args.get("interpolation", cv2.INTER_LINEAR)
+        self.scale = _range(args["scale"])
+
+    def sample(self, rng, size):
+        if rng.random() >= self.p:
+            return None
+        width, height = size
+        offsets = np.abs(rng.normal(0, rng.uniform(*self.scale), size=(4, 2))) * [width, height]
+        corners = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float64)
+        inward = np.array([[1, 1], [-1, 1], [-1, -1], [1, -1]])
+        quad = corners + inward * offsets
+        return cv2.getPerspectiveTransform(quad.astype(np.float32), corners.astype(np.float32)).astype(np.float64)
+
+
+class _Geometry:
+    """相邻几何变换合并成一次 warp"""
+
+    def __init__(self, ops):
+        self.ops = ops
+        self.interpolation = ops[-1].interpolation
+        self.step = _ImageStep(self.warp, inplace=False)
+
+    def sample(self, rng, size):
+        matrix = None
+        for op in self.ops:
+            step = op.sample(rng, size)
+            if step is not None:
+                matrix = step if matrix is None else step @ matrix
+        return matrix
+
+    def warp(self, image, matrix, dst=None):
+        height, width = image.shape[:2]
+        if np.allclose(matrix[2], [0, 0, 1]):
+            return cv2.warpAffine(image, matrix[:2], (width, height), flags=self.interpolation,
+                                  borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        return cv2.warpPerspective(image, matrix, (width, height), flags=self.interpolation,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    def steps(self, value):
+        return [(self.step, value)]
+
+
+OPS = {
+    "ColorJitter": _ColorJitter,
+    "RandomBrightnessContrast": _BrightnessContrast,
+    "RandomGamma": _Gamma,
+    "GaussNoise": _GaussNoise,
+    "GaussianBlur": _GaussianBlur,
+    "Affine": _Affine,
+    "Perspective": _Perspective,
+}
+
+
+class BatchAugmenter:
+    """
+    批量增强
+
+    Args:
+        ops: 变换列表（_Geometry 或带 sample()/steps() 的变换），通常由 from_pipeline 构建
+    """
+
+    def __init__(self, ops):
+        self.ops = ops
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """从 albumentations 管道构建，遇到不支持的变换抛出 UnsupportedTransform"""
+        ops = []
+        for node in A.to_dict(pipeline)["transform"]["transforms"]:
+            name = node["__class_fullname__"].rsplit(".", 1)[-1]
+            if name not in OPS:
+                raise UnsupportedTransform(f"{name} 不支持批量处理")
+            op = OPS[name](node)
+            if getattr(op, "geometric", False):
+                if ops and isinstance(ops[-1], _Geometry):
+                    ops[-1].ops.append(op)
+                    ops[-1].interpolation = op.interpolation
+                else:
+                    ops.append(_Geometry([op]))
+            else:
+                ops.append(op)
+        return cls(ops)
+
+    def sample(self, seed, size):
+        """按种子采样一张图片所有变换的参数"""
+        rng = np.random.default_rng(seed)
+        return [op.sample(rng, size) if isinstance(op, _Geometry) else op.sample(rng) for op in self.ops]
+
+    def __call__(self, images, seeds):
+        """
+        增强一批图片
+
+        Args:
+            images: RGB uint8 图片序列（尺寸可以不同，也可以是同一个数组重复多次）
+            seeds: 每张图片的种子
+
+        Returns:
+            list: 增强后的图片；没有被任何变换选中的版本就是输入数组本身，调用方不应原地修改
+        """
+        means = {}
+        return [self._augment(image, self.sample(seed, (image.shape[1], image.shape[0])), means)
+                for image, seed in zip(images, seeds)]
+
+    def _augment(self, image, params, means):
+        """按顺序执行一张图片的所有步骤；means 缓存未修改的输入图片的灰度均值"""
+        owned = False
+        lut = None
+        for op, value in zip(self.ops, params):
+            if value is None:
+                continue
+            for step, arg in op.steps(value):
+                if isinstance(step, _LutStep):
+                    mean = None
+                    if step.needs_mean:
+                        if lut is not None:
+                            image, owned, lut = _apply_lut(image, owned, lut), True, None
+                        if owned:
+                            mean = _gray_mean(image)
+                        else:
+                            mean = means.get(id(image))
+                            if mean is None:
+                                mean = means[id(image)] = _gray_mean(image)
+                    lut = np.clip(step.update(IDENTITY_LUT if lut is None else lut, arg, mean), 0, 255)
+                else:
+                    if lut is not None:
+                        image, owned, lut = _apply_lut(image, owned, lut), True, None
+                    image = step.func(image, arg, image if owned and step.inplace else None)
+                    owned = True
+        if lut is not None:
+            image = _apply_lut(image, owned, lut)
+        return image
+
+
+def _apply_lut(image, owned, lut):
+    """应用合并后的查找表，图片已是本批分配的输出时原地更新"""
+    return cv2.LUT(image, np.rint(lut).astype(np.uint8), dst=image if owned else None)
+
+
+def build_augmenters(pipeline):
+    """
+    为 PipelineMix 中的每个管道构建 BatchAugmenter
+
+    Returns:
+        dict: {管道名称: BatchAugmenter}
+    """
+    return {name: BatchAugmenter.from_pipeline(compose) for name, _, compose in pipeline.pipelines}
+
+
+def augment_images(images, seeds, augmenters, pipeline):
+    """
+    按管道分组批量增强，返回与输入顺序一致的 uint8 图片列表
+
+    Args:
+        images: RGB uint8 图片列表（可以来自不同源图片、不同尺寸）
+        seeds: 每张图片的种子
+        augmenters: build_augmenters 的返回值
+        pipeline: PipelineMix，用于按种子选择管道
+
+    Returns:
+        list: 增强后的图片，未被任何变换选中的版本与输入共用内存
+    """
+    groups = {}
+    for i, seed in enumerate(seeds):
+        groups.setdefault(pipeline.pick_name(seed), []).append(i)
+
+    results = [None] * len(images)
+    for name, indices in groups.items():
+        outputs = augmenters[name]([images[i] for i in indices], [seeds[i] for i in indices])
+        for i, output in zip(indices, outputs):
+            results[i] = output
+    return results
+
+
+def benchmark(pipeline_names, count, size, rounds=3):
+    """对比逐张 albumentations 和批量内核的吞吐量"""
+    import augment_registry
+
+    rng = np.random.default_rng(0)
+    width, height = size
+    images = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+    seeds = list(range(count))
+    results = []
+    for name in pipeline_names:
+        mix = augment_registry.registry.mix([(name, 1.0)])
+        try:
+            augmenters = build_augmenters(mix)
+        except UnsupportedTransform as e:
+            print(f"  {name:<12} 跳过: {e}")
+            continue
+
+        def per_image():
+            for image, seed in zip(images, seeds):
+                mix.set_random_seed(seed)
+                mix(image=image)
+
+        def batched():
+            augment_images(images, seeds, augmenters, mix)
+
+        timings = {}
+        for label, func in (("per_image", per_image), ("batched", batched)):
+            func()
+            timings[label] = min(_timed(func) for _ in range(rounds))
+        entry = {
+            "pipeline": name,
+            "count": count,
+            "size": [width, height],
+            "per_image_per_sec": round(count / timings["per_image"], 2),
+            "batched_per_sec": round(count / timings["batched"], 2),
+            "speedup": round(timings["per_image"] / timings["batched"], 2),
+        }
+        results.append(entry)
+        print(f"  {name:<12}{entry['per_image_per_sec']:>12.1f}{entry['batched_per_sec']:>12.1f}"
+              f"{entry['speedup']:>9.2f}x")
+    return results
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    import augment_registry
+
+    parser = argparse.ArgumentParser(description="批量增强内核与逐张增强的吞吐量对比")
+    parser.add_argument("--pipelines", nargs="+", default=["batch_augment", "轻微变换", "中等变换"])
+    parser.add_argument("--count", type=int, default=16, help="每批图片数量")
+    parser.add_argument("--size", default="1006x627", help="图片尺寸 WxH（默认身份证正面模板尺寸）")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    print(f"🏁 {args.count} 张 {size[0]}x{size[1]} 图片（albumentations {A.__version__}）")
+    print(f"  {'管道':<10}{'逐张 张/秒':>12}{'批量 张/秒':>12}{'加速':>9}")
+    results = benchmark(args.pipelines or augment_registry.registry.names(), args.count, size, args.rounds)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
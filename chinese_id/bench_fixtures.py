@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试用的合成数据
+生成小尺寸的头像、背景图和身份证信息，基准脚本不依赖 faces_tr、desktop_backgrounds
+或系统字体等真实数据。所有数据由固定种子生成，结果可跨提交对比。
+"""
+
+import os
+
+import numpy as np
+from PIL import Image
+
+SAMPLE_INFO = {
+    'name': '张三丰',
+    'sex': '男',
+    'nation': '汉',
+    'year': '1990',
+    'month': '1',
+    'day': '15',
+    'address': '北京市海淀区中关村大街27号院3号楼2单元1201室',
+    'id_number': '11010819900115201X',
+    'authority': '北京市公安局海淀分局',
+    'valid_date': '2015.03.01-2035.03.01',
+}
+
+# 与 Stable Diffusion 背景输出一致的尺寸
+BACKGROUND_SIZE = (1024, 768)
+
+
+def sample_info(index=0):
+    """返回第 index 个合成身份证信息（姓名带序号，便于区分输出目录）"""
+    return dict(SAMPLE_INFO, name=f"{SAMPLE_INFO['name']}{index}")
+
+
+def make_avatar(seed=0, size=(308, 376)):
+    """合成去背景头像：纯色椭圆主体 + 透明背景"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    yy, xx = np.mgrid[:height, :width]
+    inside = ((xx - width / 2) / (width * 0.4)) ** 2 + ((yy - height / 2) / (height * 0.45)) ** 2 <= 1
+    avatar = np.zeros((height, width, 4), dtype=np.uint8)
+    avatar[..., :3] = rng.integers(80, 200, size=3, dtype=np.uint8)
+    avatar[..., 3] = inside * 255
+    return Image.fromarray(avatar, "RGBA")
+
+
+def make_background(seed=0, size=BACKGROUND_SIZE):
+    """合成背景：平滑渐变叠加噪声，避免编码器对纯色图走捷径"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    gradient = np.linspace(60, 200, width, dtype=np.float32)[None, :, None]
+    base = gradient + rng.normal(0, 12, size=(height, width, 3)).astype(np.float32)
+    tint = rng.uniform(0.8, 1.2, size=3).astype(np.float32)
+    return Image.fromarray(np.clip(base * tint, 0, 255).astype(np.uint8))
+
+
+def make_fixtures(root, seed=0, backgrounds=2):
+    """
+    在 root 下写入合成头像和背景目录
+
+    Returns:
+        tuple: (头像路径, 背景目录)
+    """
+    avatar_path = os.path.join(root, "avatar.png")
+    make_avatar(seed).save(avatar_path)
+
+    background_dir = os.path.join(root, "backgrounds")
+    os.makedirs(background_dir, exist_ok=True)
+    for i in range(backgrounds):
+        make_background(seed + i).save(os.path.join(background_dir, f"background_{i:02d}.jpg"), quality=90)
+    return avatar_path, background_dir
+
+
+# 身份证正面模板尺寸
+CARD_SIZE = (1006, 627)
+
+
+def make_augment_fixture(size=CARD_SIZE, seed=0):
+    """
+    增强基准用的 RGB 图片：卡片尺寸时为正面模板本身，更大尺寸时把模板贴在合成背景中央（模拟背景合成图）
+
+    Returns:
+        np.ndarray: (高, 宽, 3) uint8
+    """
+    template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "id_card_template_front.png")
+    card = Image.open(template_path).convert("RGB")
+    if tuple(size) == card.size:
+        return np.array(card)
+    image = make_background(seed, size)
+    scale = min(size[0] * 0.5 / card.width, size[1] * 0.5 / card.height)
+    card = card.resize((max(1, round(card.width * scale)), max(1, round(card.height * scale))), Image.BILINEAR)
+    image.paste(card, ((size[0] - card.width) // 2, (size[1] - card.height) // 2))
+    return np.array(image)
+
+
+def make_matting_fixture(size=(512, 512), seed=0):
+    """
+    去背景基准用的合成人像：纹理背景上的头部椭圆 + 肩部，边缘抗锯齿
+
+    Returns:
+        tuple: (RGB PIL 图片, 真实 alpha 的 (高, 宽) uint8 数组)
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    # 4 倍超采样绘制主体，缩小后得到带过渡的边缘
+    ss = 4
+    yy, xx = np.mgrid[:height * ss, :width * ss] / ss
+    head = ((xx - width * 0.5) / (width * 0.2)) ** 2 + ((yy - height * 0.38) / (height * 0.25)) ** 2 <= 1
+    shoulders = (yy >= height * 0.7) & (np.abs(xx - width * 0.5) <= width * 0.2 + (yy - height * 0.7) * 0.9)
+    inside = (head | shoulders).astype(np.float32)
+    alpha = inside.reshape(height, ss, width, ss).mean(axis=(1, 3))
+
+    background = np.asarray(make_background(seed, size), dtype=np.float32)
+    subject = rng.integers(60, 220, size=3).astype(np.float32) + rng.normal(0, 18, size=(height, width, 3))
+    image = background * (1 - alpha[..., None]) + subject * alpha[..., None]
+    return (Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)),
+            (alpha * 255 + 0.5).astype(np.uint8))
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增强吞吐量基准和逐变换分析
+在多个分辨率下（默认身份证卡片 1006x627、SD 背景 1024x768、背景合成图 4000x3000）测量:
+    - pipeline/<管道>/<尺寸>     注册表中每个增强管道的 张/秒，以及管道内各变换的耗时占比
+    - transform/<变换>/<尺寸>    每个变换单独执行（p=1，即一定应用）时的 张/秒
+    - 每项的内存峰值（tracemalloc 统计的 NumPy 分配，单独跑一遍，不影响计时）
+
+管道内的耗时占比按 Compose 的执行方式逐个调用子变换统计，结果与直接调用管道逐像素一致。
+结果 JSON 记录 albumentations、OpenCV、NumPy、Pillow 版本，可用 --compare 对比不同库版本或提交:
+
+    python benchmark_augment.py --output augment_bench.json
+    python benchmark_augment.py --resolutions 1006x627 --pipelines 综合效果 --compare augment_bench.json
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import albumentations as A
+import cv2
+import numpy as np
+import PIL
+
+import augment_registry
+import bench_fixtures
+import quality_presets
+from batch_augment import parse_size
+from benchmark_id_pipeline import compare_results, git_revision, measure
+
+DEFAULT_RESOLUTIONS = ["1006x627", "1024x768", "4000x3000"]
+
+# 卡片尺寸下每轮的迭代次数，更大的分辨率按像素数等比减少（至少 1 次）
+BASE_ITERATIONS = 8
+
+# 管道中的变换按概率应用，每轮至少覆盖这么多个种子，吞吐量才代表平均情况
+PIPELINE_MIN_SAMPLES = 8
+
+
+def iterations_for(size, scale):
+    card_pixels = bench_fixtures.CARD_SIZE[0] * bench_fixtures.CARD_SIZE[1]
+    return max(1, round(BASE_ITERATIONS * scale * card_pixels / (size[0] * size[1])))
+
+
+def peak_memory_mb(func, seeds):
+    """按种子逐次执行 func（不保留结果），返回 tracemalloc 记录的内存峰值（MB）"""
+    tracemalloc.start()
+    try:
+        for seed in seeds:
+            func(seed)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1e6
+
+
+def process_peak_rss_mb():
+    """进程常驻内存峰值（MB），不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1e6 if sys.platform == "darwin" else 1e3), 1)
+
+
+def collect_transforms(registry):
+    """
+    收集所有管道中的叶子变换（展开 OneOf 等容器），类型和参数相同的只保留一个；
+    概率 p 不参与去重，返回的节点固定 p=1，保证测到的是变换本身的开销
+
+    Returns:
+        list: [(标签, 变换节点, 首次出现的管道), ...]
+    """
+    seen = {}
+    labels = {}
+
+    def visit(node, pipeline_name):
+        if "transforms" in node:
+            for child in node["transforms"]:
+                visit(child, pipeline_name)
+            return
+        config = {k: v for k, v in node.items() if k != "p"}
+        key = json.dumps(config, sort_keys=True, ensure_ascii=False)
+        if key in seen:
+            return
+        count = labels[node["type"]] = labels.get(node["type"], 0) + 1
+        label = node["type"] if count == 1 else f"{node['type']}#{count}"
+        seen[key] = (label, dict(config, p=1.0), pipeline_name)
+
+    for name in registry.names():
+        for node in registry.spec(name)["transforms"]:
+            visit(node, name)
+    return list(seen.values())
+
+
+def profile_pipeline(compose, image, seeds):
+    """
+    按 Compose 的顺序逐个调用子变换，统计每个变换的累计耗时
+
+    Returns:
+        dict: {变换名称: 秒}
+    """
+    elapsed = {}
+    names = [f"{i}:{type(t).__name__}" for i, t in enumerate(compose.transforms)]
+    for seed in seeds:
+        compose.set_random_seed(seed)
+        data = {"image": image}
+        for name, transform in zip(names, compose.transforms):
+            start = time.perf_counter()
+            data = transform(**data)
+            elapsed[name] = elapsed.get(name, 0.0) + time.perf_counter() - start
+    return elapsed
+
+
+def _seeded_runner(func):
+    """每次调用使用下一个种子；setup 把种子重置为 0，保证每轮的变换序列相同"""
+    seeds = [itertools.count()]
+
+    def run():
+        return func(next(seeds[0]))
+
+    def reset():
+        seeds[0] = itertools.count()
+
+    return run, reset
+
+
+def run_benchmarks(resolutions, pipeline_names, scale=1, rounds=3, transforms=True):
+    registry = augment_registry.registry
+    results = {}
+    for size in resolutions:
+        image = bench_fixtures.make_augment_fixture(size)
+        iterations = iterations_for(size, scale)
+        samples = max(iterations, PIPELINE_MIN_SAMPLES)
+        label = f"{size[0]}x{size[1]}"
+        print(f"\n📐 {label}（管道每轮 {samples} 张，单个变换每轮 {iterations} 张）")
+        print(f"  {'名称':<28}{'张/秒':>10}{'峰值MB':>10}  耗时占比")
+
+        for name in pipeline_names:
+            compose = registry.compile(name)
+
+            def augment(seed, compose=compose):
+                compose.set_random_seed(seed)
+                return compose(image=image)["image"]
+
+            run, reset = _seeded_runner(augment)
+            rate, seconds = measure(run, samples, rounds, setup=reset)
+            peak = peak_memory_mb(augment, range(samples))
+            elapsed = profile_pipeline(compose, image, range(samples))
+            total = sum(elapsed.values()) or 1.0
+            share = {k: round(v / total, 3) for k, v in sorted(elapsed.items(), key=lambda kv: -kv[1])}
+            results[f"pipeline/{name}/{label}"] = {
+                "value": round(rate, 3), "unit": "images/s", "iterations": samples,
+                "seconds": round(seconds, 4), "peak_mb": round(peak, 1), "transform_share": share,
+            }
+            top = ", ".join(f"{k.split(':', 1)[1]} {v * 100:.0f}%" for k, v in list(share.items())[:3])
+            print(f"  {'管道 ' + name:<28}{rate:>10.2f}{peak:>10.1f}  {top}")
+
+        if not transforms:
+            continue
+        for transform_name, node, source in collect_transforms(registry):
+            transform = augment_registry.compile_transform(node)
+
+            def apply(seed, transform=transform):
+                transform.set_random_seed(seed)
+                return transform(image=image)["image"]
+
+            run, reset = _seeded_runner(apply)
+            rate, seconds = measure(run, iterations, rounds, setup=reset)
+            peak = peak_memory_mb(apply, range(1))
+            results[f"transform/{transform_name}/{label}"] = {
+                "value": round(rate, 3), "unit": "images/s", "iterations": iterations,
+                "seconds": round(seconds, 4), "peak_mb": round(peak, 1), "pipeline": source,
+            }
+            print(f"  {'变换 ' + transform_name:<28}{rate:>10.2f}{peak:>10.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增强管道和单个变换的吞吐量基准")
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS, metavar="WxH", help="测试分辨率")
+    parser.add_argument("--pipelines", nargs="+", help="测试的管道（默认注册表中全部）")
+    parser.add_argument("--no-transforms", action="store_true", help="只测管道，不单独测每个变换")
+    parser.add_argument("--scale", type=int, default=1, help="迭代次数倍数，越大越稳定")
+    parser.add_argument("--rounds", type=int, default=3, help="每项重复轮数，取最快一轮")
+    parser.add_argument("--quality", choices=list(quality_presets.PRESETS), default=quality_presets.DEFAULT_PRESET)
+    parser.add_argument("--spec", help="增强管道规格文件（默认 augment_pipelines.json）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--compare", metavar="BASELINE", help="与之前的 JSON 结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="允许的吞吐量下降比例（默认 10%%）")
+    args = parser.parse_args()
+
+    quality_presets.set_preset(args.quality)
+    if args.spec:
+        augment_registry.use_spec(args.spec)
+    resolutions = [parse_size(value) for value in args.resolutions]
+    pipeline_names = args.pipelines or augment_registry.registry.names()
+    print(f"🏁 增强基准（albumentations {A.__version__}，OpenCV {cv2.__version__}，质量档位 {args.quality}）")
+
+    results = run_benchmarks(resolutions, pipeline_names, args.scale, args.rounds, not args.no_transforms)
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "albumentations": A.__version__,
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cv2_threads": cv2.getNumThreads(),
+            "quality": args.quality,
+            "scale": args.scale,
+            "rounds": args.rounds,
+            "process_peak_rss_mb": process_peak_rss_mb(),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已写入: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        for key in ("albumentations", "opencv", "numpy"):
+            if baseline.get("meta", {}).get(key) != report["meta"][key]:
+                print(f"ℹ️  {key}: {baseline.get('meta', {}).get(key)} -> {report['meta'][key]}")
+        regressions = compare_results(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ 吞吐量下降超过 {args.tolerance * 100:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ 没有发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
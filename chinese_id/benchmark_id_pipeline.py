@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+身份证生成端到端基准测试
+使用 bench_fixtures 生成的合成头像和背景，测量:
+    - info_gen      generate_realistic_info 每秒生成记录数
+    - render_front  正面绘制 张/秒
+    - render_back   反面绘制 张/秒
+    - combine       正反面水平+垂直拼版 组/秒
+    - composite     背景合成 张/秒
+    - encode_png    卡片 PNG 编码 MB/s（按未压缩像素数据计）
+    - encode_jpeg   背景合成图 JPEG 编码 MB/s（按未压缩像素数据计）
+
+结果写成 JSON，可用 --compare 与旧结果对比，吞吐量下降超过 --tolerance 时返回非零退出码，
+便于在提交之间发现性能回退:
+
+    python benchmark_id_pipeline.py --output bench_before.json
+    python benchmark_id_pipeline.py --compare bench_before.json
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import PIL
+
+import bench_fixtures
+import chinese_id_gen
+import quality_presets
+from chinese_id_gen_realistic import generate_realistic_info
+
+
+def measure(func, iterations, rounds, setup=None):
+    """
+    重复 rounds 轮、每轮调用 func iterations 次，取最快一轮
+
+    Returns:
+        tuple: (每秒调用次数, 最快一轮耗时)
+    """
+    func()  # 预热：字体、模板等惰性加载不计入
+    best = float("inf")
+    for _ in range(rounds):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return iterations / best, best
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def iterations_for(base, scale):
+    """每项的迭代次数：基础次数乘以 scale 后取整，至少 1 次（--scale 0.2 用于快速试跑）"""
+    return max(1, round(base * scale))
+
+
+def run_benchmarks(work_dir, scale, rounds):
+    avatar_path, background_dir = bench_fixtures.make_fixtures(work_dir)
+    background_path = chinese_id_gen.list_background_files(background_dir)[0]
+    info = bench_fixtures.sample_info()
+    front = chinese_id_gen.render_id_card_front(info, avatar_path)
+    back = chinese_id_gen.render_id_card_back(info)
+    composite, _ = chinese_id_gen.render_composite(front, background_path)
+    preset = quality_presets.get_preset()
+
+    def reseed():
+        random.seed(0)
+
+    def encode_png():
+        buffer = io.BytesIO()
+        front.save(buffer, format="PNG", compress_level=preset.png_compress_level)
+        return buffer.tell()
+
+    def encode_jpeg():
+        buffer = io.BytesIO()
+        composite.save(buffer, format="JPEG", quality=preset.jpeg_quality)
+        return buffer.tell()
+
+    cases = [
+        ("info_gen", "records/s", lambda: generate_realistic_info(gender=random.choice(['男', '女'])), iterations_for(200, scale)),
+        ("render_front", "cards/s", lambda: chinese_id_gen.render_id_card_front(info, avatar_path), iterations_for(5, scale)),
+        ("render_back", "cards/s", lambda: chinese_id_gen.render_id_card_back(info), iterations_for(5, scale)),
+        ("combine", "pairs/s", lambda: chinese_id_gen.layout_engine.compose_many(
+            [("front", front), ("back", back)], [("horizontal", 30), ("vertical", 30)]), iterations_for(3, scale)),
+        ("composite", "composites/s", lambda: chinese_id_gen.render_composite(front, background_path), iterations_for(1, scale)),
+    ]
+
+    results = {}
+    for name, unit, func, iterations in cases:
+        rate, seconds = measure(func, iterations, rounds, setup=reseed)
+        results[name] = {"value": round(rate, 3), "unit": unit, "iterations": iterations, "seconds": round(seconds, 4)}
+        print(f"  {name:<14}{rate:>12.2f} {unit}")
+
+    for name, image, func, iterations in [("encode_png", front, encode_png, iterations_for(3, scale)),
+                                          ("encode_jpeg", composite, encode_jpeg, iterations_for(1, scale))]:
+        raw_mb = image.width * image.height * len(image.getbands()) / 1e6
+        rate, seconds = measure(func, iterations, rounds)
+        output_mb = func() / 1e6
+        results[name] = {"value": round(rate * raw_mb, 3), "unit": "MB/s", "iterations": iterations,
+                         "seconds": round(seconds, 4), "output_mb": round(output_mb, 3)}
+        print(f"  {name:<14}{rate * raw_mb:>12.2f} MB/s（每张输出 {output_mb:.2f} MB）")
+    return results
+
+
+def compare_results(current, baseline, tolerance):
+    """打印与基线的差异，返回回退的指标列表"""
+    regressions = []
+    print(f"\n{'指标':<16}{'基线':>12}{'当前':>12}{'变化':>10}")
+    for name, entry in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        change = entry["value"] / old["value"] - 1 if old["value"] else 0.0
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  ⚠️ 回退"
+        print(f"{name:<16}{old['value']:>12.2f}{entry['value']:>12.2f}{change * 100:>9.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="身份证生成端到端基准测试")
+    parser.add_argument("--scale", type=float, default=2, help="迭代次数倍数，越大越稳定（可以是小数，如 0.2 快速试跑）")
+    parser.add_argument("--rounds", type=int, default=3, help="每项重复轮数，取最快一轮")
+    parser.add_argument("--quality", choices=list(quality_presets.PRESETS), default=quality_presets.DEFAULT_PRESET)
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--compare", metavar="BASELINE", help="与之前的 JSON 结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="允许的吞吐量下降比例（默认 10%%）")
+    args = parser.parse_args()
+
+    quality_presets.set_preset(args.quality)
+    print(f"🏁 身份证生成基准（质量档位 {args.quality}，scale={args.scale}，rounds={args.rounds}）")
+
+    work_dir = tempfile.mkdtemp(prefix="id_bench_")
+    try:
+        results = run_benchmarks(work_dir, args.scale, args.rounds)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "quality": args.quality,
+            "scale": args.scale,
+            "rounds": args.rounds,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已写入: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ 吞吐量下降超过 {args.tolerance * 100:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ 没有发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
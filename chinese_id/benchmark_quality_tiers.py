@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+质量档位吞吐量基准
+对 draft / standard / final 三个档位分别跑完整的单人生成流程
+（正反面、两种合并图、四张背景合成图），输出每个档位的人数/秒和写出速度。
+使用 bench_fixtures 合成的头像和背景图，不依赖 faces_tr、desktop_backgrounds 等真实数据。
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import bench_fixtures
+import chinese_id_gen
+import quality_presets
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def run_tier(tier, persons, avatar_path, background_dir, work_dir):
+    """跑一个档位，返回统计结果"""
+    quality_presets.set_preset(tier)
+    output_dir = os.path.join(work_dir, f"out_{tier}")
+    os.makedirs(output_dir)
+    chinese_id_gen.output_base_dir = output_dir
+    chinese_id_gen.background_base_dir = background_dir
+
+    start = time.perf_counter()
+    for i in range(persons):
+        chinese_id_gen.generate_person_images(bench_fixtures.sample_info(i), avatar_path, "男性")
+    elapsed = time.perf_counter() - start
+
+    written = directory_size(output_dir)
+    shutil.rmtree(output_dir)
+    return {
+        "tier": tier,
+        "persons": persons,
+        "seconds": round(elapsed, 3),
+        "persons_per_sec": round(persons / elapsed, 3),
+        "written_mb": round(written / 1e6, 2),
+        "write_mb_per_sec": round(written / 1e6 / elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="质量档位吞吐量基准")
+    parser.add_argument("--persons", type=int, default=3, help="每个档位生成的人数")
+    parser.add_argument("--tiers", nargs="+", default=list(quality_presets.PRESETS),
+                        choices=list(quality_presets.PRESETS))
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="quality_bench_")
+    try:
+        avatar_path, background_dir = bench_fixtures.make_fixtures(work_dir, backgrounds=1)
+        results = [run_tier(tier, args.persons, avatar_path, background_dir, work_dir) for tier in args.tiers]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'档位':<10}{'人数/秒':>10}{'耗时(s)':>10}{'输出(MB)':>10}{'MB/s':>10}")
+    for r in results:
+        print(f"{r['tier']:<10}{r['persons_per_sec']:>10.2f}{r['seconds']:>10.2f}"
+              f"{r['written_mb']:>10.1f}{r['write_mb_per_sec']:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+去背景质量/速度对比基准
+比较两种得到 308x376 透明头像的方式:
+    - full:    全分辨率分割 + 全分辨率抠图，再缩放到头像尺寸（原来 batch_remove_bg + chinese_id_gen 的做法）
+    - low-res: 源图片缩小到模型输入尺寸分割，掩码导向滤波放大，源图片直接缩放到头像尺寸（--low-res）
+
+两种模式:
+    - model:  使用 rembg 模型实际推理（需要安装 rembg），质量以 full 的 alpha 为参照
+    - oracle: 不做推理，把合成人像的真实 alpha 缩小到模型输入尺寸并做轻微高斯模糊（模拟模型输出的软边缘）
+              当作模型输出，单独衡量掩码放大方式（双线性 / 导向滤波）的质量和后处理耗时；未安装 rembg 时自动使用
+
+质量指标（头像尺寸上计算）: alpha 平均绝对误差、边缘带（0 < alpha < 255 膨胀 2 像素）平均绝对误差、IoU（阈值 128）
+
+    python benchmark_rembg.py --sizes 512x512 1024x1024 --output rembg_bench.json
+    python benchmark_rembg.py --input faces --limit 16 --model u2net
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import bench_fixtures
+import quality_presets
+import rembg_engine
+from batch_remove_bg import SUPPORTED_FORMATS, parse_size
+from benchmark_id_pipeline import compare_results, git_revision, measure
+
+# 默认测试尺寸: Stable Diffusion 输出和较大的网络照片
+DEFAULT_SIZES = ["512x512", "1024x1024", "2048x2048"]
+
+# oracle 模式下模拟模型输出软边缘的高斯模糊（模型输入尺寸上的像素）
+ORACLE_BLUR_SIGMA = 1.5
+
+
+def alpha_metrics(alpha, reference):
+    """alpha 与参照 alpha（同尺寸 uint8）的误差指标"""
+    alpha = alpha.astype(np.float32)
+    reference = reference.astype(np.float32)
+    error = np.abs(alpha - reference)
+    band = ((reference > 0) & (reference < 255)).astype(np.uint8)
+    band = cv2.dilate(band, np.ones((5, 5), np.uint8)).astype(bool)
+    inside, ref_inside = alpha >= 128, reference >= 128
+    union = np.logical_or(inside, ref_inside).sum()
+    return {
+        "mae": round(float(error.mean()), 3),
+        "edge_mae": round(float(error[band].mean()), 3) if band.any() else 0.0,
+        "iou": round(float(np.logical_and(inside, ref_inside).sum() / union), 4) if union else 1.0,
+    }
+
+
+def mean_metrics(items):
+    return {key: round(float(np.mean([m[key] for m in items])), 4) for key in items[0]}
+
+
+def full_res_avatar(image, mask, size):
+    """全分辨率抠图后缩放到头像尺寸，与 chinese_id_gen 粘贴头像前的缩放相同"""
+    return rembg_engine.cutout(image, mask).resize(size, quality_presets.get_preset().resample)
+
+
+def load_sources(input_dir, limit):
+    names = sorted(name for name in os.listdir(input_dir) if name.lower().endswith(SUPPORTED_FORMATS))[:limit]
+    return [Image.open(os.path.join(input_dir, name)).convert("RGB") for name in names]
+
+
+def run_oracle(sizes, count, output_size, input_size, rounds):
+    """用真实 alpha 模拟模型输出，比较掩码放大方式"""
+    results = {}
+    for size in sizes:
+        fixtures = [bench_fixtures.make_matting_fixture(size, seed) for seed in range(count)]
+        images = [image for image, _ in fixtures]
+        references = [cv2.resize(alpha, output_size, interpolation=cv2.INTER_AREA) for _, alpha in fixtures]
+        full_masks = [Image.fromarray(alpha, "L") for _, alpha in fixtures]
+        low_masks = [Image.fromarray(cv2.GaussianBlur(cv2.resize(alpha, input_size, interpolation=cv2.INTER_AREA),
+                                                      (0, 0), ORACLE_BLUR_SIGMA), "L")
+                     for _, alpha in fixtures]
+        label = f"{size[0]}x{size[1]}"
+        print(f"\n📐 {label}（{count} 张，模型输入 {input_size[0]}x{input_size[1]}）")
+        print(f"  {'方式':<14}{'张/秒':>10}{'MAE':>8}{'边缘MAE':>10}{'IoU':>8}")
+
+        resample = quality_presets.get_preset().resample
+
+        def low_res(radius):
+            def run():
+                avatars = []
+                for image, mask in zip(images, low_masks):
+                    guide = image.resize(output_size, resample)
+                    avatars.append(rembg_engine.cutout(guide, rembg_engine.upsample_mask(mask, guide, radius)))
+                return avatars
+            return run
+
+        methods = {
+            "full": lambda: [full_res_avatar(image, mask, output_size) for image, mask in zip(images, full_masks)],
+            "low-res-bilinear": low_res(0),
+            "low-res-guided": low_res(rembg_engine.GUIDED_RADIUS),
+        }
+        for name, run in methods.items():
+            rate, seconds = measure(run, 1, rounds)
+            avatars = run()
+            metrics = mean_metrics([alpha_metrics(np.asarray(avatar)[..., 3], reference)
+                                    for avatar, reference in zip(avatars, references)])
+            results[f"oracle/{name}/{label}"] = dict(
+                {"value": round(rate * count, 3), "unit": "images/s", "seconds": round(seconds, 4)}, **metrics)
+            print(f"  {name:<14}{rate * count:>10.2f}{metrics['mae']:>8.2f}{metrics['edge_mae']:>10.2f}"
+                  f"{metrics['iou']:>8.4f}")
+    return results
+
+
+def run_model(groups, model_name, output_size, batch_size, rounds):
+    """实际推理：low-res 的 alpha 与 full 缩放后的 alpha 对比"""
+    full = rembg_engine.BackgroundRemover(model_name, batch_size=batch_size)
+    low = rembg_engine.BackgroundRemover(model_name, batch_size=batch_size, output_size=output_size)
+    resample = quality_presets.get_preset().resample
+    results = {}
+    for label, images in groups.items():
+        print(f"\n📐 {label}（{len(images)} 张，模型 {model_name}）")
+        print(f"  {'方式':<14}{'张/秒':>10}{'MAE':>8}{'边缘MAE':>10}{'IoU':>8}")
+
+        def run_full():
+            avatars = []
+            for start in range(0, len(images), batch_size):
+                avatars += [avatar.resize(output_size, resample)
+                            for avatar in full.remove_batch(images[start:start + batch_size])]
+            return avatars
+
+        def run_low():
+            avatars = []
+            for start in range(0, len(images), batch_size):
+                avatars += low.remove_batch(images[start:start + batch_size])
+            return avatars
+
+        references = [np.asarray(avatar)[..., 3] for avatar in run_full()]
+        for name, run in (("full", run_full), ("low-res", run_low)):
+            rate, seconds = measure(run, 1, rounds)
+            metrics = mean_metrics([alpha_metrics(np.asarray(avatar)[..., 3], reference)
+                                    for avatar, reference in zip(run(), references)])
+            results[f"model/{name}/{label}"] = dict(
+                {"value": round(rate * len(images), 3), "unit": "images/s", "seconds": round(seconds, 4)}, **metrics)
+            print(f"  {name:<14}{rate * len(images):>10.2f}{metrics['mae']:>8.2f}{metrics['edge_mae']:>10.2f}"
+                  f"{metrics['iou']:>8.4f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="去背景全分辨率与低分辨率模式的质量/速度对比")
+    parser.add_argument("--mode", choices=["auto", "model", "oracle"], default="auto",
+                        help="auto: 安装了 rembg 时用 model，否则用 oracle")
+    parser.add_argument("--input", help="真实头像目录（model 模式），不指定时使用合成人像")
+    parser.add_argument("--limit", type=int, default=16, help="--input 时最多读取的图片数")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, metavar="WxH", help="合成人像尺寸")
+    parser.add_argument("--count", type=int, default=4, help="每个尺寸的合成人像数量")
+    parser.add_argument("--output-size", default="308x376", metavar="WxH", help="头像尺寸")
+    parser.add_argument("--model", default=rembg_engine.DEFAULT_MODEL, help="rembg 模型名称")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3, help="每项重复轮数，取最快一轮")
+    parser.add_argument("--quality", choices=list(quality_presets.PRESETS), default=quality_presets.DEFAULT_PRESET)
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--compare", metavar="BASELINE", help="与之前的 JSON 结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="允许的吞吐量下降比例（默认 10%%）")
+    args = parser.parse_args()
+
+    quality_presets.set_preset(args.quality)
+    output_size = parse_size(args.output_size)
+    sizes = [parse_size(value) for value in args.sizes]
+    mode = args.mode
+    if mode == "auto":
+        try:
+            import rembg  # noqa: F401
+            mode = "model"
+        except ImportError:
+            print("ℹ️  未安装 rembg，使用 oracle 模式（真实 alpha 代替模型输出）")
+            mode = "oracle"
+    print(f"🏁 去背景基准（{mode} 模式，头像 {output_size[0]}x{output_size[1]}，质量档位 {args.quality}）")
+
+    if mode == "model":
+        if args.input:
+            groups = {os.path.basename(os.path.normpath(args.input)): load_sources(args.input, args.limit)}
+        else:
+            groups = {f"{w}x{h}": [bench_fixtures.make_matting_fixture((w, h), seed)[0] for seed in range(args.count)]
+                      for w, h in sizes}
+        results = run_model(groups, args.model, output_size, args.batch_size, args.rounds)
+    else:
+        results = run_oracle(sizes, args.count, output_size, rembg_engine.U2NET_SIZE, args.rounds)
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "mode": mode,
+            "model": args.model if mode == "model" else None,
+            "output_size": list(output_size),
+            "guided_radius": rembg_engine.GUIDED_RADIUS,
+            "guided_eps": rembg_engine.GUIDED_EPS,
+            "oracle_blur_sigma": ORACLE_BLUR_SIGMA if mode == "oracle" else None,
+            "quality": args.quality,
+            "rounds": args.rounds,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已写入: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ 吞吐量下降超过 {args.tolerance * 100:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ 没有发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
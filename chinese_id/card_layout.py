@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+身份证拼版引擎
+把正面、反面（或多张卡片）按水平、垂直、网格方式拼到同一张透明画布上。
+
+模板尺寸固定，因此:
+    - 每种 (布局, 间距, 卡片数, 列数, 卡片尺寸) 的画布尺寸和偏移只计算一次
+    - 每种画布尺寸缓存一张空白透明画布，使用时复制
+    - 同一次调用生成多种布局时，反面只缩放一次
+每张子图在画布上的位置以 placements 返回，可直接写入标注文件。
+"""
+
+import json
+import math
+import os
+
+from PIL import Image
+
+import quality_presets
+
+LAYOUTS = ("horizontal", "vertical", "grid")
+
+
+class CardLayoutEngine:
+    """
+    拼版引擎，进程内复用以共享布局和画布缓存
+
+    Args:
+        card_size: 统一的卡片尺寸 (w, h)，None 表示使用第一张卡片（正面）的尺寸
+        resample: 卡片缩放使用的重采样滤镜，None 表示跟随全局质量档位
+    """
+
+    def __init__(self, card_size=None, resample=None):
+        self.card_size = card_size
+        self.resample = resample
+        self._plans = {}
+        self._canvas_pool = {}
+
+    def plan(self, layout, spacing, count=2, columns=None, card_size=None):
+        """
+        计算布局的画布尺寸和每张卡片的左上角偏移（结果缓存）
+
+        Args:
+            layout: 'horizontal'、'vertical' 或 'grid'
+            spacing: 卡片之间的间距（像素）
+            count: 卡片数量
+            columns: 网格列数，默认取 ceil(sqrt(count))
+            card_size: 卡片尺寸
+
+        Returns:
+            tuple: ((画布宽, 画布高), [(x, y), ...])
+        """
+        card_size = card_size or self.card_size
+        key = (layout, spacing, count, columns, card_size)
+        cached = self._plans.get(key)
+        if cached is not None:
+            return cached
+
+        width, height = card_size
+        if layout == "horizontal":
+            rows, cols = 1, count
+        elif layout == "vertical":
+            rows, cols = count, 1
+        elif layout == "grid":
+            cols = columns or math.ceil(math.sqrt(count))
+            rows = math.ceil(count / cols)
+        else:
+            raise ValueError(f"layout 参数必须是 {', '.join(LAYOUTS)} 之一")
+
+        canvas_size = (width * cols + spacing * (cols - 1), height * rows + spacing * (rows - 1))
+        offsets = [((i % cols) * (width + spacing), (i // cols) * (height + spacing)) for i in range(count)]
+        self._plans[key] = (canvas_size, offsets)
+        return canvas_size, offsets
+
+    def new_canvas(self, size):
+        """从画布池复制一张空白透明画布"""
+        blank = self._canvas_pool.get(size)
+        if blank is None:
+            blank = Image.new("RGBA", size, (255, 255, 255, 0))
+            self._canvas_pool[size] = blank
+        return blank.copy()
+
+    def fit(self, image, size):
+        """统一为 RGBA 并缩放到卡片尺寸，尺寸一致时不做缩放"""
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        if image.size != size:
+            resample = self.resample if self.resample is not None else quality_presets.get_preset().resample
+            image = image.resize(size, resample)
+        return image
+
+    def fit_cards(self, cards):
+        """
+        把 [(标签, 图片), ...] 统一到同一卡片尺寸
+
+        Returns:
+            tuple: (卡片尺寸, [(标签, 缩放后图片), ...])
+        """
+        card_size = self.card_size or cards[0][1].size
+        return card_size, [(label, self.fit(image, card_size)) for label, image in cards]
+
+    def compose_fitted(self, card_size, cards, layout, spacing, columns=None):
+        """在已统一尺寸的卡片上生成一种布局，返回 (画布, placements)"""
+        canvas_size, offsets = self.plan(layout, spacing, len(cards), columns, card_size)
+        canvas = self.new_canvas(canvas_size)
+        placements = []
+        for (label, image), (x, y) in zip(cards, offsets):
+            canvas.paste(image, (x, y), image)
+            placements.append({"label": label, "box": [x, y, card_size[0], card_size[1]]})
+        return canvas, placements
+
+    def compose(self, cards, layout, spacing, columns=None):
+        """
+        拼版
+
+        Args:
+            cards: [(标签, PIL.Image), ...]
+            layout: 'horizontal'、'vertical' 或 'grid'
+            spacing: 间距（像素）
+            columns: 网格列数
+
+        Returns:
+            tuple: (RGBA 画布, [{'label', 'box': [x, y, w, h]}, ...])
+        """
+        card_size, fitted = self.fit_cards(cards)
+        return self.compose_fitted(card_size, fitted, layout, spacing, columns)
+
+    def compose_many(self, cards, layouts):
+        """
+        同一组卡片一次生成多种布局，卡片只缩放一次
+
+        Args:
+            cards: [(标签, PIL.Image), ...]
+            layouts: [(布局, 间距), ...] 或 [(布局, 间距, 列数), ...]
+
+        Returns:
+            list: 与 layouts 顺序一致的 (画布, placements)
+        """
+        card_size, fitted = self.fit_cards(cards)
+        return [self.compose_fitted(card_size, fitted, *spec) for spec in layouts]
+
+
+def save_layout_labels(path, entries):
+    """
+    写入拼版标注文件
+
+    Args:
+        path: JSON 输出路径
+        entries: {布局名: {'file': 文件名, 'size': [w, h], 'cards': placements}}
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+
+
+def layout_label_entry(output_path, canvas, placements):
+    """生成单个拼版图的标注条目"""
+    return {"file": os.path.basename(output_path), "size": list(canvas.size), "cards": placements}
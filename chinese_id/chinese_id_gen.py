@@ -7,6 +7,12 @@ import os
 import textwrap
 import requests
 from io import BytesIO
+import argparse
+from functools import lru_cache
+import font_resolver
+from card_layout import CardLayoutEngine, layout_label_entry, save_layout_labels
+from stage_profiler import profiler
+import quality_presets
 
 
 # 加粗方法配置
@@ -41,6 +47,8 @@ STROKE_WIDTH = 0.5  # 描边宽度：0.5=细描边，1.0=中等描边，1.5=粗
 # 创建一个支持中文的Faker实例
 fake = Faker('zh_CN')
 
+# 模板与脚本放在同一目录，按脚本位置查找，不依赖当前工作目录
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 
@@ -49,16 +57,19 @@ fake = Faker('zh_CN')
 
 
 
-def generate_id_card_front_image(info, output_path, avatar_path=None):
+
+def render_id_card_front(info, avatar_path=None):
+    """绘制身份证正面（不保存），返回 RGBA 图片"""
     # 设置模板路径
-    template_path = "id_card_template_front.png"
+    template_path = os.path.join(TEMPLATE_DIR, "id_card_template_front.png")
     
     # 1. 打开模板图片
-    template = Image.open(template_path)
-    
-    # 2. 保持RGBA模式以支持透明通道
-    if template.mode != 'RGBA':
-        template = template.convert('RGBA')
+    with profiler.stage("template_load"):
+        template = Image.open(template_path)
+        
+        # 2. 保持RGBA模式以支持透明通道
+        if template.mode != 'RGBA':
+            template = template.convert('RGBA')
     
     draw = ImageDraw.Draw(template)
     
@@ -99,57 +110,72 @@ def generate_id_card_front_image(info, output_path, avatar_path=None):
             x += char_width + spacing
     
     # 绘制各个字段（带字间距和加粗）
-    draw_text_with_spacing(draw, info['name'], coordinates['name'], font_front_big, spacing=8, bold=True)      # 姓名加粗
-    draw_text_with_spacing(draw, info['sex'], coordinates['sex'], font_front, spacing=6, bold=False)      # 性别加粗
-    draw_text_with_spacing(draw, info['nation'], coordinates['nation'], font_front, spacing=6, bold=False) # 民族加粗
-    draw_text_with_spacing(draw, info['year'], coordinates['year'], font_front, spacing=3, bold=False)   # 年份不加粗
-    draw_text_with_spacing(draw, info['month'], coordinates['month'], font_front, spacing=3, bold=False) # 月份不加粗
-    draw_text_with_spacing(draw, info['day'], coordinates['day'], font_front, spacing=3, bold=False)    # 日期不加粗
-    draw_text_with_spacing(draw, info['id_number'], coordinates['id_number'], font_front, spacing=4, bold=True) # 身份证号加粗
+    _, _, font_front, font_front_big = get_fonts()
+    with profiler.stage("text_draw"):
+        draw_text_with_spacing(draw, info['name'], coordinates['name'], font_front_big, spacing=8, bold=True)      # 姓名加粗
+        draw_text_with_spacing(draw, info['sex'], coordinates['sex'], font_front, spacing=6, bold=False)      # 性别加粗
+        draw_text_with_spacing(draw, info['nation'], coordinates['nation'], font_front, spacing=6, bold=False) # 民族加粗
+        draw_text_with_spacing(draw, info['year'], coordinates['year'], font_front, spacing=3, bold=False)   # 年份不加粗
+        draw_text_with_spacing(draw, info['month'], coordinates['month'], font_front, spacing=3, bold=False) # 月份不加粗
+        draw_text_with_spacing(draw, info['day'], coordinates['day'], font_front, spacing=3, bold=False)    # 日期不加粗
+        draw_text_with_spacing(draw, info['id_number'], coordinates['id_number'], font_front, spacing=4, bold=True) # 身份证号加粗
 
         # 地址可能很长，需要自动换行
-    address_lines = textwrap.wrap(info['address'], width=11)
-    for i, line in enumerate(address_lines):
-        # 计算每行的位置：x坐标保持不变，y坐标递增
-        line_position = (coordinates['address'][0], coordinates['address'][1] + i * 40)
-        draw_text_with_spacing(draw, line, line_position, font_front, spacing=0, bold=False)  # 地址不加粗
+        address_lines = textwrap.wrap(info['address'], width=11)
+        for i, line in enumerate(address_lines):
+            # 计算每行的位置：x坐标保持不变，y坐标递增
+            line_position = (coordinates['address'][0], coordinates['address'][1] + i * 40)
+            draw_text_with_spacing(draw, line, line_position, font_front, spacing=0, bold=False)  # 地址不加粗
 
     # 6. 处理头像粘贴
     if avatar_path and os.path.exists(avatar_path):
         try:
-            # 打开头像图片（已经是去除背景的透明图片）
-            avatar = Image.open(avatar_path)
-            
-            # 确保头像是RGBA模式（保持透明通道）
-            if avatar.mode != 'RGBA':
-                avatar = avatar.convert('RGBA')
-            
-            # 调整头像大小为指定尺寸 (308, 376)
-            avatar_resized = avatar.resize((308, 376), Image.Resampling.LANCZOS)
-            
-            # 将头像粘贴到身份证图片上
-            template.paste(avatar_resized, coordinates['photo'], avatar_resized)
+            with profiler.stage("avatar_paste"):
+                # 打开头像图片（已经是去除背景的透明图片）
+                avatar = Image.open(avatar_path)
+                
+                # 确保头像是RGBA模式（保持透明通道）
+                if avatar.mode != 'RGBA':
+                    avatar = avatar.convert('RGBA')
+                
+                # 调整头像大小为指定尺寸 (308, 376)
+                avatar_resized = avatar.resize((308, 376), quality_presets.get_preset().resample)
+                
+                # 将头像粘贴到身份证图片上
+                template.paste(avatar_resized, coordinates['photo'], avatar_resized)
             
             print(f"成功粘贴头像: {os.path.basename(avatar_path)}")
             
         except Exception as e:
             print(f"头像粘贴失败: {e}")
     
+    return template
+
+
+def generate_id_card_front_image(info, output_path, avatar_path=None):
+    template = render_id_card_front(info, avatar_path)
+    
     # 7. 保存生成的图像和标注信息
-    template.save(os.path.join(output_path, f"{info['id_number']}_front.png"))
+    with profiler.stage("encode_png"):
+        template.save(os.path.join(output_path, f"{info['id_number']}_front.png"),
+                      compress_level=quality_presets.get_preset().png_compress_level)
+    profiler.count("cards_front")
+    return template
     
 
 
-def generate_id_card_back_image(info, output_path):
+def render_id_card_back(info):
+    """绘制身份证反面（不保存），返回 RGBA 图片"""
     # 设置模板路径
-    template_path = "id_card_template_back.png"
+    template_path = os.path.join(TEMPLATE_DIR, "id_card_template_back.png")
     
     # 1. 打开模板图片
-    template = Image.open(template_path)
-    
-    # 2. 保持RGBA模式以支持透明通道
-    if template.mode != 'RGBA':
-        template = template.convert('RGBA')
+    with profiler.stage("template_load"):
+        template = Image.open(template_path)
+        
+        # 2. 保持RGBA模式以支持透明通道
+        if template.mode != 'RGBA':
+            template = template.convert('RGBA')
     
     draw = ImageDraw.Draw(template)
     
@@ -184,327 +210,398 @@ def generate_id_card_back_image(info, output_path):
             x += char_width + spacing
     
     # 绘制各个字段（带字间距和加粗）
-    draw_text_with_spacing(draw, info['authority'], coordinates['authority'], font, spacing=0, bold=True)      # 签发机关加粗
-    draw_text_with_spacing(draw, info['valid_date'], coordinates['valid_date'], font_big, spacing=0, bold=True) # 有效期加粗
+    font, font_big, _, _ = get_fonts()
+    with profiler.stage("text_draw"):
+        draw_text_with_spacing(draw, info['authority'], coordinates['authority'], font, spacing=0, bold=True)      # 签发机关加粗
+        draw_text_with_spacing(draw, info['valid_date'], coordinates['valid_date'], font_big, spacing=0, bold=True) # 有效期加粗
     
     # 6. （可选）生成并粘贴虚拟头像
     # ...
     
+    return template
+
+
+def generate_id_card_back_image(info, output_path):
+    template = render_id_card_back(info)
+    
     # 7. 保存生成的图像和标注信息
-    template.save(os.path.join(output_path, f"{info['id_number']}_back.png"))
+    with profiler.stage("encode_png"):
+        template.save(os.path.join(output_path, f"{info['id_number']}_back.png"),
+                      compress_level=quality_presets.get_preset().png_compress_level)
+    profiler.count("cards_back")
+    return template
     
 
         
 # 主循环
 output_base_dir = "chinese_ids"  # 基础输出目录
 faces_tr_dir = "faces_tr"  # 去除背景后的头像目录
-os.makedirs(output_base_dir, exist_ok=True)
+background_base_dir = "desktop_backgrounds"  # 背景图片目录
 
-# 加载中文字体！这是关键！
-try:
+def load_fonts():
+    """
+    加载中文字体！这是关键！
+    
+    Returns:
+        tuple: (font, font_big, font_front, font_front_big)
+    """
     if BOLD_METHOD in ["font", "both"]:
         # 优先使用粗体字体
-        font_paths = [
-            "C:/Windows/Fonts/simsun.ttc",     # 宋体
-            "C:/Windows/Fonts/msyhbd.ttc",     # 微软雅黑粗体
-            "C:/Windows/Fonts/simhei.ttf",      # 黑体
-
-            "C:/Windows/Fonts/simkai.ttf",     # 楷体
-            "C:/Windows/Fonts/msyh.ttc",       # 微软雅黑
-        ]
+        preferred = ["simsun.ttc", "msyhbd.ttc", "simhei.ttf", "simkai.ttf", "msyh.ttc"]
     else:
         # 使用普通字体
-        font_paths = [
-            "C:/Windows/Fonts/simsun.ttc",     # 宋体
-            "C:/Windows/Fonts/msyh.ttc",       # 微软雅黑
-            "C:/Windows/Fonts/simhei.ttf",      # 黑体
-            "C:/Windows/Fonts/simkai.ttf",     # 楷体
-        ]
-    
-    font = None
-    font_big = None
-    font_front = None
-    font_front_big = None
-    for font_path in font_paths:
-        try:
-            font = ImageFont.truetype(font_path, 20)
-            font_big = ImageFont.truetype(font_path, 22)
-            font_front = ImageFont.truetype(font_path, 35)
-            font_front_big = ImageFont.truetype(font_path, 40)
-            print(f"成功加载字体: {font_path}")
-            break
-        except IOError:
-            continue
-    
-    if font is None:
-        raise IOError("未找到可用字体")
-        
-except IOError:
-    print("警告：未找到指定字体，使用默认字体，中文可能显示异常")
-    font = ImageFont.load_default()
-    font_big = ImageFont.load_default()
-    font_front = ImageFont.load_default()
-    font_front_big = ImageFont.load_default()
+        preferred = ["simsun.ttc", "msyh.ttc", "simhei.ttf", "simkai.ttf"]
+    preferred += font_resolver.DEFAULT_PREFERRED_FONTS
+    
+    font_path = font_resolver.resolve_font_path(preferred=preferred)
+    if font_path:
+        print(f"成功加载字体: {font_path}")
+    return font_resolver.load_fonts((20, 22, 35, 40), preferred=preferred)
+
+
+@lru_cache(maxsize=1)
+def get_fonts():
+    """首次使用时加载字体（在 --profile 开启之后，耗时计入 font_load 阶段），之后复用"""
+    with profiler.stage("font_load"):
+        return load_fonts()
+
+# 拼版引擎：进程内共享布局和画布缓存
+layout_engine = CardLayoutEngine()
+
+
+def open_card_image(image_or_path):
+    """接受图片路径或已在内存中的 PIL 图片，避免刚保存的图片再从磁盘读一遍"""
+    if isinstance(image_or_path, Image.Image):
+        return image_or_path
+    with profiler.stage("card_load"):
+        image = Image.open(image_or_path)
+        image.load()
+    return image
+
+
+def combine_id_card_layouts(front, back, output_paths):
+    """
+    一次生成正反面的多种合并图片，正反面只读取、缩放一次
+    
+    Args:
+        front: 正面图片路径或 PIL 图片
+        back: 反面图片路径或 PIL 图片
+        output_paths: {排列方式: 输出路径}，排列方式为 'horizontal'、'vertical' 或 'grid'
+    
+    Returns:
+        dict: {排列方式: (合并图片, 标注条目)}，标注条目记录每张子图的偏移
+    """
+    front_img = open_card_image(front)
+    back_img = open_card_image(back)
+    
+    # 每种排列随机设置正反面之间的间距（10-50 像素）
+    layouts = [(layout, random.randint(10, 50)) for layout in output_paths]
+    
+    with profiler.stage("combine"):
+        # 确保两张图片大小一致（使用正面图片的尺寸作为标准）
+        sheets = layout_engine.compose_many([("front", front_img), ("back", back_img)], layouts)
+    
+    results = {}
+    for (layout, spacing), (combined_image, placements) in zip(layouts, sheets):
+        output_path = output_paths[layout]
+        # 保存合并图片
+        with profiler.stage("encode_png"):
+            combined_image.save(output_path, format='PNG',
+                                compress_level=quality_presets.get_preset().png_compress_level)
+        profiler.count("combined")
+        print(f"已生成合并图片: {os.path.basename(output_path)} ({layout} 排列, 间距 {spacing}px)")
+        results[layout] = (combined_image, layout_label_entry(output_path, combined_image, placements))
+    return results
+
 
 def combine_id_card_images(front_path, back_path, output_path, layout='horizontal'):
     """
     合并身份证正面和反面图片
     
     Args:
-        front_path: 正面图片路径
-        back_path: 反面图片路径  
+        front_path: 正面图片路径（或 PIL 图片）
+        back_path: 反面图片路径（或 PIL 图片）
         output_path: 输出路径
-        layout: 排列方式，'horizontal' 为水平排列，'vertical' 为垂直排列
+        layout: 排列方式，'horizontal' 为水平排列，'vertical' 为垂直排列，'grid' 为网格排列
+    
+    Returns:
+        list: 每张子图的位置 [{'label', 'box': [x, y, w, h]}, ...]，失败时返回 None
     """
     try:
-        # 打开正面和反面图片
-        front_img = Image.open(front_path)
-        back_img = Image.open(back_path)
-        
-        # 确保两张图片大小一致（使用正面图片的尺寸作为标准）
-        target_size = front_img.size
-        back_img_resized = back_img.resize(target_size, Image.Resampling.LANCZOS)
-        
-        # 随机设置正反面之间的间距（10-50 像素）
-        spacing = random.randint(10, 50)
-
-        # 根据布局方式创建合并图片
-        if layout == 'horizontal':
-            # 水平排列：正面在左，反面在右
-            combined_width = target_size[0] * 2 + spacing
-            combined_height = target_size[1]
-            combined_image = Image.new('RGBA', (combined_width, combined_height), (255, 255, 255, 0))
-            
-            # 粘贴图片
-            combined_image.paste(front_img, (0, 0), front_img)
-            combined_image.paste(back_img_resized, (target_size[0] + spacing, 0), back_img_resized)
-            
-        elif layout == 'vertical':
-            # 垂直排列：正面在上，反面在下
-            combined_width = target_size[0]
-            combined_height = target_size[1] * 2 + spacing
-            combined_image = Image.new('RGBA', (combined_width, combined_height), (255, 255, 255, 0))
-            
-            # 粘贴图片
-            combined_image.paste(front_img, (0, 0), front_img)
-            combined_image.paste(back_img_resized, (0, target_size[1] + spacing), back_img_resized)
-        
-        else:
-            raise ValueError("layout 参数必须是 'horizontal' 或 'vertical'")
-        
-        # 保存合并图片
-        combined_image.save(output_path, format='PNG')
-        print(f"已生成合并图片: {os.path.basename(output_path)} ({layout} 排列, 间距 {spacing}px)")
+        results = combine_id_card_layouts(front_path, back_path, {layout: output_path})
+        return results[layout][1]["cards"]
         
     except Exception as e:
         print(f"合并图片失败: {e}")
+        return None
+
+
+def list_background_files(background_dir):
+    """递归列出背景目录下的所有图片文件"""
+    background_files = []
+    for root, dirs, files in os.walk(background_dir):
+        for file in files:
+            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                background_files.append(os.path.join(root, file))
+    return background_files
+
+
+def render_composite(id_card, background_path):
+    """
+    把身份证图片随机缩放后合成到指定背景上（不保存）
+    
+    Args:
+        id_card: 身份证 PIL 图片
+        background_path: 背景图片路径
+    
+    Returns:
+        tuple: (合成后的 RGB 图片, {'scale_factor', 'size', 'position'})
+    """
+    with profiler.stage("bg_load"):
+        background = Image.open(background_path)
+        background.load()
+    
+    # 3. 调整背景尺寸为 4000x3000（草稿档位使用更小的尺寸）
+    preset = quality_presets.get_preset()
+    with profiler.stage("bg_resize"):
+        background_resized = background.resize(preset.background_size, preset.resample)
+    
+    # 4. 随机缩放身份证图片到背景图片尺寸的40%-90%
+    # 随机选择缩放比例
+    scale_factor = random.uniform(0.4, 0.9)
+    
+    # 计算身份证应该的尺寸（背景图片尺寸的随机比例）
+    target_width = int(background_resized.width * scale_factor)
+    target_height = int(target_width * id_card.height / id_card.width)  # 保持宽高比
+    
+    # 如果高度超过背景高度的随机比例，则按高度计算
+    if target_height > background_resized.height * scale_factor:
+        target_height = int(background_resized.height * scale_factor)
+        target_width = int(target_height * id_card.width / id_card.height)  # 保持宽高比
+    
+    with profiler.stage("card_resize"):
+        id_card_resized = id_card.resize((target_width, target_height), preset.resample)
+    
+    # 5. 随机选择放置位置（确保身份证完全在背景内）
+    max_x = background_resized.width - id_card_resized.width
+    max_y = background_resized.height - id_card_resized.height
+    
+    # 确保有足够的边距
+    margin = 50
+    max_x = max(margin, max_x - margin)
+    max_y = max(margin, max_y - margin)
+    
+    if max_x > 0 and max_y > 0:
+        x = random.randint(margin, max_x)
+        y = random.randint(margin, max_y)
+    else:
+        # 如果背景太小，居中放置
+        x = (background_resized.width - id_card_resized.width) // 2
+        y = (background_resized.height - id_card_resized.height) // 2
+    
+    # 6. 合成图片（缩放后的背景是新对象，直接在上面粘贴）
+    with profiler.stage("composite"):
+        result = background_resized
+        if result.mode != 'RGB':
+            result = result.convert('RGB')
+        
+        # 将身份证粘贴到背景上（使用透明通道）
+        if id_card_resized.mode == 'RGBA':
+            result.paste(id_card_resized, (x, y), id_card_resized)
+        else:
+            result.paste(id_card_resized, (x, y))
+    
+    return result, {'scale_factor': scale_factor, 'size': (target_width, target_height), 'position': (x, y)}
 
 
-def composite_id_card_on_background(id_card_path, output_path, background_dir="desktop_backgrounds"):
+def composite_id_card_on_background(id_card_path, output_path, background_dir=None):
     """
     将身份证图片合成到随机选择的背景图上
     
     Args:
-        id_card_path: 身份证图片路径
+        id_card_path: 身份证图片路径（或 PIL 图片）
         output_path: 输出路径
-        background_dir: 背景图片目录
+        background_dir: 背景图片目录，默认 background_base_dir
     """
+    background_dir = background_dir or background_base_dir
     try:
         # 1. 打开身份证图片
-        id_card = Image.open(id_card_path)
+        id_card = open_card_image(id_card_path)
         
         # 2. 随机选择背景图片
-        background_files = []
-        for root, dirs, files in os.walk(background_dir):
-            for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    background_files.append(os.path.join(root, file))
+        with profiler.stage("bg_scan"):
+            background_files = list_background_files(background_dir)
         
         if not background_files:
             raise FileNotFoundError(f"在 {background_dir} 目录中未找到背景图片")
         
         # 随机选择一个背景文件
         selected_background = random.choice(background_files)
-        background = Image.open(selected_background)
-        
-        # 3. 调整背景尺寸为 4000x3000
-        background_resized = background.resize((4000, 3000), Image.Resampling.LANCZOS)
-        
-        # 4. 随机缩放身份证图片到背景图片尺寸的40%-90%
-        # 随机选择缩放比例
-        scale_factor = random.uniform(0.4, 0.9)
-        
-        # 计算身份证应该的尺寸（背景图片尺寸的随机比例）
-        target_width = int(background_resized.width * scale_factor)
-        target_height = int(target_width * id_card.height / id_card.width)  # 保持宽高比
-        
-        # 如果高度超过背景高度的随机比例，则按高度计算
-        if target_height > background_resized.height * scale_factor:
-            target_height = int(background_resized.height * scale_factor)
-            target_width = int(target_height * id_card.width / id_card.height)  # 保持宽高比
-        
-        id_card_resized = id_card.resize((target_width, target_height), Image.Resampling.LANCZOS)
-        
-        # 5. 随机选择放置位置（确保身份证完全在背景内）
-        max_x = background_resized.width - id_card_resized.width
-        max_y = background_resized.height - id_card_resized.height
-        
-        # 确保有足够的边距
-        margin = 50
-        max_x = max(margin, max_x - margin)
-        max_y = max(margin, max_y - margin)
-        
-        if max_x > 0 and max_y > 0:
-            x = random.randint(margin, max_x)
-            y = random.randint(margin, max_y)
-        else:
-            # 如果背景太小，居中放置
-            x = (background_resized.width - id_card_resized.width) // 2
-            y = (background_resized.height - id_card_resized.height) // 2
-        
-        # 6. 合成图片
-        # 创建背景的副本
-        result = background_resized.copy()
-        
-        # 将身份证粘贴到背景上（使用透明通道）
-        if id_card_resized.mode == 'RGBA':
-            result.paste(id_card_resized, (x, y), id_card_resized)
-        else:
-            result.paste(id_card_resized, (x, y))
+        result, details = render_composite(id_card, selected_background)
         
         # 7. 保存结果
-        result.save(output_path, quality=95)
+        with profiler.stage("encode_jpeg"):
+            result.save(output_path, quality=quality_presets.get_preset().jpeg_quality)
+        profiler.count("composites")
         
+        scale_factor = details['scale_factor']
+        target_width, target_height = details['size']
+        x, y = details['position']
         print(f"已生成背景合成图片: {os.path.basename(output_path)}")
         print(f"  背景图片: {os.path.basename(selected_background)}")
         print(f"  缩放比例: {scale_factor:.2f} ({scale_factor*100:.1f}%)")
-        print(f"  身份证尺寸: {target_width}x{target_height} (背景的{target_width/background_resized.width*100:.1f}%x{target_height/background_resized.height*100:.1f}%)")
+        print(f"  身份证尺寸: {target_width}x{target_height} (背景的{target_width/result.width*100:.1f}%x{target_height/result.height*100:.1f}%)")
         print(f"  放置位置: ({x}, {y})")
         
     except Exception as e:
         print(f"背景合成失败: {e}")
 
 
-# 获取faces_tr目录下的男性和女性头像文件
-male_avatar_files = []
-female_avatar_files = []
-
-male_dir = os.path.join(faces_tr_dir, "male")
-female_dir = os.path.join(faces_tr_dir, "female")
-
-# 获取男性头像
-if os.path.exists(male_dir):
-    for file in os.listdir(male_dir):
-        if file.lower().endswith('.png'):  # 只处理PNG文件（保持透明通道）
-            male_avatar_files.append(os.path.join(male_dir, file))
-    print(f"找到 {len(male_avatar_files)} 个男性头像文件")
-else:
-    print(f"警告：{male_dir} 目录不存在")
-
-# 获取女性头像
-if os.path.exists(female_dir):
-    for file in os.listdir(female_dir):
-        if file.lower().endswith('.png'):  # 只处理PNG文件（保持透明通道）
-            female_avatar_files.append(os.path.join(female_dir, file))
-    print(f"找到 {len(female_avatar_files)} 个女性头像文件")
-else:
-    print(f"警告：{female_dir} 目录不存在")
-
+def list_avatar_files(directory):
+    """获取头像目录下的PNG文件（只处理PNG文件，保持透明通道）"""
+    return [os.path.join(directory, file) for file in os.listdir(directory)
+            if file.lower().endswith('.png')]
 
 
-
-# 导入真实信息生成函数
-from chinese_id_gen_realistic import generate_realistic_info
-
-# 生成男性身份证
-for i, avatar_path in enumerate(male_avatar_files):
-    # 生成男性身份证信息
-    info = generate_realistic_info(gender='男')
+def generate_person_images(info, avatar_path, gender_label):
+    """
+    为一个人生成全部身份证图片：正反面、两种合并图以及四张背景合成图
+    
+    Args:
+        info: generate_realistic_info 生成的身份证信息
+        avatar_path: 去除背景后的头像路径
+        gender_label: 日志中显示的性别（"男性"/"女性"）
     
+    Returns:
+        PIL.Image: 身份证正面图片（用于拼多卡网格）
+    """
     # 为每个姓名创建目录
     person_name = info['name']
     person_dir = os.path.join(output_base_dir, person_name)
     os.makedirs(person_dir, exist_ok=True)
     
-    print(f"为男性身份证 {info['id_number']} ({person_name}) 分配头像: {os.path.basename(avatar_path)}")
+    print(f"为{gender_label}身份证 {info['id_number']} ({person_name}) 分配头像: {os.path.basename(avatar_path)}")
     
     # 生成身份证正面和反面，保存到个人目录
-    generate_id_card_back_image(info, person_dir)
-    generate_id_card_front_image(info, person_dir, avatar_path)
-    
-    # 生成合并图片（水平排列）
-    front_path = os.path.join(person_dir, f"{info['id_number']}_front.png")
-    back_path = os.path.join(person_dir, f"{info['id_number']}_back.png")
-    combined_horizontal_path = os.path.join(person_dir, f"{info['id_number']}_combined_horizontal.png")
-    combine_id_card_images(front_path, back_path, combined_horizontal_path, 'horizontal')
-    
-    # 生成合并图片（垂直排列）
-    combined_vertical_path = os.path.join(person_dir, f"{info['id_number']}_combined_vertical.png")
-    combine_id_card_images(front_path, back_path, combined_vertical_path, 'vertical')
+    back_image = generate_id_card_back_image(info, person_dir)
+    front_image = generate_id_card_front_image(info, person_dir, avatar_path)
     
-    # 生成背景合成图片（正面）
-    front_bg_path = os.path.join(person_dir, f"{info['id_number']}_front_bg.jpg")
-    composite_id_card_on_background(front_path, front_bg_path)
-    
-    # 生成背景合成图片（反面）
-    back_bg_path = os.path.join(person_dir, f"{info['id_number']}_back_bg.jpg")
-    composite_id_card_on_background(back_path, back_bg_path)
-    
-    # 生成背景合成图片（水平合并）
-    combined_horizontal_bg_path = os.path.join(person_dir, f"{info['id_number']}_combined_horizontal_bg.jpg")
-    composite_id_card_on_background(combined_horizontal_path, combined_horizontal_bg_path)
+    # 生成合并图片（水平排列、垂直排列），正反面直接使用内存中的图片
+    prefix = os.path.join(person_dir, info['id_number'])
+    try:
+        combined = combine_id_card_layouts(front_image, back_image, {
+            'horizontal': f"{prefix}_combined_horizontal.png",
+            'vertical': f"{prefix}_combined_vertical.png",
+        })
+        
+        # 记录合并图片中正反面的位置，便于标注
+        save_layout_labels(f"{prefix}_layout.json", {layout: entry for layout, (_, entry) in combined.items()})
+    except Exception as e:
+        # 与单张合并失败时一样只跳过这个人的合并图片，不中断整批生成
+        print(f"合并图片失败: {e}")
+        combined = {}
     
-    # 生成背景合成图片（垂直合并）
-    combined_vertical_bg_path = os.path.join(person_dir, f"{info['id_number']}_combined_vertical_bg.jpg")
-    composite_id_card_on_background(combined_vertical_path, combined_vertical_bg_path)
+    # 生成背景合成图片（正面、反面、水平合并、垂直合并）
+    composite_id_card_on_background(front_image, f"{prefix}_front_bg.jpg")
+    composite_id_card_on_background(back_image, f"{prefix}_back_bg.jpg")
+    for layout in ('horizontal', 'vertical'):
+        if layout in combined:
+            composite_id_card_on_background(combined[layout][0], f"{prefix}_combined_{layout}_bg.jpg")
     
-    print(f"已生成男性 {person_name} 的身份证图片到目录: {person_dir}")
+    profiler.count("persons")
+    print(f"已生成{gender_label} {person_name} 的身份证图片到目录: {person_dir}")
+    return front_image
 
-# 生成女性身份证
-for i, avatar_path in enumerate(female_avatar_files):
-    # 生成女性身份证信息
-    info = generate_realistic_info(gender='女')
-    
-    # 为每个姓名创建目录
-    person_name = info['name']
-    person_dir = os.path.join(output_base_dir, person_name)
-    os.makedirs(person_dir, exist_ok=True)
-    
-    print(f"为女性身份证 {info['id_number']} ({person_name}) 分配头像: {os.path.basename(avatar_path)}")
-    
-    # 生成身份证正面和反面，保存到个人目录
-    generate_id_card_back_image(info, person_dir)
-    generate_id_card_front_image(info, person_dir, avatar_path)
+
+def save_card_sheet(cards, sheet_index, output_dir="chinese_id_sheets", columns=None):
+    """
+    把多人的身份证正面拼成一张网格图，并写入每张卡片的位置标注
     
-    # 生成合并图片（水平排列）
-    front_path = os.path.join(person_dir, f"{info['id_number']}_front.png")
-    back_path = os.path.join(person_dir, f"{info['id_number']}_back.png")
-    combined_horizontal_path = os.path.join(person_dir, f"{info['id_number']}_combined_horizontal.png")
-    combine_id_card_images(front_path, back_path, combined_horizontal_path, 'horizontal')
+    Args:
+        cards: [(身份证号, 正面图片), ...]
+        sheet_index: 网格图序号
+        output_dir: 输出目录
+        columns: 网格列数，默认接近正方形
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    sheet_path = os.path.join(output_dir, f"sheet_{sheet_index:04d}.png")
+    with profiler.stage("combine"):
+        sheet, placements = layout_engine.compose(cards, 'grid', random.randint(10, 50), columns)
+    with profiler.stage("encode_png"):
+        sheet.save(sheet_path, format='PNG', compress_level=quality_presets.get_preset().png_compress_level)
+    save_layout_labels(os.path.splitext(sheet_path)[0] + ".json",
+                       {'grid': layout_label_entry(sheet_path, sheet, placements)})
+    print(f"已生成多卡网格图: {sheet_path} ({len(cards)} 张)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量生成身份证图片")
+    parser.add_argument("--profile", action="store_true", help="统计各阶段耗时，退出时打印汇总表")
+    parser.add_argument("--trace", metavar="PATH", help="导出 Chrome trace JSON（隐含 --profile）")
+    parser.add_argument("--quality", choices=list(quality_presets.PRESETS),
+                        help="质量档位：draft/standard/final（默认 final，也可用环境变量 ID_QUALITY 设置）")
+    parser.add_argument("--sheet-cards", type=int, default=0, metavar="N",
+                        help="每 N 个人的身份证正面额外拼成一张网格图（0 表示不生成）")
+    args = parser.parse_args()
+    
+    if args.profile or args.trace:
+        profiler.enable(trace_path=args.trace)
+    if args.quality:
+        quality_presets.set_preset(args.quality)
+    print(f"质量档位: {quality_presets.get_preset().name}")
+    
+    os.makedirs(output_base_dir, exist_ok=True)
+    
+    # 获取faces_tr目录下的男性和女性头像文件
+    male_avatar_files = []
+    female_avatar_files = []
+    
+    male_dir = os.path.join(faces_tr_dir, "male")
+    female_dir = os.path.join(faces_tr_dir, "female")
+    
+    # 获取男性头像
+    if os.path.exists(male_dir):
+        male_avatar_files = list_avatar_files(male_dir)
+        print(f"找到 {len(male_avatar_files)} 个男性头像文件")
+    else:
+        print(f"警告：{male_dir} 目录不存在")
     
-    # 生成合并图片（垂直排列）
-    combined_vertical_path = os.path.join(person_dir, f"{info['id_number']}_combined_vertical.png")
-    combine_id_card_images(front_path, back_path, combined_vertical_path, 'vertical')
+    # 获取女性头像
+    if os.path.exists(female_dir):
+        female_avatar_files = list_avatar_files(female_dir)
+        print(f"找到 {len(female_avatar_files)} 个女性头像文件")
+    else:
+        print(f"警告：{female_dir} 目录不存在")
     
-    # 生成背景合成图片（正面）
-    front_bg_path = os.path.join(person_dir, f"{info['id_number']}_front_bg.jpg")
-    composite_id_card_on_background(front_path, front_bg_path)
+    # 导入真实信息生成函数
+    from chinese_id_gen_realistic import generate_realistic_info
     
-    # 生成背景合成图片（反面）
-    back_bg_path = os.path.join(person_dir, f"{info['id_number']}_back_bg.jpg")
-    composite_id_card_on_background(back_path, back_bg_path)
+    sheet_cards = []
+    sheet_count = 0
     
-    # 生成背景合成图片（水平合并）
-    combined_horizontal_bg_path = os.path.join(person_dir, f"{info['id_number']}_combined_horizontal_bg.jpg")
-    composite_id_card_on_background(combined_horizontal_path, combined_horizontal_bg_path)
+    # 先生成男性身份证，再生成女性身份证
+    jobs = [(path, '男', "男性") for path in male_avatar_files] + \
+           [(path, '女', "女性") for path in female_avatar_files]
+    for avatar_path, gender, gender_label in jobs:
+        with profiler.stage("info_gen"):
+            info = generate_realistic_info(gender=gender)
+        front_image = generate_person_images(info, avatar_path, gender_label)
+        
+        if args.sheet_cards > 0:
+            sheet_cards.append((info['id_number'], front_image))
+            if len(sheet_cards) == args.sheet_cards:
+                sheet_count += 1
+                save_card_sheet(sheet_cards, sheet_count)
+                sheet_cards = []
     
-    # 生成背景合成图片（垂直合并）
-    combined_vertical_bg_path = os.path.join(person_dir, f"{info['id_number']}_combined_vertical_bg.jpg")
-    composite_id_card_on_background(combined_vertical_path, combined_vertical_bg_path)
+    if sheet_cards:
+        save_card_sheet(sheet_cards, sheet_count + 1)
     
-    print(f"已生成女性 {person_name} 的身份证图片到目录: {person_dir}")
+    print(f"\n总计生成身份证数量:")
+    print(f"男性身份证: {len(male_avatar_files)} 张")
+    print(f"女性身份证: {len(female_avatar_files)} 张")
+    print(f"总计: {len(male_avatar_files) + len(female_avatar_files)} 张")
+
 
-print(f"\n总计生成身份证数量:")
-print(f"男性身份证: {len(male_avatar_files)} 张")
-print(f"女性身份证: {len(female_avatar_files)} 张")
-print(f"总计: {len(male_avatar_files) + len(female_avatar_files)} 张")
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,23 @@
-import albumentations as A
 import cv2
 import os
-from pathlib import Path
-import numpy as np
+import augment_registry
+import image_io
+import quality_presets
 
 # 设置环境变量解决OpenMP问题
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 
-# 定义一个简化的增强管道
-transform = A.Compose([
-    A.Affine(rotate=(-5, 5), p=0.5),
-    A.GaussianBlur(blur_limit=(3, 5), p=0.3),
-    A.GaussNoise(p=0.2),
-    A.ColorJitter(brightness=0.2, contrast=0.2, p=0.5),
-])
-
-def read_image_safe(image_path):
-    """安全地读取图片"""
-    try:
-        image_data = np.fromfile(str(image_path), dtype=np.uint8)
-        image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-        return image
-    except Exception as e:
-        print(f"读取图片失败: {e}")
-        return None
+# 与 batch_augment.py 相同的增强管道（规格见 augment_pipelines.json）
+transform = augment_registry.get_pipeline("batch_augment")
 
 def save_image_safe(image, output_path):
     """安全地保存图片"""
     try:
-        # 方法1: 使用numpy编码保存
-        encode_param = [int(cv2.IMWRITE_PNG_COMPRESSION), 9]
-        result, encoded_img = cv2.imencode('.png', image, encode_param)
-        
-        if result:
-            with open(output_path, 'wb') as f:
-                f.write(encoded_img.tobytes())
+        encode_param = [int(cv2.IMWRITE_PNG_COMPRESSION), quality_presets.get_preset().cv2_png_compression]
+        if image_io.write_image(output_path, image, encode_param):
             return True
-        else:
-            print("❌ 图片编码失败")
-            return False
+        print("❌ 图片编码失败")
+        return False
     except Exception as e:
         print(f"❌ 保存异常: {e}")
         return False
@@ -73,7 +52,7 @@ def debug_single_user():
         print(f"📂 图片路径: {image_path}")
         
         # 读取图片
-        image = read_image_safe(image_path)
+        image = image_io.read_image(image_path)
         if image is None:
             print("❌ 无法读取图片")
             return
@@ -120,6 +99,7 @@ def debug_single_user():
             import traceback
             traceback.print_exc()
     
+    image_io.print_io_stats()
     print(f"\n🎉 调试完成！")
 
 if __name__ == "__main__":
@@ -1,4 +1,3 @@
-import torch
 from PIL import Image, ImageEnhance, ImageFilter
 import numpy as np
 import logging
@@ -7,8 +6,10 @@ from datetime import datetime
 import os
 import cv2
 from typing import Tuple, Optional
-from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
-from transformers import CLIPTextModel, CLIPTokenizer
+import quality_presets
+from quality_gate import check_face
+from sd_batch import generate_batched
+from sd_server import get_generator
 
 # 配置日志
 logging.basicConfig(
@@ -26,13 +27,11 @@ class AdvancedFaceGenerator:
     高级人脸生成器，使用Stable Diffusion模型
     """
     def __init__(self):
-        self.pipeline = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"使用设备: {self.device}")
+        self.generator = None
         
     def load_model(self):
         """
-        加载Stable Diffusion模型
+        加载Stable Diffusion模型（生成服务 sd_server 在运行时直接使用服务中已加载的模型）
         """
         try:
             logger.info("正在加载Stable Diffusion模型...")
@@ -40,28 +39,10 @@ class AdvancedFaceGenerator:
             # 使用ID照片优化的模型
             model_id = "runwayml/stable-diffusion-v1-5"
             
-            # 创建pipeline
-            self.pipeline = StableDiffusionPipeline.from_pretrained(
-                model_id,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                safety_checker=None,
-                requires_safety_checking=False
-            )
+            # CUDA 上半精度并启用注意力/VAE 切片，CPU 上单精度（见 sd_backends.DiffusersBackend）
+            self.generator = get_generator(model_id)
             
-            # 使用更快的调度器
-            self.pipeline.scheduler = DPMSolverMultistepScheduler.from_config(
-                self.pipeline.scheduler.config
-            )
-            
-            # 移动到设备
-            self.pipeline = self.pipeline.to(self.device)
-            
-            # 启用内存优化
-            if self.device == "cuda":
-                self.pipeline.enable_attention_slicing()
-                self.pipeline.enable_vae_slicing()
-            
-            logger.info("Stable Diffusion模型加载成功")
+            logger.info(f"Stable Diffusion模型加载成功，使用: {self.generator.description}")
             return True
             
         except Exception as e:
@@ -75,7 +56,7 @@ class AdvancedFaceGenerator:
         """
         生成人脸图像
         """
-        if self.pipeline is None:
+        if self.generator is None:
             logger.error("模型未加载")
             return None
         
@@ -83,15 +64,14 @@ class AdvancedFaceGenerator:
             logger.info(f"开始生成人脸，提示词: {prompt}")
             
             # 生成图像
-            with torch.no_grad():
-                image = self.pipeline(
-                    prompt=prompt,
-                    negative_prompt=negative_prompt,
-                    width=width,
-                    height=height,
-                    num_inference_steps=num_inference_steps,
-                    guidance_scale=guidance_scale
-                ).images[0]
+            image, seed = self.generator.generate(
+                prompt,
+                negative_prompt,
+                width=width,
+                height=height,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale
+            )[0]
             
             logger.info("人脸生成成功")
             return image
@@ -122,21 +102,28 @@ class AdvancedFaceGenerator:
         
         return image
 
-def create_id_card_avatar(image: Image.Image, size: Tuple[int, int] = (308, 376)) -> Image.Image:
+def create_id_card_avatar(image: Image.Image, size: Tuple[int, int] = (308, 376), fused: bool = True) -> Image.Image:
     """
     创建符合身份证要求的头像 - 简化处理流程
+    
+    fused=True 时走 fused_avatar_postprocess 单次处理（结果与逐步处理一致，误差在 1 个灰度级以内，
+    RGB、RGBA、L 输入由 test_avatar_postprocess.py 检查）；
+    fused=False 时依次调用 crop_face_region、gentle_lighting_adjustment、create_solid_background
     """
     logger.info("开始创建身份证专用头像...")
     
     try:
-        # 1. 调整尺寸和裁剪 - 保持原始质量
-        cropped_face = crop_face_region(image, size)
-        
-        # 2. 轻微的光线调整 - 避免过度处理
-        adjusted_face = gentle_lighting_adjustment(cropped_face)
-        
-        # 3. 创建纯色背景
-        avatar_with_bg = create_solid_background(adjusted_face, size)
+        if fused:
+            avatar_with_bg = fused_avatar_postprocess(image, size)
+        else:
+            # 1. 调整尺寸和裁剪 - 保持原始质量
+            cropped_face = crop_face_region(image, size)
+            
+            # 2. 轻微的光线调整 - 避免过度处理
+            adjusted_face = gentle_lighting_adjustment(cropped_face)
+            
+            # 3. 创建纯色背景
+            avatar_with_bg = create_solid_background(adjusted_face, size)
         
         logger.info("身份证头像创建完成")
         return avatar_with_bg
@@ -145,6 +132,131 @@ def create_id_card_avatar(image: Image.Image, size: Tuple[int, int] = (308, 376)
         logger.error(f"身份证头像创建失败: {e}")
         return create_default_avatar(size)
 
+# 边缘增强（锐化）卷积核
+SHARPEN_KERNEL = np.array([[-1, -1, -1],
+                           [-1, 9, -1],
+                           [-1, -1, -1]], dtype=np.float32)
+
+# PIL 灰度转换（ITU-R 601-2）的权重
+GRAY_WEIGHTS = (0.299, 0.587, 0.114)
+
+def face_crop_box(image_size: Tuple[int, int], target_size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    计算头像裁剪框 (left, top, right, bottom)：确保包含完整的头部和肩部，不显示胸部
+    """
+    img_width, img_height = image_size
+    target_width, target_height = target_size
+    
+    # 计算宽高比
+    target_ratio = target_width / target_height
+    current_ratio = img_width / img_height
+    
+    # 身份证照片标准：头部占60-70%，肩部占30-40%，不显示胸部，头部上方留间距
+    if current_ratio > target_ratio:
+        # 图像太宽，需要裁剪宽度；保持完整高度，确保头部完整，并确保水平居中
+        new_width = int(img_height * target_ratio)
+        left = (img_width - new_width) // 2
+        return left, 0, left + new_width, img_height
+    
+    # 图像太高，需要裁剪高度
+    new_height = int(img_width / target_ratio)
+    
+    # 最终修复裁剪逻辑：使用最激进的保守裁剪策略，确保绝对不显示胸部
+    # 头部上方留20%间距，肩部下方留70%间距，中间10%显示头部和肩部
+    top = int(new_height * 0.20)                   # 头部上方间距20%
+    bottom = img_height - int(new_height * 0.70)   # 肩部下方间距70%
+    return 0, top, img_width, bottom
+
+def channel_histograms(array: np.ndarray) -> np.ndarray:
+    """各通道的 256 级直方图，形状 (通道数, 256)；之后的均值、标准差都由直方图计算，不再遍历整张图片"""
+    array = array.reshape(array.shape[0], array.shape[1], -1)
+    return np.stack([cv2.calcHist([array], [c], None, [256], [0, 256]).ravel() for c in range(array.shape[2])])
+
+def histogram_mean(hists: np.ndarray, lut: Optional[np.ndarray] = None) -> float:
+    """直方图对应图片（经过 lut 映射后）所有通道的平均值，等于 np.mean(图片)"""
+    values = np.arange(256, dtype=np.float64) if lut is None else lut.astype(np.float64)
+    return float((hists @ values).sum() / hists.sum())
+
+def histogram_std(hists: np.ndarray) -> float:
+    """直方图对应图片所有通道的标准差，等于 np.std(图片)"""
+    values = np.arange(256, dtype=np.float64)
+    total = hists.sum()
+    mean = (hists @ values).sum() / total
+    return float(np.sqrt(max((hists @ (values * values)).sum() / total - mean * mean, 0.0)))
+
+def histogram_gray_mean(hists: np.ndarray, lut: Optional[np.ndarray] = None) -> int:
+    """
+    ImageEnhance.Contrast 使用的灰度均值（取整）：按 RGB 各通道均值加权，
+    与 PIL 逐像素转换 L 后求均值相差不到 1
+    """
+    values = np.arange(256, dtype=np.float64) if lut is None else lut.astype(np.float64)
+    channel_means = (hists @ values) / hists[0].sum()
+    if len(channel_means) < 3:
+        return int(float(channel_means[0]) + 0.5)
+    return int(float(np.dot(GRAY_WEIGHTS, channel_means[:3])) + 0.5)
+
+def blend_lut(degenerate: float, factor: float) -> np.ndarray:
+    """
+    ImageEnhance 的 Image.blend(退化图, 图片, factor) 对纯色退化图的查找表：
+    与 PIL 相同按 float32 计算 degenerate + factor * (v - degenerate)，截断取整并限制在 0~255
+    """
+    values = np.arange(256, dtype=np.float32)
+    degenerate = np.float32(degenerate)
+    out = degenerate + np.float32(factor) * (values - degenerate)
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+def brightness_contrast_lut(hists: np.ndarray, brightness: float, contrast: float) -> np.ndarray:
+    """
+    把 ImageEnhance.Brightness(brightness) 之后再 ImageEnhance.Contrast(contrast) 合成一个查找表
+    （对比度的灰度均值由直方图经亮度查找表映射后计算，不需要生成中间图片）
+    """
+    lut = blend_lut(0, brightness)
+    if contrast != 1.0:
+        lut = blend_lut(histogram_gray_mean(hists, lut), contrast)[lut]
+    return lut
+
+def apply_color_lut(array: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """对颜色通道应用查找表，alpha 通道保持不变（与 ImageEnhance 对 RGBA 的处理一致）"""
+    if array.ndim == 3 and array.shape[2] == 4:
+        out = array.copy()
+        out[..., :3] = cv2.LUT(array[..., :3], lut)
+        return out
+    return cv2.LUT(array, lut)
+
+def fused_avatar_postprocess(image: Image.Image, size: Tuple[int, int] = (308, 376),
+                             sharpen: bool = False) -> Image.Image:
+    """
+    单次完成头像后处理：裁剪+缩放、亮度/对比度（一个查找表）、可选锐化（一次 filter2D 处理所有通道）、
+    合成到白色背景；PIL 与 NumPy 之间只转换一次进、一次出，均值只由一次直方图统计得到
+    
+    结果与 crop_face_region -> gentle_lighting_adjustment -> create_solid_background
+    （sharpen=True 时再接 enhance_ear_clarity）一致，误差在 1 个灰度级以内；
+    RGBA 输入与逐步处理相同丢弃 alpha（不与白色背景混合）
+    """
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    
+    # 裁剪和缩放（resize 的 box 参数会采样框外像素，边缘与先裁剪后缩放不同，所以先裁剪）
+    box = face_crop_box(image.size, size)
+    array = np.asarray(image.crop(box).resize(size, quality_presets.get_preset().resample))
+    
+    # 亮度/对比度：与 gentle_lighting_adjustment 相同的判断，合成一个查找表
+    hists = channel_histograms(array)
+    mean_brightness = histogram_mean(hists)
+    logger.info(f"原始图像平均亮度: {mean_brightness:.1f}")
+    brightness = 1.2 if mean_brightness < 100 else 0.9 if mean_brightness > 200 else 1.0
+    lut = brightness_contrast_lut(hists, brightness, 1.1)
+    logger.info(f"光线调整：亮度 x{brightness}，对比度 x1.1，最终平均亮度: {histogram_mean(hists, lut):.1f}")
+    
+    # 合成到纯白背景：裁剪框已缩放到目标尺寸，背景被完全覆盖，等于只保留颜色通道
+    # （create_solid_background 不带蒙版粘贴，RGBA 输入的 alpha 同样被丢弃，不与白色混合）
+    array = cv2.LUT(np.ascontiguousarray(array[..., :3]), lut)
+    
+    # 锐化：所有颜色通道一次 filter2D
+    if sharpen:
+        array = cv2.filter2D(array, -1, SHARPEN_KERNEL)
+    return Image.fromarray(array)
+
 def crop_face_region(image: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
     """
     裁剪人脸区域，确保包含完整的头部和肩部，不显示胸部
@@ -153,42 +265,12 @@ def crop_face_region(image: Image.Image, target_size: Tuple[int, int]) -> Image.
         logger.info("开始裁剪人脸区域...")
         
         # 身份证照片要求：头部完整可见，只显示到肩部，不显示胸部
-        img_width, img_height = image.size
-        target_width, target_height = target_size
-        
-        # 计算宽高比
-        target_ratio = target_width / target_height
-        current_ratio = img_width / img_height
-        
-        # 身份证照片标准：头部占60-70%，肩部占30-40%，不显示胸部，头部上方留间距
-        if current_ratio > target_ratio:
-            # 图像太宽，需要裁剪宽度
-            new_width = int(img_height * target_ratio)
-            left = (img_width - new_width) // 2
-            right = left + new_width
-            # 保持完整高度，确保头部完整，并确保水平居中
-            cropped = image.crop((left, 0, right, img_height))
-            logger.info(f"宽度裁剪：原始宽度{img_width} -> 新宽度{new_width}, 左边界{left}, 右边界{right}")
-        else:
-            # 图像太高，需要裁剪高度
-            new_height = int(img_width / target_ratio)
-            
-            # 最终修复裁剪逻辑：使用最激进的保守裁剪策略，确保绝对不显示胸部
-            # 头部上方留20%间距，肩部下方留70%间距，中间10%显示头部和肩部
-            top_margin = int(new_height * 0.20)      # 头部上方间距20%
-            bottom_margin = int(new_height * 0.70)   # 肩部下方间距70%
-            
-            # 从头部上方间距开始，到肩部下方间距结束
-            top = top_margin
-            bottom = img_height - bottom_margin
-            
-            # 确保水平居中：计算头部在图像中的中心位置
-            # 假设头部在图像中居中，我们保持这个居中位置
-            cropped = image.crop((0, top, img_width, bottom))
-            logger.info(f"高度裁剪：头部上方间距{top}, 肩部下方间距{bottom}, 显示区域高度{bottom-top}")
+        left, top, right, bottom = face_crop_box(image.size, target_size)
+        cropped = image.crop((left, top, right, bottom))
+        logger.info(f"裁剪区域: 左{left}, 上{top}, 右{right}, 下{bottom}，显示区域 {right-left}x{bottom-top}")
         
         # 调整到目标尺寸
-        resized = cropped.resize(target_size, Image.Resampling.LANCZOS)
+        resized = cropped.resize(target_size, quality_presets.get_preset().resample)
         
         logger.info(f"人脸区域裁剪完成，尺寸: {resized.size}")
         return resized
@@ -197,7 +279,7 @@ def crop_face_region(image: Image.Image, target_size: Tuple[int, int]) -> Image.
         logger.error(f"人脸区域裁剪失败: {e}")
         # 如果裁剪失败，直接调整尺寸，但保持头部居中
         logger.info("使用备用裁剪策略：保持头部居中")
-        return image.resize(target_size, Image.Resampling.LANCZOS)
+        return image.resize(target_size, quality_presets.get_preset().resample)
 
 def gentle_lighting_adjustment(image: Image.Image) -> Image.Image:
     """
@@ -268,21 +350,11 @@ def enhance_ear_clarity(image: Image.Image) -> Image.Image:
     try:
         logger.info("开始增强耳朵清晰度...")
         
-        # 转换为numpy数组
-        img_array = np.array(image)
-        
-        # 应用边缘增强滤波器
-        kernel = np.array([[-1,-1,-1],
-                          [-1, 9,-1],
-                          [-1,-1,-1]])
-        
-        # 分别处理RGB通道
-        enhanced = np.zeros_like(img_array)
-        for i in range(3):
-            enhanced[:,:,i] = cv2.filter2D(img_array[:,:,i], -1, kernel)
+        # 转换为numpy数组（只取颜色通道）
+        img_array = np.asarray(image.convert('RGB'))
         
-        # 限制值范围
-        enhanced = np.clip(enhanced, 0, 255).astype(np.uint8)
+        # 应用边缘增强滤波器：一次 filter2D 处理所有通道，uint8 输出自动限制在 0~255
+        enhanced = cv2.filter2D(img_array, -1, SHARPEN_KERNEL)
         
         # 转换回PIL图像
         enhanced_image = Image.fromarray(enhanced)
@@ -301,27 +373,34 @@ def final_quality_check(image: Image.Image) -> Image.Image:
     try:
         logger.info("开始最终质量检查...")
         
-        # 检查图像是否过暗
-        img_array = np.array(image)
-        mean_brightness = np.mean(img_array)
+        # 亮度和对比度都由一次直方图统计得到
+        img_array = np.asarray(image)
+        hists = channel_histograms(img_array)
+        mean_brightness = histogram_mean(hists)
         
         # 身份证头像要求光线明亮，平均亮度应该至少120
+        brightness = 1.0
         if mean_brightness < 120:
             logger.info(f"检测到图像亮度不足，平均亮度: {mean_brightness:.1f}，进行大幅亮度调整")
-            enhancer = ImageEnhance.Brightness(image)
-            image = enhancer.enhance(2.0)  # 提高100%亮度
+            brightness = 2.0  # 提高100%亮度
         
-        # 检查对比度
-        contrast = np.std(img_array)
+        # 检查对比度（按调整前的图像计算）
+        contrast = histogram_std(hists)
+        contrast_factor = 1.0
         if contrast < 30:  # 如果对比度太低
             logger.info(f"检测到对比度过低，标准差: {contrast:.1f}，进行对比度调整")
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(1.6)  # 提高60%对比度
-        
-        # 最终验证
-        final_array = np.array(image)
-        final_brightness = np.mean(final_array)
-        final_contrast = np.std(final_array)
+            contrast_factor = 1.6  # 提高60%对比度
+        
+        final_brightness = mean_brightness
+        final_contrast = contrast
+        if brightness != 1.0 or contrast_factor != 1.0:
+            # 亮度、对比度合成一个查找表，一次应用
+            lut = brightness_contrast_lut(hists, brightness, contrast_factor)
+            img_array = apply_color_lut(img_array, lut)
+            image = Image.fromarray(img_array)
+            final_hists = channel_histograms(img_array)
+            final_brightness = histogram_mean(final_hists)
+            final_contrast = histogram_std(final_hists)
         
         logger.info(f"最终质量检查完成 - 整体亮度: {final_brightness:.1f}, 对比度: {final_contrast:.1f}")
         
@@ -384,9 +463,16 @@ def create_default_avatar(size: Tuple[int, int]) -> Image.Image:
         # 最后的备选方案：纯色图像
         return Image.new('RGB', size, (200, 200, 200))
 
-def batch_generate_id_avatars(count: int, size: Tuple[int, int] = (308, 376)) -> Tuple[int, int]:
+def batch_generate_id_avatars(count: int, size: Tuple[int, int] = (308, 376),
+                              batch_size: Optional[int] = None, retries: int = 2) -> Tuple[int, int]:
     """
     批量生成身份证头像
+    
+    多张头像在一次管道调用中生成（batch_size 为 None 时按可用内存自动选择），
+    上一批的头像后处理和保存在工作线程中与下一批的生成重叠；每张头像的种子记录在 faces_advanced/.sd_seeds.json
+    
+    SD 输出先经过质量门（背景不白、头部偏离中心、多人、过暗过亮），不合格的不做后处理，
+    换种子重新生成，每张最多 retries 次
     """
     logger.info(f"开始批量生成 {count} 个身份证头像...")
     
@@ -399,8 +485,6 @@ def batch_generate_id_avatars(count: int, size: Tuple[int, int] = (308, 376)) ->
         logger.error("模型加载失败，无法生成头像")
         return 0, count
     
-    success_count = 0
-    failed_count = 0
     start_time = time.time()
     
     # 预定义的提示词组合 - 优化后确保单人、正面、头像居中、只露出肩部、纯色背景、端正姿势
@@ -411,47 +495,56 @@ def batch_generate_id_avatars(count: int, size: Tuple[int, int] = (308, 376)) ->
         ("professional ID photo, single person, straight front view, high quality face, studio lighting, pure white background, head centered, full head visible, crop below shoulders, shoulders visible, no chest, no torso, ears visible, serious expression, no smile, passport photo, straight posture, level shoulders, simple clothing, no accessories, no jewelry, no patterns, no textures", "standard"),
     ]
     
+    negative_prompt = "blurry, low quality, distorted, deformed, multiple people, side view, profile, hat, sunglasses, mask, jewelry, makeup, artistic, painting, cartoon, anime, text, watermark, signature, patterns, textures, brick wall, wall texture, colored background, gradient background, gray background, dark background, colored background, textured background, noisy background, pixelated, color banding, digital artifacts, smile, grinning, laughing, teeth showing, shadows, gradients, noise, grain, speckles, dots, lines, stripes, patterns, textures, brick wall, wall texture, colored background, gradient background, non-white background"
+    
+    def save_avatar(name, face_image, seed):
+        i, age = job_info[name]
+        # 转换为身份证专用头像
+        id_avatar = create_id_card_avatar(face_image, size)
+        
+        # 保存头像
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"faces_advanced/{name}_{timestamp}.png"
+        id_avatar.save(filename, 'PNG', compress_level=quality_presets.get_preset().png_compress_level)
+        logger.info(f"身份证头像 {i+1} 生成成功: {filename}（种子 {seed}）")
+        
+        # 显示进度
+        done = len(saved) + 1
+        saved.append(filename)
+        if done % 10 == 0:
+            elapsed = time.time() - start_time
+            remaining = (elapsed / done) * (count - done)
+            logger.info(f"进度: {done}/{count} ({done/count*100:.1f}%) - 预计剩余时间: {remaining/60:.1f}分钟")
+        return filename
+    
+    # 依次使用提示词列表；任务名同时出现在日志和种子记录里，序号和年龄段在保存时按任务名查回
+    jobs = []
+    job_info = {}
     for i in range(count):
-        try:
-            logger.info(f"正在生成第 {i+1}/{count} 个头像...")
-            
-            # 随机选择提示词
-            prompt, age = prompts[i % len(prompts)]
-            
-            # 生成人脸
-            face_image = generator.generate_face(
-                prompt=prompt,
-                negative_prompt="blurry, low quality, distorted, deformed, multiple people, side view, profile, hat, sunglasses, mask, jewelry, makeup, artistic, painting, cartoon, anime, text, watermark, signature, patterns, textures, brick wall, wall texture, colored background, gradient background, gray background, dark background, colored background, textured background, noisy background, pixelated, color banding, digital artifacts, smile, grinning, laughing, teeth showing, shadows, gradients, noise, grain, speckles, dots, lines, stripes, patterns, textures, brick wall, wall texture, colored background, gradient background, non-white background",
-                width=512,
-                height=512,
-                num_inference_steps=40,
-                guidance_scale=12.0
-            )
-            
-            if face_image:
-                # 转换为身份证专用头像
-                id_avatar = create_id_card_avatar(face_image, size)
-                
-                # 保存头像
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"faces_advanced/id_avatar_{i+1:03d}_{age}_{timestamp}.png"
-                id_avatar.save(filename, 'PNG', quality=95)
-                
-                success_count += 1
-                logger.info(f"身份证头像 {i+1} 生成成功: {filename}")
-                
-                # 显示进度
-                if (i + 1) % 10 == 0:
-                    elapsed = time.time() - start_time
-                    remaining = (elapsed / (i + 1)) * (count - i - 1)
-                    logger.info(f"进度: {i+1}/{count} ({(i+1)/count*100:.1f}%) - 预计剩余时间: {remaining/60:.1f}分钟")
-            else:
-                failed_count += 1
-                logger.error(f"身份证头像 {i+1} 生成失败")
-                
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"身份证头像 {i+1} 生成异常: {e}")
+        prompt, age = prompts[i % len(prompts)]
+        name = f"id_avatar_{i+1:03d}_{age}"
+        job_info[name] = (i, age)
+        jobs.append((name, prompt, negative_prompt))
+    
+    saved = []
+    try:
+        results, failed_count = generate_batched(
+            generator.generator, jobs, save_avatar,
+            batch_size=batch_size,
+            width=512,
+            height=512,
+            num_inference_steps=40,
+            guidance_scale=12.0,
+            seed_log_dir='faces_advanced',
+            gate=check_face,
+            retries=retries,
+            logger=logger
+        )
+        success_count = len(results)
+    except Exception as e:
+        logger.error(f"身份证头像批量生成异常: {e}")
+        success_count = len(saved)
+        failed_count = count - success_count
     
     total_time = time.time() - start_time
     logger.info(f"身份证头像批量生成完成！成功: {success_count}, 失败: {failed_count}")
@@ -489,7 +582,7 @@ if __name__ == "__main__":
                     
                     # 保存头像
                     output_path = f"faces_advanced/id_avatar_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                    id_avatar.save(output_path, 'PNG', quality=95)
+                    id_avatar.save(output_path, 'PNG', compress_level=quality_presets.get_preset().png_compress_level)
                     logger.info(f"身份证头像保存成功: {output_path}")
                 else:
                     logger.error("身份证头像生成失败")
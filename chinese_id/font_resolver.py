@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨平台中文字体解析器
+按配置目录和 fontconfig 搜索字体文件，选出第一个能覆盖所需汉字的字体，
+并按 (路径, 字号) 在进程内缓存 FreeType 字体对象，重复创建生成器不再重复加载字体。
+
+字体搜索顺序:
+    1. 环境变量 ICDATASET_FONT_DIRS 指定的目录（用 os.pathsep 分隔）
+    2. 当前系统的常见字体目录（Windows/macOS/Linux）
+    3. fontconfig（fc-list :lang=zh）报告的中文字体
+在同一批候选中，preferred 列表里的字体文件名优先。
+"""
+
+import functools
+import os
+import shutil
+import subprocess
+import sys
+
+from PIL import Image, ImageDraw, ImageFont
+
+# 默认需要覆盖的字符：身份证和聊天截图中常见的汉字、数字和字母
+DEFAULT_SAMPLE_TEXT = "身份证姓名性别民族出生年月日住址公民号码签发机关有效期限你好吗0123456789X"
+
+# 按优先级排列的常见中文字体文件名（不区分大小写）
+DEFAULT_PREFERRED_FONTS = [
+    "simsun.ttc",                   # 宋体
+    "msyh.ttc",                     # 微软雅黑
+    "simhei.ttf",                   # 黑体
+    "simkai.ttf",                   # 楷体
+    "NotoSansCJK-Regular.ttc",      # Noto Sans CJK
+    "NotoSerifCJK-Regular.ttc",     # Noto Serif CJK
+    "SourceHanSansSC-Regular.otf",  # 思源黑体
+    "wqy-zenhei.ttc",               # 文泉驿正黑
+    "wqy-microhei.ttc",             # 文泉驿微米黑
+    "PingFang.ttc",                 # 苹方
+    "STHeiti Medium.ttc",           # 华文黑体
+    "DroidSansFallbackFull.ttf",
+    "Arial Unicode.ttf",
+]
+
+FONT_EXTENSIONS = (".ttf", ".ttc", ".otf")
+
+# 用于探测 .notdef 字形的码位（补充私用区 B，正常字体不会定义）
+_MISSING_PROBE_CHAR = "\U0010FFFD"
+
+
+def default_font_dirs():
+    """当前系统的字体目录列表（含环境变量 ICDATASET_FONT_DIRS 指定的目录）"""
+    dirs = [d for d in os.environ.get("ICDATASET_FONT_DIRS", "").split(os.pathsep) if d]
+    home = os.path.expanduser("~")
+    if sys.platform.startswith("win"):
+        windir = os.environ.get("WINDIR", "C:/Windows")
+        dirs.append(os.path.join(windir, "Fonts"))
+        local = os.environ.get("LOCALAPPDATA")
+        if local:
+            dirs.append(os.path.join(local, "Microsoft", "Windows", "Fonts"))
+    elif sys.platform == "darwin":
+        dirs += ["/System/Library/Fonts", "/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+    else:
+        dirs += ["/usr/share/fonts", "/usr/local/share/fonts",
+                 os.path.join(home, ".fonts"), os.path.join(home, ".local", "share", "fonts")]
+    return dirs
+
+
+def _scan_font_dirs(font_dirs):
+    """遍历字体目录，返回所有字体文件路径"""
+    paths = []
+    for font_dir in font_dirs:
+        if not os.path.isdir(font_dir):
+            continue
+        for root, _, files in os.walk(font_dir):
+            for file in sorted(files):
+                if file.lower().endswith(FONT_EXTENSIONS):
+                    paths.append(os.path.join(root, file))
+    return paths
+
+
+def _fontconfig_fonts(lang="zh"):
+    """通过 fontconfig 查询支持指定语言的字体，fc-list 不可用时返回空列表"""
+    fc_list = shutil.which("fc-list")
+    if not fc_list:
+        return []
+    try:
+        output = subprocess.run([fc_list, f":lang={lang}", "file"], capture_output=True,
+                                text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    paths = []
+    for line in output.splitlines():
+        path = line.strip().rstrip(":").strip()
+        if path.lower().endswith(FONT_EXTENSIONS):
+            paths.append(path)
+    return sorted(set(paths))
+
+
+def _candidate_fonts(preferred, font_dirs):
+    """按优先级生成候选字体路径（去重）"""
+    scanned = _scan_font_dirs(font_dirs)
+    fontconfig = _fontconfig_fonts()
+    by_name = {}
+    for path in scanned + fontconfig:
+        by_name.setdefault(os.path.basename(path).lower(), path)
+
+    seen = set()
+    ordered = [by_name[name.lower()] for name in preferred if name.lower() in by_name]
+    ordered += fontconfig + scanned
+    for path in ordered:
+        if path not in seen:
+            seen.add(path)
+            yield path
+
+
+def _glyph_bitmap(font, char):
+    size = font.size * 2
+    canvas = Image.new("L", (size, size))
+    ImageDraw.Draw(canvas).text((0, 0), char, font=font, fill=255)
+    return canvas.tobytes()
+
+
+def covers_text(font_path, text=DEFAULT_SAMPLE_TEXT):
+    """
+    检查字体是否包含 text 中的全部字符
+
+    缺字时 FreeType 会渲染 .notdef 字形（空白或方框），
+    与探测码位渲染结果相同即视为缺字。
+    """
+    try:
+        font = ImageFont.truetype(font_path, 24)
+    except (OSError, ValueError):
+        return False
+    notdef = _glyph_bitmap(font, _MISSING_PROBE_CHAR)
+    # 先检查码位大的字符（汉字），非中文字体能尽早排除
+    for char in sorted(set(text), key=ord, reverse=True):
+        if char.isspace():
+            continue
+        if _glyph_bitmap(font, char) == notdef:
+            return False
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_font_path(text, preferred, font_dirs):
+    for path in _candidate_fonts(preferred, font_dirs):
+        if covers_text(path, text):
+            return path
+    return None
+
+
+def resolve_font_path(text=DEFAULT_SAMPLE_TEXT, preferred=None, font_dirs=None):
+    """
+    查找第一个覆盖 text 的字体文件，结果按参数缓存
+
+    Args:
+        text: 需要覆盖的字符
+        preferred: 优先使用的字体文件名列表，默认 DEFAULT_PREFERRED_FONTS
+        font_dirs: 搜索目录列表，默认 default_font_dirs()
+
+    Returns:
+        str | None: 字体路径，找不到时返回 None
+    """
+    preferred = tuple(preferred if preferred is not None else DEFAULT_PREFERRED_FONTS)
+    font_dirs = tuple(font_dirs if font_dirs is not None else default_font_dirs())
+    return _resolve_font_path(text, preferred, font_dirs)
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(path, size):
+    """按 (路径, 字号) 缓存的 ImageFont.truetype"""
+    return ImageFont.truetype(path, size)
+
+
+@functools.lru_cache(maxsize=None)
+def _default_font():
+    return ImageFont.load_default()
+
+
+_warned_missing = set()
+
+
+def load_font(size, text=DEFAULT_SAMPLE_TEXT, preferred=None, font_dirs=None):
+    """
+    加载覆盖 text 的指定字号字体，找不到时退回 PIL 默认字体
+
+    Returns:
+        ImageFont.FreeTypeFont | ImageFont.ImageFont
+    """
+    path = resolve_font_path(text, preferred, font_dirs)
+    if path is None:
+        key = (text, tuple(preferred or ()))
+        if key not in _warned_missing:
+            _warned_missing.add(key)
+            print("警告：未找到覆盖所需汉字的字体，使用默认字体，中文可能显示异常"
+                  "（可通过环境变量 ICDATASET_FONT_DIRS 指定字体目录）")
+        return _default_font()
+    return get_font(path, size)
+
+
+def load_fonts(sizes, text=DEFAULT_SAMPLE_TEXT, preferred=None, font_dirs=None):
+    """按字号列表批量加载同一字体，返回与 sizes 顺序一致的元组"""
+    return tuple(load_font(size, text, preferred, font_dirs) for size in sizes)
+
+
+if __name__ == "__main__":
+    path = resolve_font_path()
+    print(f"字体目录: {default_font_dirs()}")
+    print(f"选中字体: {path or '（无，将使用默认字体）'}")
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+桌面背景生成任务
+按任务清单（background_jobs.json）生成所有 Stable Diffusion 桌面背景，代替原来各自 加载模型 → 循环 → 保存 的
+generate_simple_backgrounds / generate_marble_countertop(s) / generate_20_bedsheets / generate_20_wooden_desks
+（这些脚本保留为运行对应任务组的入口）:
+    - 清单每个任务为 (类别, 提示词, 负面提示词, 数量, 尺寸, 步数, 引导系数, 输出子目录, 文件名模板)
+    - 模型只加载一次（sd_server 运行时使用服务中已加载的模型）
+    - 所有任务的待生成图片按生成参数分组后一起分批（sd_batch），不同类别的提示词可以在同一批次中生成，
+      模型不会因为某个类别只剩几张而空转
+    - 输出文件已存在时跳过，中断后重新运行只补齐缺少的图片（--force 全部重新生成）
+    - 输出目录的 index.json 记录每张背景的任务、提示词、种子和生成参数
+
+    python generate_backgrounds.py                         # 全部任务
+    python generate_backgrounds.py --groups bedsheets      # 只运行一组
+    python generate_backgrounds.py --jobs 现代办公桌 --count 50
+    python generate_backgrounds.py --list
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+
+from quality_gate import check_background
+from sd_backends import DEFAULT_MODEL
+from sd_batch import generate_batched, save_atomic_json
+from sd_server import get_generator
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'background_jobs.json')
+
+# 输出目录中的背景索引
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 1
+
+DEFAULTS = {
+    'width': 1024,
+    'height': 768,
+    'num_inference_steps': 20,
+    'guidance_scale': 7.5,
+}
+
+
+@dataclass(frozen=True)
+class BackgroundJob:
+    """清单中的一个背景类别"""
+    name: str
+    prompt: str
+    negative_prompt: str = ''
+    count: int = 1
+    width: int = 1024
+    height: int = 768
+    num_inference_steps: int = 20
+    guidance_scale: float = 7.5
+    directory: str = ''
+    filename: str = '{name}_{index:02d}.png'
+    group: str = ''
+    description: str = ''
+
+    @property
+    def params(self):
+        """同一批次内必须相同的生成参数"""
+        return (self.width, self.height, self.num_inference_steps, self.guidance_scale)
+
+    @property
+    def numbered(self):
+        """文件名模板带序号，可以生成多张"""
+        return '{index' in self.filename
+
+    def relative_path(self, index):
+        """第 index 张（从 1 开始）相对输出目录的路径"""
+        return os.path.join(self.directory, self.filename.format(name=self.name, index=index))
+
+
+def load_manifest(path):
+    """读取 JSON 或 YAML 任务清单"""
+    with open(path, encoding='utf-8') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("读取 YAML 清单需要安装 PyYAML: pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def load_jobs(path=DEFAULT_MANIFEST):
+    """
+    读取任务清单
+
+    Returns:
+        tuple: (清单字典, [BackgroundJob, ...])
+    """
+    manifest = load_manifest(path)
+    defaults = dict(DEFAULTS, **manifest.get('defaults', {}))
+    jobs = []
+    for entry in manifest.get('jobs', []):
+        jobs.append(BackgroundJob(**dict(defaults, **entry)))
+    for job in jobs:
+        if job.count > 1 and not job.numbered:
+            raise ValueError(f"任务 {job.name} 数量为 {job.count}，文件名模板需要包含 {{index}}")
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"任务名称重复: {', '.join(duplicates)}")
+    return manifest, jobs
+
+
+def select_jobs(jobs, names=None, groups=None):
+    """按任务名称或任务组筛选，都不指定时返回全部"""
+    if not names and not groups:
+        return list(jobs)
+    known = {job.name for job in jobs} | {job.group for job in jobs}
+    unknown = [value for value in (names or []) + (groups or []) if value not in known]
+    if unknown:
+        raise ValueError(f"清单中没有这些任务或任务组: {', '.join(unknown)}")
+    return [job for job in jobs if job.name in (names or []) or job.group in (groups or [])]
+
+
+def load_index(output_dir):
+    """读取背景索引，不存在或损坏时返回空索引"""
+    try:
+        with open(os.path.join(output_dir, INDEX_FILE), encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {'version': INDEX_VERSION, 'backgrounds': {}}
+
+
+def index_key(relative_path):
+    """索引键统一使用 / 分隔，Windows 和 Linux 生成的索引可以互相读取"""
+    return relative_path.replace(os.sep, '/')
+
+
+def plan_images(jobs, output_dir, force=False):
+    """
+    列出需要生成的图片
+
+    Returns:
+        tuple: ([(任务, 序号), ...] 待生成, 已存在跳过的数量)
+    """
+    pending = []
+    skipped = 0
+    for job in jobs:
+        for index in range(1, job.count + 1):
+            if not force and os.path.exists(os.path.join(output_dir, job.relative_path(index))):
+                skipped += 1
+                continue
+            pending.append((job, index))
+    return pending, skipped
+
+
+def run_jobs(jobs, output_dir='desktop_backgrounds', model_id=DEFAULT_MODEL, batch_size=None, force=False,
+             gate=True, retries=2, generator=None):
+    """
+    生成任务列表中缺少的背景
+
+    Args:
+        jobs: [BackgroundJob, ...]
+        output_dir: 输出根目录（任务的 directory 是其下的子目录）
+        batch_size: 每次管道调用的图片数，None 时按可用内存自动选择
+        force: 已存在的图片也重新生成
+        gate: 是否使用质量门（过暗、过曝、纯色的输出换种子重新生成）
+        retries: 质量门拒绝后每张最多重新生成的次数
+        generator: 已加载的生成器，None 时调用 get_generator(model_id)
+
+    Returns:
+        tuple: (成功数, 失败数, 跳过数)
+    """
+    pending, skipped = plan_images(jobs, output_dir, force)
+    total = sum(job.count for job in jobs)
+    print(f"📋 {len(jobs)} 个任务，共 {total} 张：已存在 {skipped} 张，待生成 {len(pending)} 张")
+    if not pending:
+        return 0, 0, skipped
+
+    for job in {job for job, _ in pending}:
+        os.makedirs(os.path.join(output_dir, job.directory), exist_ok=True)
+
+    if generator is None:
+        # 加载模型（生成服务 sd_server 在运行时直接使用服务中已加载的模型）
+        print("📥 正在加载Stable Diffusion模型...")
+        generator = get_generator(model_id)
+        print(f"✅ 模型加载成功！使用: {generator.description}")
+
+    index = load_index(output_dir)
+    index_lock = threading.Lock()
+    # 图片名称即相对路径（质量门拒绝等提示中直接显示文件）
+    planned = {job.relative_path(number): job for job, number in pending}
+    counters = {job.name: 0 for job in jobs}
+
+    def save_image(relative_path, image, seed):
+        job = planned[relative_path]
+        output_path = os.path.join(output_dir, relative_path)
+        # 临时文件不用图片扩展名，中断时不会被背景合成扫描到
+        tmp_path = output_path + '.tmp'
+        image.save(tmp_path, 'PNG')
+        os.replace(tmp_path, output_path)
+        with index_lock:
+            counters[job.name] += 1
+            index['backgrounds'][index_key(relative_path)] = {
+                'job': job.name,
+                'group': job.group,
+                'prompt': job.prompt,
+                'negative_prompt': job.negative_prompt,
+                'seed': seed,
+                'model': generator.model_id,
+                'width': job.width,
+                'height': job.height,
+                'num_inference_steps': job.num_inference_steps,
+                'guidance_scale': job.guidance_scale,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            # 每张保存后刷新索引（相对于生成耗时可以忽略），中断时已保存的图片都有记录
+            save_atomic_json(os.path.join(output_dir, INDEX_FILE), index)
+        print(f"✅ {relative_path}（种子 {seed}）")
+        return output_path
+
+    # 生成参数相同的图片才能在同一批次中生成：按参数分组，每组内不同类别的图片混合分批
+    groups = {}
+    for job, number in pending:
+        groups.setdefault(job.params, []).append((job.relative_path(number), job.prompt, job.negative_prompt))
+
+    start = time.time()
+    succeeded = 0
+    failed = 0
+    for (width, height, steps, guidance), items in groups.items():
+        print(f"\n🎨 {width}x{height}，{steps} 步，引导系数 {guidance}：{len(items)} 张")
+        results, group_failed = generate_batched(
+            generator, items, save_image,
+            batch_size=batch_size,
+            width=width,
+            height=height,
+            num_inference_steps=steps,
+            guidance_scale=guidance,
+            gate=check_background if gate else None,
+            retries=retries
+        )
+        succeeded += len(results)
+        failed += group_failed
+
+    elapsed = time.time() - start
+    print(f"\n🎉 背景生成完成！成功 {succeeded} 张，失败 {failed} 张，跳过 {skipped} 张，"
+          f"耗时 {elapsed / 60:.1f} 分钟")
+    for job in jobs:
+        if counters[job.name]:
+            print(f"  {job.name}: 新生成 {counters[job.name]} 张 → {os.path.join(output_dir, job.directory)}")
+    print(f"📄 索引: {os.path.join(output_dir, INDEX_FILE)}")
+    return succeeded, failed, skipped
+
+
+def run_groups(groups, manifest_path=DEFAULT_MANIFEST, **kwargs):
+    """按任务组运行（兼容原来的单独脚本）"""
+    manifest, jobs = load_jobs(manifest_path)
+    kwargs.setdefault('output_dir', manifest.get('output', 'desktop_backgrounds'))
+    kwargs.setdefault('model_id', manifest.get('model', DEFAULT_MODEL))
+    return run_jobs(select_jobs(jobs, groups=groups), **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按任务清单生成 Stable Diffusion 桌面背景")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="任务清单（JSON/YAML）")
+    parser.add_argument("--jobs", nargs="+", help="只运行这些任务")
+    parser.add_argument("--groups", nargs="+", help="只运行这些任务组")
+    parser.add_argument("--count", type=int, help="覆盖每个任务的数量")
+    parser.add_argument("--output", help="输出目录（默认清单中的 output）")
+    parser.add_argument("--model", help="模型 ID（默认清单中的 model）")
+    parser.add_argument("--batch-size", type=int, help="每次管道调用的图片数（默认按可用内存）")
+    parser.add_argument("--retries", type=int, default=2, help="质量门拒绝后每张最多重新生成的次数")
+    parser.add_argument("--no-gate", action="store_true", help="不使用质量门")
+    parser.add_argument("--force", action="store_true", help="已存在的图片也重新生成")
+    parser.add_argument("--list", action="store_true", help="列出任务和完成情况后退出")
+    args = parser.parse_args()
+
+    try:
+        manifest, jobs = load_jobs(args.manifest)
+        jobs = select_jobs(jobs, args.jobs, args.groups)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.count is not None:
+        # 单张任务（文件名不带序号）保持一张
+        jobs = [replace(job, count=args.count) if job.numbered else job for job in jobs]
+    output_dir = args.output or manifest.get('output', 'desktop_backgrounds')
+
+    if args.list:
+        for job in jobs:
+            done = job.count - len(plan_images([job], output_dir)[0])
+            print(f"  {job.name:<16} [{job.group}] {done}/{job.count}  {job.width}x{job.height} "
+                  f"{job.num_inference_steps} 步  → {os.path.join(output_dir, job.directory)}")
+        return
+
+    run_jobs(jobs, output_dir, args.model or manifest.get('model', DEFAULT_MODEL), args.batch_size, args.force,
+             gate=not args.no_gate, retries=args.retries)
+
+
+if __name__ == "__main__":
+    main()
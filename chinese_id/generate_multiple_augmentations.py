@@ -1,16 +1,40 @@
-import albumentations as A
+import argparse
 import cv2
 import os
+import augment_registry
+import image_io
+import quality_presets
+from batch_augment import parse_size
 
-def generate_multiple_augmentations(input_path, output_dir, num_versions=5):
+def validate_counts(pipelines):
+    """
+    检查 [(管道名称, 版本数), ...]，版本数必须是正整数
+    （其他脚本的同名参数是权重，可以是小数；0.5 在这里会被截断成 0 个版本，所以直接拒绝）
+    """
+    validated = []
+    for name, count in pipelines:
+        if count < 1 or count != int(count):
+            raise ValueError(f"管道 {name} 的版本数必须是正整数: {count:g}")
+        validated.append((name, int(count)))
+    return validated
+
+def parse_counts(values):
+    """解析 --pipelines NAME[:COUNT]"""
+    return validate_counts(augment_registry.parse_weighted(values))
+
+def generate_multiple_augmentations(input_path, output_dir, num_versions=5, pipelines=None, target_size=None):
     """
     生成多个增强版本的图片，按姓名存储
     
     Args:
         input_path: 输入图片路径（从chinese_ids目录结构推断姓名）
         output_dir: 输出目录
-        num_versions: 生成版本数量
+        num_versions: 生成版本数量上限
+        pipelines: [(管道名称, 版本数), ...]，默认为规格文件 sets.multiple 中的五个管道各一个版本
+        target_size: (宽, 高)，原图更大时按缩小模式解码并缩放到该尺寸以内
     """
+    pipelines = validate_counts(pipelines or [(name, 1) for name in augment_registry.registry.pipeline_set("multiple")])
+    
     # 从输入路径推断姓名
     # 假设路径格式: chinese_ids/姓名/文件名
     path_parts = input_path.split(os.sep)
@@ -28,86 +52,27 @@ def generate_multiple_augmentations(input_path, output_dir, num_versions=5):
         os.makedirs(person_output_dir, exist_ok=True)
         print(f"⚠️  无法识别用户姓名，使用默认输出目录: {person_output_dir}")
     
-    # 读取原图
-    image = cv2.imread(input_path)
+    # 读取原图（大图按目标尺寸缩小解码）
+    image = image_io.read_image(input_path, target_size)
     if image is None:
         print(f"❌ 无法读取图片: {input_path}")
         return
     
     image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     
-    print(f"🔍 开始生成 {num_versions} 个增强版本...")
-    
-    # 定义多个不同的增强管道
-    augmentation_pipelines = [
-        # 管道1: 轻微几何变换
-        {
-            'pipeline': A.Compose([
-                A.Affine(rotate=(-3, 3), translate_percent=(-0.03, 0.03), scale=(0.97, 1.03), p=0.8),
-                A.GaussNoise(p=0.3),
-                A.ColorJitter(brightness=0.1, contrast=0.1, saturation=0.05, hue=0.02, p=0.6),
-            ]),
-            'name': "轻微变换"
-        },
-        
-        # 管道2: 中等几何变换
-        {
-            'pipeline': A.Compose([
-                A.Affine(rotate=(-5, 5), translate_percent=(-0.05, 0.05), scale=(0.95, 1.05), p=0.8),
-                A.Perspective(scale=(0.03, 0.07), p=0.4),
-                A.GaussNoise(p=0.4),
-                A.ColorJitter(brightness=0.15, contrast=0.15, saturation=0.08, hue=0.03, p=0.7),
-            ]),
-            'name': "中等变换"
-        },
-        
-        # 管道3: 模糊效果
-        {
-            'pipeline': A.Compose([
-                A.OneOf([
-                    A.MotionBlur(blur_limit=3, p=0.3),
-                    A.GaussianBlur(blur_limit=(3, 5), p=0.3),
-                ], p=0.5),
-                A.GaussNoise(p=0.3),
-                A.ColorJitter(brightness=0.1, contrast=0.1, p=0.5),
-            ]),
-            'name': "模糊效果"
-        },
-        
-        # 管道4: 光照变化
-        {
-            'pipeline': A.Compose([
-                A.RandomShadow(shadow_roi=(0, 0.5, 1, 1), shadow_dimension=5, p=0.4),
-                A.RandomGamma(gamma_limit=(85, 115), p=0.4),
-                A.ColorJitter(brightness=0.2, contrast=0.2, p=0.6),
-            ]),
-            'name': "光照变化"
-        },
-        
-        # 管道5: 综合效果
-        {
-            'pipeline': A.Compose([
-                A.Affine(rotate=(-4, 4), translate_percent=(-0.04, 0.04), scale=(0.96, 1.04), p=0.7),
-                A.Perspective(scale=(0.02, 0.06), p=0.3),
-                A.OneOf([
-                    A.MotionBlur(blur_limit=3, p=0.2),
-                    A.GaussianBlur(blur_limit=(3, 4), p=0.2),
-                ], p=0.3),
-                A.GaussNoise(p=0.3),
-                A.ColorJitter(brightness=0.12, contrast=0.12, saturation=0.06, hue=0.02, p=0.6),
-                A.RandomShadow(shadow_roi=(0, 0.5, 1, 1), shadow_dimension=3, p=0.2),
-            ]),
-            'name': "综合效果"
-        },
-    ]
+    # PNG压缩级别跟随质量档位，管道从注册表取已编译的对象（规格见 augment_pipelines.json）
+    preset = quality_presets.get_preset()
+    versions = []
+    for name, count in pipelines:
+        versions.extend([name] * count)
+    versions = versions[:num_versions]
+    print(f"🔍 开始生成 {len(versions)} 个增强版本...")
     
     # 生成增强版本
-    for i in range(min(num_versions, len(augmentation_pipelines))):
+    for i, name in enumerate(versions):
         try:
             # 应用增强
-            pipeline_info = augmentation_pipelines[i]
-            pipeline = pipeline_info['pipeline']
-            name = pipeline_info['name']
+            pipeline = augment_registry.get_pipeline(name)
             
             augmented = pipeline(image=image_rgb)
             augmented_image = augmented['image']
@@ -118,21 +83,42 @@ def generate_multiple_augmentations(input_path, output_dir, num_versions=5):
             output_path = os.path.join(person_output_dir, output_filename)
             
             # 保存增强后的图片
-            cv2.imwrite(output_path, cv2.cvtColor(augmented_image, cv2.COLOR_RGB2BGR))
+            image_io.write_image(output_path, cv2.cvtColor(augmented_image, cv2.COLOR_RGB2BGR),
+                                 [int(cv2.IMWRITE_PNG_COMPRESSION), preset.cv2_png_compression])
             
             print(f"✅ 生成版本 {i+1}: {output_filename}")
             
         except Exception as e:
             print(f"❌ 生成版本 {i+1} 失败: {e}")
     
-    print(f"\n🎉 增强完成！共生成 {num_versions} 个版本")
+    print(f"\n🎉 增强完成！共生成 {len(versions)} 个版本")
     print(f"📁 输出目录: {person_output_dir}")
     print(f"👤 用户: {person_name}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="为一张身份证图片生成多个不同风格的增强版本")
+    parser.add_argument("--input", default="chinese_ids/鲁帅/610114200711228065_front.png", help="输入图片路径")
+    parser.add_argument("--output", default="chinese_ids_augmented", help="增强后的图片根目录")
+    parser.add_argument("--pipelines", nargs="+", metavar="NAME[:COUNT]",
+                        help="使用的增强管道和每个管道的版本数，例如 轻微变换:2 综合效果")
+    parser.add_argument("--num-versions", type=int, help="生成版本数量上限（默认不限制）")
+    parser.add_argument("--target-size", type=parse_size, metavar="WxH", help="增强前把原图缩小到该尺寸以内")
+    parser.add_argument("--spec", help="增强管道规格文件（JSON/YAML，默认 augment_pipelines.json）")
+    parser.add_argument("--quality", choices=list(quality_presets.PRESETS), help="质量档位（默认读取 ID_QUALITY）")
+    args = parser.parse_args()
+    
+    if args.quality:
+        quality_presets.set_preset(args.quality)
+    if args.spec:
+        augment_registry.use_spec(args.spec)
+    try:
+        pipelines = parse_counts(args.pipelines) if args.pipelines else None
+    except ValueError as e:
+        parser.error(str(e))
+    
     # 设置输入和输出
-    input_image = "chinese_ids/鲁帅/610114200711228065_front.png"  # 使用实际的身份证图片路径
-    output_directory = "chinese_ids_augmented"  # 增强后的图片根目录
+    input_image = args.input  # 使用实际的身份证图片路径
+    output_directory = args.output  # 增强后的图片根目录
     
     # 检查输入文件
     if not os.path.exists(input_image):
@@ -141,7 +127,8 @@ if __name__ == "__main__":
         exit(1)
     
     # 生成多个增强版本
-    generate_multiple_augmentations(input_image, output_directory, num_versions=5)
+    generate_multiple_augmentations(input_image, output_directory, num_versions=args.num_versions, pipelines=pipelines,
+                                    target_size=args.target_size)
     
     print("\n🔍 观察建议:")
     print("1. 对比原图和各个增强版本")
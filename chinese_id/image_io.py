@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统一的图片读写
+各脚本都通过这里读写图片:
+    - 一次读取文件字节、一次 cv2.imdecode，失败直接返回 None，不再依次尝试 cv2.imread 和绝对路径
+    - 文件由 Python 打开，Windows 中文路径和 Linux/macOS 的 UTF-8 路径都能正确处理
+      （cv2.imread 在 Windows 上按 ANSI 代码页解释路径，中文路径会读取失败）
+    - 大文件（默认 16 MB 以上）用 np.memmap 映射后直接交给解码器，不先复制到进程内存
+    - 指定目标尺寸时大图按 OpenCV 缩小模式（IMREAD_REDUCED_COLOR_2/4/8）解码，再缩放剩余部分
+    - 进程内累计读取、解码、写出的耗时和字节数，print_io_stats() 打印
+
+用法:
+    import image_io
+    image = image_io.read_image("chinese_ids/张三/xxx_front.png")          # BGR，失败返回 None
+    image = image_io.read_image(path, target_size=(1024, 768))             # 缩小解码
+    image_io.write_image("out/张三.png", image, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+    image_io.print_io_stats()
+"""
+
+import io
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 超过该字节数的文件使用内存映射读取
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+# OpenCV 缩小解码模式: 缩小倍数 -> 读取标志（JPEG 在 DCT 阶段直接缩小，解码时间和内存按倍数平方下降）
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# 读取图片尺寸时交给 PIL 的文件头字节数，JPEG 的 EXIF 更长时再用整个缓冲区
+HEADER_BYTES = 64 * 1024
+
+
+class IOStats:
+    """读写计数器（线程安全，按进程统计）"""
+
+    FIELDS = ("files_read", "bytes_read", "read_seconds", "mmap_reads", "decoded", "decode_seconds",
+              "failures", "files_written", "bytes_written", "write_seconds")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._values = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+stats = IOStats()
+
+
+def io_stats():
+    """当前进程的读写统计字典"""
+    return stats.snapshot()
+
+
+def take_io_stats():
+    """返回当前统计并清零（工作进程把统计交回主进程时使用）"""
+    with stats._lock:
+        values = dict(stats._values)
+        stats._values = dict.fromkeys(IOStats.FIELDS, 0)
+    return values
+
+
+def merge_io_stats(values):
+    """合并其他进程交回的统计"""
+    stats.add(**{key: values.get(key, 0) for key in IOStats.FIELDS})
+
+
+def print_io_stats():
+    s = io_stats()
+    if not s["files_read"] and not s["files_written"]:
+        return
+    print(f"💽 图片读写: 读取 {s['files_read']} 个文件 {s['bytes_read'] / 1e6:.1f} MB "
+          f"（{s['read_seconds']:.2f}s，内存映射 {s['mmap_reads']}），解码 {s['decoded']} 张 {s['decode_seconds']:.2f}s，"
+          f"失败 {s['failures']}；写出 {s['files_written']} 个文件 {s['bytes_written'] / 1e6:.1f} MB "
+          f"（{s['write_seconds']:.2f}s）")
+
+
+def read_bytes(path, use_mmap=None):
+    """
+    读取文件字节为 np.uint8 数组
+
+    Args:
+        use_mmap: True 总是内存映射，False 总是读入内存，None 按 MMAP_THRESHOLD 自动选择
+    """
+    start = time.perf_counter()
+    path = os.fspath(path)
+    size = os.path.getsize(path)
+    mapped = size > 0 and (use_mmap if use_mmap is not None else size >= MMAP_THRESHOLD)
+    data = np.memmap(path, dtype=np.uint8, mode="r") if mapped else np.fromfile(path, dtype=np.uint8)
+    stats.add(files_read=1, bytes_read=size, read_seconds=time.perf_counter() - start, mmap_reads=int(mapped))
+    return data
+
+
+def fit_size(width, height, target_size):
+    """保持宽高比缩小到目标尺寸以内，原图不超过目标尺寸时返回原尺寸"""
+    scale = min(target_size[0] / width, target_size[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale)), scale
+
+
+def reduced_decode_factor(width, height, target_size):
+    """解码后仍不小于目标尺寸的最大缩小倍数（2/4/8），不需要缩小时返回 1"""
+    _, _, scale = fit_size(width, height, target_size)
+    factors = [f for f in REDUCED_DECODE_FLAGS if 1.0 / f >= scale]
+    return max(factors, default=1)
+
+
+def resize_to_fit(image, target_size):
+    """缩小到目标尺寸以内（保持宽高比），不放大"""
+    width, height, scale = fit_size(image.shape[1], image.shape[0], target_size)
+    if scale >= 1.0:
+        return image
+    # 缩小解码后剩余的缩放不超过 2 倍，线性插值与 INTER_AREA 效果接近且快得多
+    interpolation = cv2.INTER_LINEAR if scale >= 0.5 else cv2.INTER_AREA
+    return cv2.resize(image, (width, height), interpolation=interpolation)
+
+
+def image_size(data):
+    """
+    只解析文件头获取 (宽, 高)，不解码像素；先只拷贝前 HEADER_BYTES 字节，不够时再用整个缓冲区
+
+    Raises:
+        Exception: 无法识别的图片格式
+    """
+    view = memoryview(data)
+    try:
+        return Image.open(io.BytesIO(view[:HEADER_BYTES])).size
+    except Exception:
+        if len(view) <= HEADER_BYTES:
+            raise
+    return Image.open(io.BytesIO(view)).size
+
+
+def decode_image(data, target_size=None, flags=cv2.IMREAD_COLOR):
+    """
+    解码图片字节，失败返回 None
+
+    Args:
+        data: np.uint8 一维数组（read_bytes 的返回值，或 tar 分片等来源的字节）
+        target_size: (宽, 高)，原图更大时先用 OpenCV 缩小模式解码，再把剩余部分缩放到目标尺寸以内
+        flags: cv2.IMREAD_* 标志，target_size 只对 IMREAD_COLOR 生效
+    """
+    start = time.perf_counter()
+    if target_size is not None and flags == cv2.IMREAD_COLOR:
+        try:
+            width, height = image_size(data)
+            flags = REDUCED_DECODE_FLAGS.get(reduced_decode_factor(width, height, target_size), flags)
+        except Exception:
+            pass
+    image = cv2.imdecode(data, flags)
+    if image is not None and target_size is not None:
+        image = resize_to_fit(image, target_size)
+    stats.add(decoded=int(image is not None), failures=int(image is None),
+              decode_seconds=time.perf_counter() - start)
+    return image
+
+
+def read_image(path, target_size=None, flags=cv2.IMREAD_COLOR, use_mmap=None):
+    """
+    读取图片（BGR），文件不存在或无法解码时返回 None（计入 failures，由调用方报告）
+
+    Args:
+        target_size: (宽, 高)，指定时大图按缩小模式解码并缩放到该尺寸以内
+        flags: cv2.IMREAD_* 标志
+        use_mmap: 见 read_bytes
+    """
+    try:
+        data = read_bytes(path, use_mmap)
+    except (OSError, ValueError):
+        stats.add(failures=1)
+        return None
+    return decode_image(data, target_size, flags)
+
+
+def write_bytes(path, data):
+    """写出字节（Unicode 路径安全）"""
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        f.write(data)
+    stats.add(files_written=1, bytes_written=len(data), write_seconds=time.perf_counter() - start)
+
+
+def encode_image(image, ext=".png", params=None):
+    """按扩展名编码图片为字节，失败返回 None"""
+    result, encoded = cv2.imencode(ext, image, params or [])
+    return encoded.tobytes() if result else None
+
+
+def write_image(path, image, params=None):
+    """
+    按文件扩展名编码并写出图片（替代 cv2.imwrite，支持中文路径）
+
+    Returns:
+        bool: 是否成功
+    """
+    data = encode_image(image, os.path.splitext(os.fspath(path))[1] or ".png", params)
+    if data is None:
+        return False
+    write_bytes(path, data)
+    return True
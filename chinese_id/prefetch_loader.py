@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预取增强数据加载器
+训练时直接从 chinese_ids 目录（或 tar 分片）读取源图片，在工作进程中用 batch_augment 的增强管道
+实时增强，不写出任何文件。
+
+共享内存环形缓冲区:
+    - 缓冲区分成 prefetch + 1 个槽位，每个槽位是一个 (batch_size, H, W, 3) 的 uint8 批次
+    - 工作进程取一个空闲槽位，把整批增强结果直接写进共享内存，再通知消费者
+    - 消费者拿到的是共享内存上的 NumPy 视图（零拷贝），取下一批时上一批的槽位归还给工作进程
+    - 任务按需提交，工作进程最多领先消费者 prefetch 个批次，内存占用固定
+    - 提前结束一轮迭代时，该轮标记为过期，工作进程跳过还没做完的批次，只需收回已在途的少量批次
+
+每张图片的增强种子为 variant_seed(seed, 用户, 文件名, epoch + 1)，第 0 轮与 batch_augment.py --engine albumentations
+写出的 _aug_01 版本使用相同种子，随机参数相同（旋转角度、是否加噪声等），但像素不一致：源图片在解码时就缩小到
+槽位尺寸附近（IMREAD_REDUCED + resize_to_fit），噪声、模糊核和几何变换在这个分辨率上进行，
+而 batch_augment.py 在原始分辨率上增强。
+
+饥饿统计: 消费者每次等待下一批的时间，等待超过阈值的批次计为"饥饿"（增强跟不上训练）；
+工作进程等待空闲槽位的时间说明训练比增强慢，可以减少工作进程。
+
+分片格式: 普通 tar 文件，成员路径为 用户/文件名（python prefetch_loader.py shard 生成）。
+
+用法:
+    with PrefetchLoader("chinese_ids", batch_size=32, image_size=(512, 320), workers=4, prefetch=4) as loader:
+        for epoch in range(10):
+            for batch, meta in loader:
+                train_step(batch)          # batch: (N, 320, 512, 3) uint8 RGB，只在下一次迭代前有效
+        loader.print_stats()
+
+    python prefetch_loader.py run --input chinese_ids --batch-size 32 --workers 4 --train-ms 50
+    python prefetch_loader.py shard --input chinese_ids --output shards --shard-size 1000
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import tarfile
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import augment_registry
+import batch_augment
+import image_io
+import quality_presets
+from virtual_augment import iter_source_images
+
+# 消费者等待超过该时间（秒）的批次计为饥饿
+STARVATION_THRESHOLD = 0.001
+
+# 等待下一批时每隔该秒数检查一次工作进程是否存活
+WORKER_CHECK_INTERVAL = 1.0
+
+
+def list_sources(source):
+    """
+    列出源图片 [(类型, 位置, 相对路径), ...]
+
+    Args:
+        source: chinese_ids 目录、单个 .tar 分片，或包含 .tar 分片的目录
+    """
+    path = Path(source)
+    shards = [path] if path.suffix == ".tar" else sorted(path.glob("*.tar")) if path.is_dir() else []
+    if shards:
+        entries = []
+        for shard in shards:
+            with tarfile.open(shard) as tar:
+                entries.extend(("tar", str(shard), member.name) for member in tar.getmembers()
+                               if member.isfile() and Path(member.name).suffix.lower() in batch_augment.IMAGE_SUFFIXES)
+        return entries
+    return [("file", str(image_file), f"{person_dir.name}/{image_file.name}")
+            for person_dir, image_file in iter_source_images(path)]
+
+
+def write_shards(input_dir, output_dir, shard_size=1000):
+    """
+    把 chinese_ids 目录打包成 tar 分片（不压缩，按文件名顺序），返回分片路径列表
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    images = list(iter_source_images(Path(input_dir)))
+    shards = []
+    for start in range(0, len(images), shard_size):
+        shard_path = output_path / f"shard-{start // shard_size:05d}.tar"
+        with tarfile.open(shard_path, "w") as tar:
+            for person_dir, image_file in images[start:start + shard_size]:
+                tar.add(image_file, arcname=f"{person_dir.name}/{image_file.name}")
+        shards.append(shard_path)
+        print(f"   📦 {shard_path.name}: {min(shard_size, len(images) - start)} 张")
+    return shards
+
+
+class _SourceReader:
+    """工作进程内读取源图片，tar 分片保持打开"""
+
+    def __init__(self, target_size):
+        self.target_size = target_size
+        self._tars = {}
+
+    def read(self, entry):
+        kind, location, name = entry
+        if kind == "file":
+            return image_io.read_image(location, self.target_size)
+        tar = self._tars.get(location)
+        if tar is None:
+            tar = self._tars[location] = tarfile.open(location)
+        data = np.frombuffer(tar.extractfile(name).read(), dtype=np.uint8)
+        return image_io.decode_image(data, self.target_size)
+
+
+def _worker_loop(shm_name, ring_shape, tasks, free_slots, ready, blocked, active_run, options):
+    """
+    工作进程: 取任务 → 取空闲槽位 → 逐张读取、增强、缩放到槽位尺寸 → 通知消费者
+    任务所属的迭代已不是 active_run 时（消费者提前结束），不再处理，槽位为 None 或原样交回
+    """
+    quality, spec_path, pipelines, cv2_threads = options
+    quality_presets.set_preset(quality)
+    if spec_path != augment_registry.registry.spec_path:
+        augment_registry.use_spec(spec_path)
+    cv2.setNumThreads(cv2_threads)
+    pipeline = batch_augment.build_transform(pipelines)
+    interpolation = quality_presets.get_preset().cv2_interpolation_flag
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=shm.buf)
+    height, width = ring_shape[2:4]
+    reader = _SourceReader((width, height))
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            run, batch_index, items = task
+            if active_run.value != run:
+                ready.put((None, batch_index, None))
+                continue
+
+            start = time.perf_counter()
+            slot = free_slots.get()
+            with blocked.get_lock():
+                blocked.value += time.perf_counter() - start
+
+            valid = []
+            for k, (entry, seed) in enumerate(items):
+                if active_run.value != run:
+                    break
+                try:
+                    image = reader.read(entry)
+                    if image is None:
+                        raise IOError(f"无法读取图片 {entry[2]}")
+                    image = batch_augment.augment_image(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), pipeline, seed)
+                    if image.shape[:2] != (height, width):
+                        image = cv2.resize(image, (width, height), interpolation=interpolation)
+                    ring[slot, k] = image
+                    valid.append(True)
+                except Exception as e:
+                    print(f"      ❌ [prefetch] {e}")
+                    ring[slot, k] = 0
+                    valid.append(False)
+            ready.put((slot, batch_index, valid))
+    finally:
+        del ring
+        shm.close()
+
+
+class PrefetchLoader:
+    """
+    多进程预取增强加载器
+
+    Args:
+        source: chinese_ids 目录、.tar 分片或分片目录
+        batch_size: 每批图片数量
+        image_size: 槽位尺寸 (宽, 高)，增强后的图片缩放到该尺寸
+        workers: 增强工作进程数
+        prefetch: 预取深度（工作进程最多领先消费者的批次数）
+        seed: 基础随机种子（与 batch_augment.py --seed 一致）
+        pipelines: [(管道名称, 权重), ...]，默认 batch_augment
+        shuffle: 每轮按 (seed, epoch) 打乱顺序
+        drop_last: 丢弃最后不满一批的图片
+        cv2_threads: 每个工作进程的 OpenCV 线程数
+        starvation_threshold: 消费者等待超过该秒数的批次计为饥饿
+    """
+
+    def __init__(self, source, batch_size=32, image_size=(512, 320), workers=2, prefetch=4, seed=0,
+                 pipelines=None, shuffle=True, drop_last=False, cv2_threads=1,
+                 starvation_threshold=STARVATION_THRESHOLD):
+        self.sources = list_sources(source)
+        if not self.sources:
+            raise ValueError(f"没有找到源图片: {source}")
+        self.batch_size = batch_size
+        self.image_size = image_size
+        self.seed = seed
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.starvation_threshold = starvation_threshold
+        self.epoch = 0
+
+        width, height = image_size
+        self._ring_shape = (prefetch + 1, batch_size, height, width, 3)
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self._ring_shape)))
+        self._ring = np.ndarray(self._ring_shape, dtype=np.uint8, buffer=self._shm.buf)
+
+        self._tasks = multiprocessing.Queue()
+        self._free_slots = multiprocessing.Queue()
+        self._ready = multiprocessing.Queue()
+        self._blocked = multiprocessing.Value("d", 0.0)
+        # 当前迭代的编号，0 表示没有进行中的迭代；工作进程据此跳过过期任务
+        self._active_run = multiprocessing.Value("i", 0)
+        self._runs = 0
+        for slot in range(self._ring_shape[0]):
+            self._free_slots.put(slot)
+
+        options = (quality_presets.get_preset().name, augment_registry.registry.spec_path, pipelines, cv2_threads)
+        self._workers = [
+            multiprocessing.Process(target=_worker_loop, daemon=True, name=f"prefetch-{n}",
+                                    args=(self._shm.name, self._ring_shape, self._tasks, self._free_slots,
+                                          self._ready, self._blocked, self._active_run, options))
+            for n in range(max(1, workers))]
+        for process in self._workers:
+            process.start()
+
+        self._stats = {"batches": 0, "images": 0, "invalid": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                       "starved_batches": 0, "consume_seconds": 0.0}
+        self._closed = False
+        self._broken = False
+
+    def __len__(self):
+        """每轮的批次数"""
+        if self.drop_last:
+            return len(self.sources) // self.batch_size
+        return -(-len(self.sources) // self.batch_size)
+
+    def _plan_epoch(self, epoch):
+        order = np.arange(len(self.sources))
+        if self.shuffle:
+            np.random.default_rng([self.seed, epoch]).shuffle(order)
+        batches = []
+        for batch_index in range(len(self)):
+            items = []
+            for i in order[batch_index * self.batch_size:(batch_index + 1) * self.batch_size]:
+                entry = self.sources[i]
+                person, _, name = entry[2].rpartition("/")
+                items.append((entry, batch_augment.variant_seed(self.seed, person, name, epoch + 1)))
+            batches.append(items)
+        return batches
+
+    def __iter__(self):
+        epoch = self.epoch
+        self.epoch += 1
+        return self.iter_epoch(epoch)
+
+    def iter_epoch(self, epoch):
+        """
+        迭代一轮，产出 (批次视图, 元数据)
+        批次按完成顺序产出；视图指向共享内存，取下一批后会被工作进程覆盖，需要保留时请 copy()
+
+        元数据: {'epoch', 'batch', 'sources': [相对路径], 'seeds': [种子], 'valid': [是否读取成功]}
+        """
+        if self._closed:
+            raise RuntimeError("加载器已关闭")
+        if self._broken:
+            raise RuntimeError("预取工作进程已退出，加载器不能继续使用")
+        batches = self._plan_epoch(epoch)
+        self._runs += 1
+        run = self._active_run.value = self._runs
+        # 在途（已提交未消费）的批次不超过预取深度，加上消费者持有的一个正好占满所有槽位
+        ahead = max(1, self._ring_shape[0] - 1)
+        submitted = 0
+
+        def submit():
+            nonlocal submitted
+            self._tasks.put((run, submitted, batches[submitted]))
+            submitted += 1
+
+        while submitted < min(ahead, len(batches)):
+            submit()
+
+        held = None
+        received = 0
+        start = time.perf_counter()
+        try:
+            while received < len(batches):
+                if held is not None:
+                    self._free_slots.put(held)
+                    held = None
+                wait_start = time.perf_counter()
+                slot, batch_index, valid = self._get_ready()
+                self._record_wait(time.perf_counter() - wait_start)
+                received += 1
+                held = slot
+                if submitted < len(batches):
+                    submit()
+
+                items = batches[batch_index]
+                self._stats["batches"] += 1
+                self._stats["images"] += len(items)
+                self._stats["invalid"] += valid.count(False)
+                yield self._ring[slot, :len(items)], {
+                    "epoch": epoch,
+                    "batch": batch_index,
+                    "sources": [entry[2] for entry, _ in items],
+                    "seeds": [seed for _, seed in items],
+                    "valid": valid,
+                }
+        finally:
+            if held is not None:
+                self._free_slots.put(held)
+            # 提前结束迭代时，标记本轮过期让工作进程跳过剩余工作，再收回已提交的批次，
+            # 保证下一轮从干净的状态开始（工作进程已退出时收不齐，加载器不能再使用）
+            self._active_run.value = 0
+            while received < submitted and not self._broken:
+                try:
+                    slot, _, _ = self._get_ready()
+                except RuntimeError:
+                    break
+                if slot is not None:
+                    self._free_slots.put(slot)
+                received += 1
+            self._stats["consume_seconds"] += time.perf_counter() - start
+
+    def _get_ready(self):
+        """
+        等待下一个完成的批次，期间定期检查工作进程
+
+        Raises:
+            RuntimeError: 有工作进程已退出（被 OOM 杀掉、OpenCV 崩溃、逐张 try 之外的异常），
+                它领取的批次永远不会完成
+        """
+        while True:
+            try:
+                return self._ready.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                pass
+            dead = [process for process in self._workers if not process.is_alive()]
+            if dead:
+                self._broken = True
+                raise RuntimeError("预取工作进程已退出: " + "，".join(
+                    f"{process.name}（exitcode {process.exitcode}）" for process in dead))
+
+    def _record_wait(self, wait):
+        stats = self._stats
+        stats["wait_seconds"] += wait
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+        if wait > self.starvation_threshold:
+            stats["starved_batches"] += 1
+
+    def stats(self):
+        """预取与饥饿统计"""
+        stats = dict(self._stats)
+        batches = stats["batches"]
+        elapsed = stats["consume_seconds"]
+        stats.update({
+            "workers": len(self._workers),
+            "prefetch": self._ring_shape[0] - 1,
+            "starved_ratio": round(stats["starved_batches"] / batches, 3) if batches else 0.0,
+            "mean_wait_ms": round(stats["wait_seconds"] / batches * 1000, 2) if batches else 0.0,
+            # 消费者等待时间占比，接近 0 说明增强跟得上训练
+            "wait_fraction": round(stats["wait_seconds"] / elapsed, 3) if elapsed else 0.0,
+            # 工作进程等待空闲槽位的时间（所有进程之和），较大说明训练是瓶颈
+            "worker_blocked_seconds": round(self._blocked.value, 3),
+            "images_per_sec": round(stats["images"] / elapsed, 2) if elapsed else 0.0,
+            "ring_bytes": self._shm.size,
+        })
+        for key in ("wait_seconds", "max_wait_seconds", "consume_seconds"):
+            stats[key] = round(stats[key], 3)
+        return stats
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"\n📊 预取加载统计（{s['workers']} 个工作进程，预取深度 {s['prefetch']}，"
+              f"缓冲区 {s['ring_bytes'] / 1024 / 1024:.1f} MB）")
+        print(f"   • 批次/图片: {s['batches']}/{s['images']}（读取失败 {s['invalid']}）")
+        print(f"   • 吞吐量: {s['images_per_sec']:.1f} 张/秒")
+        print(f"   • 饥饿批次: {s['starved_batches']}（{s['starved_ratio'] * 100:.1f}%），"
+              f"平均等待 {s['mean_wait_ms']:.1f} ms，最长 {s['max_wait_seconds'] * 1000:.1f} ms，"
+              f"等待占比 {s['wait_fraction'] * 100:.1f}%")
+        print(f"   • 工作进程等待空闲槽位: {s['worker_blocked_seconds']:.2f}s")
+
+    def close(self):
+        """停止工作进程并释放共享内存"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        for process in self._workers:
+            # 有工作进程退出后其余进程可能阻塞在空闲槽位上，不再等待
+            process.join(timeout=0 if self._broken else 10)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        del self._ring
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预取增强数据加载器")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="模拟训练循环，报告吞吐量和饥饿统计")
+    run.add_argument("--input", default="chinese_ids", help="chinese_ids 目录、.tar 分片或分片目录")
+    run.add_argument("--batch-size", type=int, default=32)
+    run.add_argument("--size", type=batch_augment.parse_size, default=(512, 320), metavar="WxH", help="槽位尺寸")
+    run.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    run.add_argument("--prefetch", type=int, default=4, help="预取深度")
+    run.add_argument("--epochs", type=int, default=1)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--train-ms", type=float, default=0.0, help="模拟每个训练步的耗时（毫秒）")
+    run.add_argument("--pipelines", nargs="+", metavar="NAME[:WEIGHT]", help="增强管道和权重")
+    run.add_argument("--quality", choices=list(quality_presets.PRESETS))
+
+    shard = subparsers.add_parser("shard", help="把 chinese_ids 目录打包成 tar 分片")
+    shard.add_argument("--input", default="chinese_ids")
+    shard.add_argument("--output", required=True)
+    shard.add_argument("--shard-size", type=int, default=1000, help="每个分片的图片数")
+
+    args = parser.parse_args()
+    if args.command == "shard":
+        shards = write_shards(args.input, args.output, args.shard_size)
+        print(f"✅ 写出 {len(shards)} 个分片到 {args.output}")
+        return
+
+    if args.quality:
+        quality_presets.set_preset(args.quality)
+    pipelines = augment_registry.parse_weighted(args.pipelines) if args.pipelines else None
+    with PrefetchLoader(args.input, args.batch_size, args.size, args.workers, args.prefetch, args.seed,
+                        pipelines) as loader:
+        print(f"🚚 {len(loader.sources)} 张源图片，每轮 {len(loader)} 批")
+        for _ in range(args.epochs):
+            for batch, meta in loader:
+                if args.train_ms:
+                    time.sleep(args.train_ms / 1000)
+        loader.print_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+程序化桌面背景生成
+不需要 Stable Diffusion 和 GPU，用 NumPy/OpenCV 在 CPU 上合成桌面纹理:
+    - wood:    木纹，分形噪声扭曲的年轮线 + 顺纹细丝，多块木板拼接
+    - marble:  大理石，湍流扭曲的正弦纹脉 + 云状底色
+    - fabric:  床单织物，平纹/斜纹经纬线交织 + 格子/条纹配色（最多 3 色）+ 低频褶皱明暗
+    - lacquer: 漆面，纯色 + 柔和高光
+所有纹理最后叠加随机方向的光照渐变和暗角。
+
+分形噪声用随机网格双三次放大后按倍频叠加（值噪声），比逐像素计算梯度噪声快一个数量级，
+视觉上足够作为纹理扰动。每张图片的随机数由 (--seed, 纹理类型, 序号) 决定，相同参数重复运行结果一致。
+
+输出写入 desktop_backgrounds/<类别>/，与 SD 脚本的目录结构相同，
+composite_id_card_on_background 递归扫描背景目录，不需要任何修改即可使用。
+
+    python procedural_backgrounds.py --count 500
+    python procedural_backgrounds.py --types wood marble --count 2000 --workers 4
+    python procedural_backgrounds.py --size 2048x1536 --format png
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+import image_io
+import quality_presets
+
+# 纹理类型: 输出子目录（与 SD 脚本的子目录命名方式一致）
+CATEGORIES = {
+    "wood": "木质桌面_程序生成",
+    "marble": "大理石台面_程序生成",
+    "fabric": "床单背景_程序生成",
+    "lacquer": "漆面桌面_程序生成",
+}
+
+# 木材 (浅色, 深色)，RGB
+WOOD_COLORS = [
+    ((196, 152, 108), (128, 84, 50)),    # 橡木
+    ((222, 184, 135), (160, 112, 70)),   # 松木
+    ((150, 92, 60), (84, 46, 28)),       # 胡桃木
+    ((180, 110, 70), (110, 58, 34)),     # 樱桃木
+    ((210, 190, 160), (150, 125, 95)),   # 白蜡木
+]
+
+# 大理石 (底色, 纹脉颜色)
+MARBLE_COLORS = [
+    ((236, 234, 230), (120, 120, 125)),  # 卡拉拉白
+    ((240, 236, 226), (176, 146, 96)),   # 金色纹脉
+    ((42, 42, 46), (210, 210, 205)),     # 黑金花
+    ((214, 206, 196), (140, 120, 104)),  # 米黄
+    ((200, 214, 206), (70, 100, 84)),    # 绿纹
+]
+
+# 床单配色（每张图片从中选 2-3 色）
+FABRIC_COLORS = [
+    (236, 232, 222), (200, 210, 226), (120, 150, 190), (70, 90, 140),
+    (226, 200, 196), (180, 90, 90), (210, 220, 200), (110, 140, 110),
+    (235, 220, 180), (150, 150, 150), (60, 60, 70),
+]
+
+# 漆面颜色
+LACQUER_COLORS = [
+    (196, 160, 120), (150, 100, 66), (92, 56, 36), (205, 205, 200),
+    (168, 170, 172), (235, 232, 224), (60, 60, 62), (122, 84, 60),
+]
+
+
+@lru_cache(maxsize=4)
+def pixel_grid(width, height):
+    """归一化坐标网格 (x, y)，范围 [0, 1)，按尺寸缓存"""
+    x = np.arange(width, dtype=np.float32) / width
+    y = np.arange(height, dtype=np.float32) / height
+    return np.broadcast_to(x[None, :], (height, width)), np.broadcast_to(y[:, None], (height, width))
+
+
+def value_noise(rng, width, height, cells_x, cells_y):
+    """单层值噪声：(cells_y+1)x(cells_x+1) 的随机网格双三次放大，范围约 [0, 1]"""
+    grid = rng.random((max(1, int(cells_y)) + 1, max(1, int(cells_x)) + 1), dtype=np.float32)
+    return cv2.resize(grid, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+def fractal_noise(rng, width, height, cells_x, cells_y, octaves=4, persistence=0.5):
+    """
+    分形噪声：每个倍频网格加密一倍、振幅乘 persistence
+
+    Returns:
+        np.ndarray: float32 (height, width)，归一化到 [0, 1]
+    """
+    total = np.zeros((height, width), np.float32)
+    amplitude = 1.0
+    weight = 0.0
+    for octave in range(octaves):
+        scale = 2 ** octave
+        total += amplitude * value_noise(rng, width, height, cells_x * scale, cells_y * scale)
+        weight += amplitude
+        amplitude *= persistence
+    total /= weight
+    low, high = float(total.min()), float(total.max())
+    return (total - low) / (high - low + 1e-6)
+
+
+def curve_lut(values, func, bins=1024):
+    """
+    对 [0, 1] 范围的数组逐元素应用 func，用查表代替逐像素的 pow/sin/exp
+
+    Returns:
+        np.ndarray: float32，与 values 同形状
+    """
+    table = func(np.linspace(0, 1, bins, dtype=np.float32)).astype(np.float32)
+    return table[(np.clip(values, 0, 1) * (bins - 1)).astype(np.int32)]
+
+
+def lerp_colors(low, high, t):
+    """按 t (H, W) 在两种 RGB 颜色之间插值，返回 float32 (H, W, 3)"""
+    low = np.asarray(low, np.float32)
+    high = np.asarray(high, np.float32)
+    return low + (high - low) * t[..., None]
+
+
+# 低频场（光照、反光带）的计算网格：在小网格上计算后线性放大，结果与逐像素计算没有可见差别
+FIELD_GRID = (64, 48)
+
+# 颗粒噪声贴片边长：每张图片从贴片的随机位置开始平铺
+GRAIN_TILE = 256
+
+
+def smooth_field(field, width, height):
+    """把小网格上计算的低频场线性放大到输出尺寸（已是输出尺寸时原样返回）"""
+    if field.shape == (height, width):
+        return field
+    return cv2.resize(field.astype(np.float32), (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+@lru_cache(maxsize=1)
+def grain_tile():
+    return np.random.default_rng(0).standard_normal((GRAIN_TILE, GRAIN_TILE), dtype=np.float32) * 1.5
+
+
+def wood_texture(rng, width, height):
+    """木纹：多块木板，每块年轮线被分形噪声扭曲，再叠加顺纹细丝"""
+    light, dark = WOOD_COLORS[rng.integers(len(WOOD_COLORS))]
+    x, y = pixel_grid(width, height)
+
+    boards = int(rng.integers(2, 6))
+    board = np.minimum((y * boards).astype(np.int32), boards - 1)
+    offsets = rng.random(boards, dtype=np.float32) * 10
+    tints = 1 + rng.uniform(-0.08, 0.08, boards).astype(np.float32)
+
+    warp = fractal_noise(rng, width, height, 3, 2, octaves=3)
+    rings = float(rng.uniform(8, 20))
+    t = (y * boards - board) * rings + x * float(rng.uniform(-1.5, 1.5)) + warp * float(
+        rng.uniform(1.5, 4)) + offsets[board]
+    # 年轮剖面：早材浅、晚材深，深色线较窄
+    exponent = float(rng.uniform(2.5, 5))
+    profile = curve_lut(t - np.floor(t), lambda v: v ** exponent)
+
+    # 顺纹细丝：横向拉长的噪声
+    streaks = fractal_noise(rng, width, height, 2, height / 6, octaves=2)
+    v = np.clip(0.55 * (1 - profile) + 0.45 * streaks, 0, 1)
+    rgb = lerp_colors(dark, light, v) * tints[board][..., None]
+
+    # 木板之间的接缝
+    seam = np.abs(y * boards - np.round(y * boards)) * height / boards
+    rgb *= np.where(seam < 1.5, 0.55, 1.0).astype(np.float32)[..., None]
+    return rgb
+
+
+def marble_texture(rng, width, height):
+    """大理石：云状底色 + 湍流扭曲的细纹脉"""
+    base, vein = MARBLE_COLORS[rng.integers(len(MARBLE_COLORS))]
+    x, y = pixel_grid(width, height)
+    aspect = width / height
+
+    clouds = fractal_noise(rng, width, height, 4, 3, octaves=4)
+    rgb = lerp_colors(np.asarray(base, np.float32) * 0.92, base, clouds)
+
+    angle = float(rng.uniform(0, np.pi))
+    direction = x * aspect * np.cos(angle) + y * np.sin(angle)
+    for strength, frequency, power in ((0.85, rng.uniform(2, 5), rng.uniform(20, 60)),
+                                       (0.45, rng.uniform(6, 12), rng.uniform(30, 90))):
+        turbulence = fractal_noise(rng, width, height, 3, 2, octaves=5, persistence=0.55)
+        t = direction * float(frequency) + turbulence * float(rng.uniform(2, 4))
+        # 到最近整数的距离 [0, 0.5] -> 纹脉强度 (1 - |sin(pi t)|) ** power
+        veins = curve_lut(np.abs(t - np.rint(t)) * 2,
+                          lambda v, p=float(power), k=float(strength): (1 - np.sin(np.pi * v / 2)) ** p * k)
+        rgb = rgb + (np.asarray(vein, np.float32) - rgb) * veins[..., None]
+    return rgb
+
+
+def fabric_texture(rng, width, height):
+    """床单织物：经纬线交织的凹凸 + 经向/纬向配色形成的条纹或格子 + 褶皱明暗"""
+    count = int(rng.integers(2, 4))
+    palette = np.asarray([FABRIC_COLORS[i] for i in rng.choice(len(FABRIC_COLORS), count, replace=False)],
+                         np.float32)
+    xs = np.arange(width, dtype=np.float32)[None, :]
+    ys = np.arange(height, dtype=np.float32)[:, None]
+
+    # 经纬线：周期 period 像素，剖面为余弦；平纹 (i+j)%2，斜纹 (i+j)%3
+    period = float(rng.uniform(3, 7))
+    repeat = 2 if rng.random() < 0.5 else 3
+    column = np.floor(xs / period).astype(np.int32)
+    row = np.floor(ys / period).astype(np.int32)
+    warp_on_top = (column + row) % repeat == 0
+    warp_profile = 0.5 + 0.5 * np.cos(2 * np.pi * (xs / period - column - 0.5))
+    weft_profile = 0.5 + 0.5 * np.cos(2 * np.pi * (ys / period - row - 0.5))
+    weave = np.where(warp_on_top, warp_profile, weft_profile)
+
+    # 条纹宽度（像素）；plaid 时纬线也按条纹换色
+    stripe = float(rng.uniform(width / 40, width / 8))
+    warp_color = palette[(np.floor(xs / stripe).astype(np.int32) % count)[0]]       # (W, 3)
+    plaid = rng.random() < 0.6
+    weft_index = (np.floor(ys / stripe).astype(np.int32) % count)[:, 0] if plaid else np.zeros(height, np.int32)
+    weft_color = palette[weft_index]                                                  # (H, 3)
+    rgb = np.where(warp_on_top[..., None], warp_color[None, :, :], weft_color[:, None, :])
+
+    # 褶皱：低频噪声的梯度方向做明暗
+    folds = fractal_noise(rng, width, height, 3, 2, octaves=2)
+    shading = 0.85 + 0.3 * cv2.Sobel(folds, cv2.CV_32F, 1, 1, ksize=5) * min(width, height) / 40
+    shading = np.clip(shading, 0.6, 1.15)
+    return rgb * (0.8 + 0.2 * weave)[..., None] * shading[..., None]
+
+
+def lacquer_texture(rng, width, height):
+    """漆面：纯色，极弱的低频起伏 + 一条柔和的反光带"""
+    color = np.asarray(LACQUER_COLORS[rng.integers(len(LACQUER_COLORS))], np.float32)
+    x, y = pixel_grid(*FIELD_GRID)
+    aspect = width / height
+    ripple = fractal_noise(rng, width, height, 2, 2, octaves=2)
+    rgb = color * (0.97 + 0.06 * ripple)[..., None]
+
+    angle = float(rng.uniform(0, np.pi))
+    distance = (x - float(rng.random())) * aspect * np.sin(angle) - (y - float(rng.random())) * np.cos(angle)
+    highlight = smooth_field(np.exp(-(distance / float(rng.uniform(0.08, 0.25))) ** 2) * float(rng.uniform(0.08, 0.25)),
+                             width, height)
+    return rgb + (255 - rgb) * highlight[..., None]
+
+
+TEXTURES = {
+    "wood": wood_texture,
+    "marble": marble_texture,
+    "fabric": fabric_texture,
+    "lacquer": lacquer_texture,
+}
+
+
+def apply_lighting(rgb, rng):
+    """随机方向的线性光照渐变 + 暗角 + 细微颗粒"""
+    height, width = rgb.shape[:2]
+    x, y = pixel_grid(*FIELD_GRID)
+    angle = float(rng.uniform(0, 2 * np.pi))
+    gradient = ((x - 0.5) * np.cos(angle) + (y - 0.5) * np.sin(angle)) * float(rng.uniform(0.1, 0.3))
+    vignette = ((x - 0.5) ** 2 + (y - 0.5) ** 2) * float(rng.uniform(0.2, 0.6))
+    light = smooth_field(1 + gradient - vignette, width, height)
+
+    offset = rng.integers(GRAIN_TILE, size=2)
+    reps = (-(-(height + offset[0]) // GRAIN_TILE), -(-(width + offset[1]) // GRAIN_TILE))
+    grain = np.tile(grain_tile(), reps)[offset[0]:offset[0] + height, offset[1]:offset[1] + width]
+    rgb *= light[..., None]
+    rgb += grain[..., None]
+    return rgb
+
+
+def render_background(kind, seed, index, size=(1024, 768)):
+    """
+    生成一张背景
+
+    Args:
+        kind: 纹理类型（TEXTURES 的键）
+        seed: 全局种子
+        index: 图片序号
+        size: (宽, 高)
+
+    Returns:
+        np.ndarray: uint8 RGB (高, 宽, 3)
+    """
+    rng = np.random.default_rng([seed, list(TEXTURES).index(kind), index])
+    width, height = size
+    rgb = apply_lighting(TEXTURES[kind](rng, width, height), rng)
+    return np.clip(rgb, 0, 255).astype(np.uint8)
+
+
+def encode_params(ext):
+    preset = quality_presets.get_preset()
+    if ext == ".png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, preset.cv2_png_compression]
+    return [cv2.IMWRITE_JPEG_QUALITY, preset.jpeg_quality]
+
+
+def output_path(output_dir, kind, index, ext):
+    category = CATEGORIES[kind]
+    return os.path.join(output_dir, category, f"{category}_{index + 1:05d}{ext}")
+
+
+def render_jobs(jobs, output_dir, size, ext, seed, quality):
+    """
+    生成并写出一组背景（工作进程入口）
+
+    Returns:
+        tuple: (写出数量, 生成耗时, 编码写出耗时)
+    """
+    quality_presets.set_preset(quality)
+    params = encode_params(ext)
+    written = 0
+    render_seconds = 0.0
+    write_seconds = 0.0
+    for kind, index in jobs:
+        start = time.perf_counter()
+        rgb = render_background(kind, seed, index, size)
+        render_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        if image_io.write_image(output_path(output_dir, kind, index, ext), rgb[..., ::-1], params):
+            written += 1
+        write_seconds += time.perf_counter() - start
+    return written, render_seconds, write_seconds
+
+
+def generate_procedural_backgrounds(kinds, count, output_dir="desktop_backgrounds", size=(1024, 768), ext=".jpg",
+                                    seed=0, workers=1, chunk_size=16, skip_existing=False):
+    """
+    批量生成程序化背景
+
+    Args:
+        kinds: 纹理类型列表
+        count: 每种类型的数量
+        workers: 工作进程数，1 为本进程串行
+        skip_existing: 跳过已存在的输出文件（同一种子下文件内容相同，可用于补齐中断的运行）
+
+    Returns:
+        int: 写出的图片数
+    """
+    for kind in kinds:
+        os.makedirs(os.path.join(output_dir, CATEGORIES[kind]), exist_ok=True)
+    jobs = [(kind, index) for kind in kinds for index in range(count)]
+    if skip_existing:
+        jobs = [job for job in jobs if not os.path.exists(output_path(output_dir, *job, ext))]
+    chunks = [jobs[start:start + chunk_size] for start in range(0, len(jobs), chunk_size)]
+    quality = quality_presets.get_preset().name
+
+    print(f"🎨 程序化背景: {', '.join(kinds)}，每种 {count} 张，{size[0]}x{size[1]}{ext}，"
+          f"{len(jobs)} 张待生成，{workers} 个进程")
+    start = time.perf_counter()
+    written = 0
+    render_seconds = 0.0
+    write_seconds = 0.0
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_jobs, chunk, output_dir, size, ext, seed, quality) for chunk in chunks]
+            for future in as_completed(futures):
+                done, render, write = future.result()
+                written += done
+                render_seconds += render
+                write_seconds += write
+    else:
+        for chunk in chunks:
+            done, render, write = render_jobs(chunk, output_dir, size, ext, seed, quality)
+            written += done
+            render_seconds += render
+            write_seconds += write
+            if len(chunks) > 1:
+                print(f"  已生成 {written}/{len(jobs)}")
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ 完成: {written} 张，耗时 {elapsed:.1f}s（{written / elapsed * 60 if elapsed else 0:.0f} 张/分钟）")
+    if written:
+        print(f"   每张: 纹理 {render_seconds / written * 1000:.1f}ms，编码写出 {write_seconds / written * 1000:.1f}ms")
+    print(f"📁 输出目录: {output_dir}")
+    return written
+
+
+def parse_size(value):
+    width, height = (int(v) for v in value.lower().split("x"))
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="程序化桌面背景生成（CPU，不需要 Stable Diffusion）")
+    parser.add_argument("--types", nargs="+", choices=list(TEXTURES), default=list(TEXTURES), help="纹理类型")
+    parser.add_argument("--count", type=int, default=100, help="每种类型的数量")
+    parser.add_argument("--size", default="1024x768", metavar="WxH", help="背景尺寸")
+    parser.add_argument("--format", choices=["jpg", "png"], default="jpg", help="输出格式")
+    parser.add_argument("--output", default="desktop_backgrounds", help="输出目录")
+    parser.add_argument("--seed", type=int, default=0, help="全局种子")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数")
+    parser.add_argument("--skip-existing", action="store_true", help="跳过已存在的文件")
+    parser.add_argument("--quality", choices=list(quality_presets.PRESETS),
+                        help="质量档位（JPEG 质量 / PNG 压缩级别），默认取环境变量 ID_QUALITY")
+    args = parser.parse_args()
+
+    if args.quality:
+        quality_presets.set_preset(args.quality)
+    generate_procedural_backgrounds(args.types, args.count, args.output, parse_size(args.size), f".{args.format}",
+                                    args.seed, args.workers, skip_existing=args.skip_existing)
+
+
+if __name__ == "__main__":
+    main()
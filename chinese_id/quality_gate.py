@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成图片的快速质量门
+在头像后处理和保存之前检查 SD 原始输出，不合格的图片直接丢弃并换种子重新生成（sd_batch 的 gate 参数）。
+所有指标在缩小到 128 像素宽的图片上用 NumPy/OpenCV 向量化计算，512x512 的输出每张约 2ms:
+
+头像（证件照要求）:
+    - 边框白度: 上边和左右两边（肩部以上）近白像素比例，背景不是纯白时不合格
+    - 主体位置: 非白像素即主体（阈值掩码），头部区域质心偏离中线、头顶贴边时不合格
+    - 多人: 头部区域主体掩码的大连通域超过一个时不合格
+    - 亮度/对比度: 主体灰度均值和标准差超出范围时不合格（过暗、过曝、发灰）
+
+背景:
+    - 亮度均值、对比度（纯色或空白输出）、过暗/过曝像素比例
+
+    python quality_gate.py faces faces_advanced          # 统计已有头像的通过率和拒绝原因
+    python quality_gate.py backgrounds desktop_backgrounds
+"""
+
+import argparse
+import os
+from collections import Counter
+
+import cv2
+import numpy as np
+
+import image_io
+
+# 计算指标时的图片宽度
+GATE_WIDTH = 128
+
+# 近白像素：最暗通道不低于 WHITE_LEVEL 且通道差不超过 WHITE_TOLERANCE（排除浅色但有色偏的背景）
+WHITE_LEVEL = 230
+WHITE_TOLERANCE = 25
+
+FACE_THRESHOLDS = {
+    'border_band': 0.08,           # 边框宽度（占宽高的比例）
+    'min_border_white': 0.85,      # 边框近白像素比例下限
+    'head_band': 0.6,              # 头部区域：图片上方的比例
+    'min_subject': 0.05,           # 主体像素比例下限（几乎全白视为没有人）
+    'max_center_offset': 0.1,      # 头部质心偏离中线的上限（占宽度的比例）
+    'min_head_top': 0.02,          # 头顶到上边的最小距离（占高度的比例）
+    'min_component': 0.03,         # 计入人数的连通域面积下限（占头部区域的比例）
+    'brightness': (70, 215),       # 主体灰度均值范围
+    'min_contrast': 18,            # 主体灰度标准差下限
+}
+
+BACKGROUND_THRESHOLDS = {
+    'brightness': (35, 225),       # 灰度均值范围
+    'min_contrast': 6,             # 灰度标准差下限（纯色/空白输出）
+    'max_clipped': 0.2,            # 过暗（<8）或过曝（>247）像素比例上限
+}
+
+# 拒绝原因
+REASON_LABELS = {
+    'background': '背景不白',
+    'no_subject': '没有主体',
+    'off_center': '主体偏离中心',
+    'head_cut': '头顶被裁切',
+    'multiple': '多人',
+    'dark': '过暗',
+    'bright': '过亮',
+    'low_contrast': '对比度低',
+    'clipped': '过暗/过曝像素过多',
+}
+
+
+def small_rgb(image):
+    """PIL 图片或 RGB 数组缩小到 GATE_WIDTH 宽，返回 uint8 RGB 数组"""
+    array = np.asarray(image.convert('RGB') if hasattr(image, 'convert') else image)
+    height, width = array.shape[:2]
+    if width > GATE_WIDTH:
+        array = cv2.resize(array, (GATE_WIDTH, max(1, round(height * GATE_WIDTH / width))),
+                           interpolation=cv2.INTER_AREA)
+    return array
+
+
+def face_metrics(image, thresholds=FACE_THRESHOLDS):
+    """
+    头像质量指标
+
+    Args:
+        image: PIL 图片或 RGB 数组（SD 原始输出）
+
+    Returns:
+        dict: border_white, subject, center_offset, head_top, components, brightness, contrast
+    """
+    rgb = small_rgb(image)
+    height, width = rgb.shape[:2]
+    low = rgb.min(axis=2)
+    near_white = (low >= WHITE_LEVEL) & (rgb.max(axis=2) - low <= WHITE_TOLERANCE)
+
+    band = max(1, round(width * thresholds['border_band']))
+    head_rows = max(band + 1, round(height * thresholds['head_band']))
+    border = np.concatenate([near_white[:band].ravel(), near_white[band:head_rows, :band].ravel(),
+                             near_white[band:head_rows, -band:].ravel()])
+
+    subject = cv2.morphologyEx((~near_white).astype(np.uint8), cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    head = subject[:head_rows]
+    metrics = {
+        'border_white': float(border.mean()),
+        'subject': float(subject.mean()),
+        'center_offset': 0.0,
+        'head_top': 1.0,
+        'components': 0,
+        'brightness': 0.0,
+        'contrast': 0.0,
+    }
+    if not head.any():
+        return metrics
+
+    ys, xs = np.nonzero(head)
+    metrics['center_offset'] = float(abs(xs.mean() / width - 0.5))
+    rows = np.flatnonzero(head.mean(axis=1) > 0.02)
+    metrics['head_top'] = float(rows[0] / height) if rows.size else 1.0
+    _, _, stats, _ = cv2.connectedComponentsWithStats(head, connectivity=8)
+    metrics['components'] = int((stats[1:, cv2.CC_STAT_AREA] >= thresholds['min_component'] * head.size).sum())
+
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)[subject.astype(bool)]
+    metrics['brightness'] = float(gray.mean())
+    metrics['contrast'] = float(gray.std())
+    return metrics
+
+
+def check_face(image, thresholds=FACE_THRESHOLDS):
+    """
+    头像质量门
+
+    Returns:
+        list: 拒绝原因（REASON_LABELS 的键），空列表表示通过
+    """
+    m = face_metrics(image, thresholds)
+    reasons = []
+    if m['border_white'] < thresholds['min_border_white']:
+        reasons.append('background')
+    if m['subject'] < thresholds['min_subject']:
+        return reasons + ['no_subject']
+    if m['center_offset'] > thresholds['max_center_offset']:
+        reasons.append('off_center')
+    if m['head_top'] < thresholds['min_head_top']:
+        reasons.append('head_cut')
+    if m['components'] > 1:
+        reasons.append('multiple')
+    low, high = thresholds['brightness']
+    if m['brightness'] < low:
+        reasons.append('dark')
+    elif m['brightness'] > high:
+        reasons.append('bright')
+    if m['contrast'] < thresholds['min_contrast']:
+        reasons.append('low_contrast')
+    return reasons
+
+
+def background_metrics(image):
+    """背景质量指标: brightness, contrast, clipped"""
+    gray = cv2.cvtColor(small_rgb(image), cv2.COLOR_RGB2GRAY)
+    return {
+        'brightness': float(gray.mean()),
+        'contrast': float(gray.std()),
+        'clipped': float(((gray < 8) | (gray > 247)).mean()),
+    }
+
+
+def check_background(image, thresholds=BACKGROUND_THRESHOLDS):
+    """
+    背景质量门
+
+    Returns:
+        list: 拒绝原因，空列表表示通过
+    """
+    m = background_metrics(image)
+    reasons = []
+    low, high = thresholds['brightness']
+    if m['brightness'] < low:
+        reasons.append('dark')
+    elif m['brightness'] > high:
+        reasons.append('bright')
+    if m['contrast'] < thresholds['min_contrast']:
+        reasons.append('low_contrast')
+    if m['clipped'] > thresholds['max_clipped']:
+        reasons.append('clipped')
+    return reasons
+
+
+class GateStats:
+    """质量门的通过/拒绝计数"""
+
+    def __init__(self):
+        self.checked = 0
+        self.accepted = 0
+        self.reasons = Counter()
+
+    def record(self, reasons):
+        self.checked += 1
+        if reasons:
+            self.reasons.update(reasons)
+        else:
+            self.accepted += 1
+
+    @property
+    def accept_rate(self):
+        return self.accepted / self.checked if self.checked else 0.0
+
+    def summary(self):
+        """一行摘要：通过率和各拒绝原因的次数"""
+        line = f"通过 {self.accepted}/{self.checked}（{self.accept_rate * 100:.1f}%）"
+        if self.reasons:
+            line += "，拒绝原因: " + "，".join(f"{REASON_LABELS.get(reason, reason)} {count}"
+                                            for reason, count in self.reasons.most_common())
+        return line
+
+
+def describe(reasons):
+    return "、".join(REASON_LABELS.get(reason, reason) for reason in reasons)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计已有头像/背景的质量门通过率")
+    parser.add_argument("kind", choices=["faces", "backgrounds"])
+    parser.add_argument("directory")
+    parser.add_argument("--verbose", action="store_true", help="打印每张被拒绝的图片")
+    args = parser.parse_args()
+
+    check = check_face if args.kind == "faces" else check_background
+    stats = GateStats()
+    for root, _, files in os.walk(args.directory):
+        for name in sorted(files):
+            if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                continue
+            path = os.path.join(root, name)
+            image = image_io.read_image(path)
+            if image is None:
+                continue
+            reasons = check(image[..., ::-1])
+            stats.record(reasons)
+            if reasons and args.verbose:
+                print(f"  ❌ {path}: {describe(reasons)}")
+    print(f"🔍 {args.directory}: {stats.summary()}")
+
+
+if __name__ == "__main__":
+    main()
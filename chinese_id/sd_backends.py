@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stable Diffusion 生成后端
+sd_server 和各生成脚本通过统一的后端接口出图:
+    - DiffusersBackend: diffusers StableDiffusionPipeline，按模型 ID 加载一次后常驻（CUDA 半精度 + 注意力/VAE 切片，
+      CPU 单精度），与原来各脚本的加载方式相同
+    - StubBackend: 不需要权重的桩模型，按提示词和种子生成确定性的合成图片，用于测试排队、批处理和缓存逻辑
+
+文本编码结果（prompt_embeds）按 (模型, 提示词) 缓存在内存和磁盘上（PromptEmbeddingCache），
+同一提示词只过一次文本编码器，之后直接把 prompt_embeds / negative_prompt_embeds 交给管道。
+磁盘目录由环境变量 ICDATASET_SD_EMBED_CACHE 指定（默认 ~/.cache/icdataset/prompt_embeds，设为 off 时只缓存在内存）。
+
+后端接口:
+    backend.load(model_id)                                   预热（加载模型）
+    backend.generate(model_id, items, params) -> [图片]      items 为 [GenerationItem, ...]，同一批次共用 params
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_MODEL = "runwayml/stable-diffusion-v1-5"
+
+
+def default_embed_cache_dir():
+    """环境变量 ICDATASET_SD_EMBED_CACHE，否则 ~/.cache/icdataset/prompt_embeds；off 时返回 None（不写磁盘）"""
+    value = os.environ.get("ICDATASET_SD_EMBED_CACHE")
+    if value:
+        return None if value.lower() == "off" else value
+    return os.path.join(os.path.expanduser("~"), ".cache", "icdataset", "prompt_embeds")
+
+
+@dataclass(frozen=True)
+class GenerationParams:
+    """同一批次内必须相同的生成参数"""
+    width: int = 512
+    height: int = 512
+    num_inference_steps: int = 20
+    guidance_scale: float = 7.5
+
+
+@dataclass(frozen=True)
+class GenerationItem:
+    """批次中的一张图片：提示词和随机种子（种子决定初始噪声，与批次组成无关）"""
+    prompt: str
+    negative_prompt: str = ""
+    seed: int = 0
+
+
+class PromptEmbeddingCache:
+    """
+    提示词编码缓存：内存中 LRU，指定目录时同时写入磁盘，进程重启后仍然有效
+
+    Args:
+        encode: encode(model_id, text) -> 编码结果
+        save / load: 磁盘读写函数 save(value, path) / load(path)
+        cache_dir: 磁盘缓存目录，None 不写磁盘
+        max_items: 内存中最多保留的编码数
+        suffix: 磁盘文件扩展名
+        variant: 附加到键里的区分信息（例如数据类型），同一目录可以被不同精度的进程共用
+    """
+
+    def __init__(self, encode, save, load, cache_dir=None, max_items=64, suffix=".pt", variant=""):
+        self.encode = encode
+        self.save = save
+        self.load = load
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.suffix = suffix
+        self.variant = variant
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "encode_seconds": 0.0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, model_id, text):
+        spec = f"{model_id}\0{self.variant}\0{text}".encode("utf-8")
+        return hashlib.blake2b(spec, digest_size=16).hexdigest()
+
+    def get(self, model_id, text):
+        key = self.key(model_id, text)
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+                self.stats["hits"] += 1
+                return value
+
+        value = None
+        path = os.path.join(self.cache_dir, key + self.suffix) if self.cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                value = self.load(path)
+                self.stats["disk_hits"] += 1
+            except Exception:
+                # 损坏的文件，重新编码覆盖
+                value = None
+        if value is None:
+            start = time.perf_counter()
+            value = self.encode(model_id, text)
+            self.stats["encode_seconds"] += time.perf_counter() - start
+            self.stats["misses"] += 1
+            if path:
+                # 临时文件保留扩展名（np.save 会自动补 .npy）
+                tmp_path = os.path.join(self.cache_dir, f"{key}.{os.getpid()}.tmp{self.suffix}")
+                self.save(value, tmp_path)
+                os.replace(tmp_path, path)
+
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+        return value
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, encode_seconds=round(self.stats["encode_seconds"], 3), cached=len(self.items))
+
+
+class DiffusersBackend:
+    """
+    diffusers 后端，每个模型 ID 只加载一次
+
+    Args:
+        device: "cuda" / "cpu"，None 时自动选择
+        embed_cache_dir: 提示词编码的磁盘缓存目录，默认 default_embed_cache_dir()
+    """
+
+    name = "diffusers"
+
+    def __init__(self, device=None, embed_cache_dir=None):
+        import torch
+
+        self.torch = torch
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.dtype = torch.float16 if self.device == "cuda" else torch.float32
+        # 设备和精度不同时同一种子的生成结果也不同，结果缓存按它区分
+        self.variant = f"{self.device}/{self.dtype}"
+        self.pipelines = {}
+        # 服务中客户端的 load 请求和调度线程可能同时加载同一个新模型
+        self.load_lock = threading.Lock()
+        self.embeds = PromptEmbeddingCache(
+            self._encode,
+            save=lambda value, path: torch.save(value.cpu(), path),
+            load=lambda path: torch.load(path, map_location=self.device).to(self.dtype),
+            cache_dir=embed_cache_dir or default_embed_cache_dir(),
+            variant=str(self.dtype),
+        )
+
+    def load(self, model_id=DEFAULT_MODEL):
+        pipeline = self.pipelines.get(model_id)
+        if pipeline is not None:
+            return pipeline
+        with self.load_lock:
+            pipeline = self.pipelines.get(model_id)
+            if pipeline is None:
+                pipeline = self._load_pipeline(model_id)
+                self.pipelines[model_id] = pipeline
+        return pipeline
+
+    def _load_pipeline(self, model_id):
+        from diffusers import DPMSolverMultistepScheduler, StableDiffusionPipeline
+
+        torch = self.torch
+        start = time.perf_counter()
+        scheduler = DPMSolverMultistepScheduler.from_pretrained(model_id, subfolder="scheduler")
+        pipeline = StableDiffusionPipeline.from_pretrained(
+            model_id,
+            scheduler=scheduler,
+            torch_dtype=self.dtype,
+            safety_checker=None,
+            requires_safety_checker=False,
+        )
+        pipeline = pipeline.to(self.device)
+        if self.device == "cuda":
+            pipeline.enable_attention_slicing()
+            pipeline.enable_vae_slicing()
+        pipeline.set_progress_bar_config(disable=True)
+        print(f"✅ 模型 {model_id} 加载完成（{self.device}，{time.perf_counter() - start:.1f}s）")
+        return pipeline
+
+    def _encode(self, model_id, text):
+        """
+        单个提示词的文本编码，形状 (1, 77, hidden)
+
+        与管道内部编码相同：截断/补齐到 77 个 token；负面提示词（包括空字符串）的无条件编码
+        也是同样的补齐方式，所以正负提示词共用一个缓存
+        """
+        pipeline = self.load(model_id)
+        with self.torch.no_grad():
+            prompt_embeds, _ = pipeline.encode_prompt(text, self.device, 1, False)
+        return prompt_embeds
+
+    def generate(self, model_id, items: List[GenerationItem], params: GenerationParams) -> List[Image.Image]:
+        pipeline = self.load(model_id)
+        torch = self.torch
+        # 每张图片一个独立的随机数生成器：同一种子在任何批次组合下得到相同的初始噪声
+        generators = [torch.Generator(device=self.device).manual_seed(item.seed) for item in items]
+        # 批次内重复的提示词和跨调用重复的提示词都只编码一次
+        prompt_embeds = torch.cat([self.embeds.get(model_id, item.prompt) for item in items])
+        negative_embeds = torch.cat([self.embeds.get(model_id, item.negative_prompt) for item in items])
+        with torch.no_grad():
+            return pipeline(
+                prompt_embeds=prompt_embeds,
+                negative_prompt_embeds=negative_embeds,
+                width=params.width,
+                height=params.height,
+                num_inference_steps=params.num_inference_steps,
+                guidance_scale=params.guidance_scale,
+                num_images_per_prompt=1,
+                generator=generators,
+            ).images
+
+
+class StubBackend:
+    """
+    桩模型：不加载权重，按 (提示词, 种子) 生成确定性的渐变加噪声图片
+
+    Args:
+        load_seconds: 模拟模型加载耗时
+        batch_seconds / image_seconds: 模拟每次调用的固定耗时和每张图片的耗时（每个推理步），
+            用来观察批处理摊薄固定开销的效果
+    """
+
+    name = "stub"
+    variant = ""
+
+    def __init__(self, load_seconds=0.0, batch_seconds=0.0, image_seconds=0.0, encode_seconds=0.0,
+                 embed_cache_dir=None):
+        self.load_seconds = load_seconds
+        self.batch_seconds = batch_seconds
+        self.image_seconds = image_seconds
+        self.encode_seconds = encode_seconds
+        self.loaded = set()
+        self.load_lock = threading.Lock()
+        self.loads = []
+        self.calls = []
+        self.embeds = PromptEmbeddingCache(
+            self._encode,
+            save=lambda value, path: np.save(path, value),
+            load=np.load,
+            cache_dir=embed_cache_dir,
+            suffix=".npy",
+        )
+
+    def _encode(self, model_id, text):
+        """桩模型的"文本编码"：由模型和提示词决定的颜色"""
+        time.sleep(self.encode_seconds)
+        key = f"{model_id}\0{text}".encode("utf-8")
+        return np.frombuffer(hashlib.blake2b(key, digest_size=3).digest(), dtype=np.uint8).astype(np.float32)
+
+    def load(self, model_id=DEFAULT_MODEL):
+        with self.load_lock:
+            if model_id not in self.loaded:
+                time.sleep(self.load_seconds)
+                self.loads.append(model_id)
+                self.loaded.add(model_id)
+
+    def generate(self, model_id, items: List[GenerationItem], params: GenerationParams) -> List[Image.Image]:
+        self.load(model_id)
+        self.calls.append((model_id, len(items), params))
+        time.sleep(params.num_inference_steps * (self.batch_seconds + self.image_seconds * len(items)))
+        return [stub_image(self.embeds.get(model_id, item.prompt), self.embeds.get(model_id, item.negative_prompt),
+                           item, params) for item in items]
+
+
+def stub_image(prompt_embed, negative_embed, item: GenerationItem, params: GenerationParams) -> Image.Image:
+    """桩模型的输出：颜色由正负提示词的"编码"决定，噪声由种子决定"""
+    color = (prompt_embed * 3 + negative_embed) / 4
+    rng = np.random.default_rng(item.seed)
+    gradient = np.linspace(0.6, 1.0, params.width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 12, size=(params.height, params.width, 3)).astype(np.float32)
+    return Image.fromarray(np.clip(color * gradient + noise, 0, 255).astype(np.uint8))
+
+
+BACKENDS = {
+    "diffusers": DiffusersBackend,
+    "stub": StubBackend,
+}
+
+
+def create_backend(name="diffusers", **kwargs):
+    """按名称创建后端"""
+    try:
+        return BACKENDS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"未知的生成后端: {name}（可选 {', '.join(BACKENDS)}）") from None
+
+
+def random_seed(rng: Optional[np.random.Generator] = None) -> int:
+    """未指定种子时使用的随机种子（记录下来即可复现）"""
+    return int((rng or np.random.default_rng()).integers(0, 2 ** 31 - 1))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stable Diffusion 批量出图
+头像和背景脚本原来每次管道调用只生成一张图片（num_images_per_prompt=1，Python 循环 20 次或 count 次），
+这里把图片按批次送进管道:
+    - 批次大小按可用内存自动选择（每张图片的激活内存按像素数估算），也可以手动指定
+    - 每张图片一个独立种子，记录在输出目录的 .sd_seeds.json 中，按种子可以单独复现任意一张
+    - 生成和后处理/保存是流水线的两个阶段（stage_pipeline），第 k 批在工作线程里后处理、保存时
+      模型已经在生成第 k+1 批
+    - 可选的质量门（quality_gate）在生成阶段检查原始输出，不合格的图片不进入后处理，
+      换新种子重新生成，每张最多重试 retries 次
+
+    results, failed = generate_batched(generator, jobs, save, width=1024, height=768, seed_log_dir=output_dir)
+"""
+
+import json
+import os
+import threading
+
+from quality_gate import GateStats, describe
+from sd_backends import random_seed
+from stage_pipeline import Stage, StagePipeline
+
+# 每张图片按像素估算的推理内存（float32，含无分类器引导的双份 UNet 激活和 VAE 解码）：
+# 512x512 约 2GB，1024x768 约 6GB
+IMAGE_BYTES_PER_PIXEL = 8 * 1024
+
+# 批次最多使用当前可用内存的比例
+MEMORY_FRACTION = 0.7
+
+# 自动批次大小的上限（再大 CPU 上的矩阵乘法效率也不再提高）
+MAX_BATCH = 8
+
+# 输出目录中的种子记录
+SEED_LOG = '.sd_seeds.json'
+
+
+def available_memory():
+    """
+    当前可用物理内存字节数，无法获取时返回 None
+
+    优先使用 psutil，其次 /proc/meminfo 的 MemAvailable，最后 sysconf 的空闲页数
+    """
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def auto_batch_size(width, height, max_batch=MAX_BATCH, available=None):
+    """
+    按可用内存选择批次大小
+
+    Args:
+        width, height: 生成尺寸
+        max_batch: 上限
+        available: 可用内存字节数，None 时读取当前值
+
+    Returns:
+        int: 1 到 max_batch 之间的批次大小
+    """
+    available = available_memory() if available is None else available
+    if not available:
+        return 1
+    per_image = width * height * IMAGE_BYTES_PER_PIXEL
+    return max(1, min(max_batch, int(available * MEMORY_FRACTION // per_image)))
+
+
+def load_seed_log(output_dir):
+    """读取输出目录下的种子记录，不存在或损坏时返回空字典"""
+    try:
+        with open(os.path.join(output_dir, SEED_LOG), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_atomic_json(path, data):
+    """先写临时文件再替换，中断时不会留下半个文件"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def save_seed_log(output_dir, log):
+    save_atomic_json(os.path.join(output_dir, SEED_LOG), log)
+
+
+def generate_batched(generator, jobs, save, batch_size=None, width=512, height=512, num_inference_steps=20,
+                     guidance_scale=7.5, seed_log_dir=None, gate=None, retries=2, summary=True, logger=None):
+    """
+    分批生成并保存图片，生成下一批的同时在工作线程里后处理、保存上一批
+
+    Args:
+        generator: sd_server.get_generator() 返回的生成器
+        jobs: [(名称, 提示词, 负面提示词), ...]，也可以是 (名称, 提示词, 负面提示词, 种子) 复现指定图片
+        save: save(名称, 图片, 种子) -> 保存路径；返回 None 表示该图片未保存（计为失败）
+        batch_size: 每次管道调用的图片数，None 时按可用内存自动选择
+        seed_log_dir: 种子记录写入的目录（通常为输出目录），None 不记录
+        gate: 质量门 gate(图片) -> 拒绝原因列表（例如 quality_gate.check_face），None 不检查
+        retries: 被质量门拒绝后每张图片最多重新生成的次数
+        summary: 结束时打印批次大小和各阶段吞吐量
+        logger: 调用方的日志记录器，指定时质量门的拒绝记录和通过率写入该日志，否则打印
+
+    Returns:
+        tuple: ([{'name', 'seed', 'path'}, ...], 失败数)
+    """
+    batch_size = batch_size or auto_batch_size(width, height)
+    jobs = [tuple(job) if len(job) == 4 else (*job, random_seed()) for job in jobs]
+
+    seed_log = load_seed_log(seed_log_dir) if seed_log_dir else None
+    log_lock = threading.Lock()
+    gate_stats = GateStats()
+    results = []
+    rejected = []
+
+    def report(level, icon, message):
+        if logger is not None:
+            getattr(logger, level)(message)
+        else:
+            print(f"{icon} {message}")
+
+    def generate_stage(batch):
+        images = generator.generate_many([(prompt, negative_prompt, seed) for _, prompt, negative_prompt, seed in batch],
+                                         width, height, num_inference_steps, guidance_scale)
+        for (name, prompt, negative_prompt, _), (image, seed) in zip(batch, images):
+            if gate is not None:
+                reasons = gate(image)
+                gate_stats.record(reasons)
+                if reasons:
+                    report("warning", "⚠️ ", f"质量门拒绝 {name}（{describe(reasons)}，种子 {seed}）")
+                    rejected.append((name, prompt, negative_prompt))
+                    continue
+            yield name, prompt, negative_prompt, image, seed
+
+    def save_stage(entry):
+        name, prompt, negative_prompt, image, seed = entry
+        path = save(name, image, seed)
+        if path is None:
+            return
+        record = {'name': name, 'seed': seed, 'path': path}
+        if seed_log is not None:
+            with log_lock:
+                seed_log[os.path.basename(path)] = {
+                    'seed': seed,
+                    'prompt': prompt,
+                    'negative_prompt': negative_prompt,
+                    'model': generator.model_id,
+                    'width': width,
+                    'height': height,
+                    'num_inference_steps': num_inference_steps,
+                    'guidance_scale': guidance_scale,
+                }
+                # 每保存一批刷新一次，中断时已保存图片的种子不会丢失
+                if len(seed_log) % batch_size == 0:
+                    save_seed_log(seed_log_dir, seed_log)
+        yield record
+
+    pending = jobs
+    for attempt in range(retries + 1):
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+        # 队列容量为一个批次：生成阶段交出第 k 批后立即开始第 k+1 批，保存跟不上时生成阶段阻塞，内存有界
+        pipeline = StagePipeline([
+            Stage("generate", generate_stage),
+            Stage("save", save_stage),
+        ], queue_size=batch_size)
+        for record in pipeline.run(batches):
+            results.append(record)
+
+        if summary:
+            title = f"第 {attempt} 轮重新生成，" if attempt else ""
+            print(f"\n📦 {title}批次大小 {batch_size}（{len(batches)} 批，{len(pending)} 张）")
+            pipeline.print_summary()
+        if not rejected or attempt == retries:
+            break
+        # 被拒绝的图片换新种子重新生成
+        pending = [(*job, random_seed()) for job in rejected]
+        rejected.clear()
+
+    if seed_log is not None:
+        save_seed_log(seed_log_dir, seed_log)
+    if gate is not None:
+        report("info", "🔍", f"质量门: {gate_stats.summary()}")
+        if rejected:
+            report("warning", "⚠️ ", f"{len(rejected)} 张重试 {retries} 次后仍未通过质量门")
+    return results, len(jobs) - len(results)
@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻的 Stable Diffusion 生成服务
+模型加载一次后常驻内存，各生成脚本（face_gen_advanced、generate_backgrounds 及其各类别入口）
+通过 Unix 套接字（Windows 上为 localhost 端口）提交提示词:
+    - 所有连接的请求进入同一个队列，模型、尺寸、步数、引导系数相同的图片合并成一个批次推理
+    - 结果按 (模型, 提示词, 负面提示词, 种子, 生成参数) 缓存在内存中（可选同时写入磁盘目录）
+    - 提示词的文本编码由后端按 (模型, 提示词) 缓存，服务常驻时所有脚本共用
+    - 后端可替换（sd_backends），stub 后端不需要权重，可以单独测试排队、批处理和缓存
+
+脚本通过 get_generator() 取生成器：服务在运行时提交到服务，否则在本进程加载模型（与原来的行为相同）。
+
+    python sd_server.py serve                                    # 默认地址，diffusers 后端，预加载默认模型
+    python sd_server.py serve --backend stub --max-batch 8       # 桩模型
+    python sd_server.py generate --prompt "wooden desk" --count 2 --output out/
+    python sd_server.py stats
+    python sd_server.py shutdown
+
+地址由环境变量 ICDATASET_SD_SERVER 指定（套接字路径或 host:port），设为 off 时脚本不连接服务。
+连接消息会被反序列化（pickle），所以:
+    - 认证密钥在第一次 serve 时随机生成，保存在只有当前用户可读的文件中（默认 ~/.cache/icdataset/sd_server.key，
+      环境变量 ICDATASET_SD_AUTHKEY_FILE 指定），客户端从同一文件读取
+    - 服务只监听本机地址（Unix 套接字或回环地址），监听其他地址需要显式指定 --allow-remote
+"""
+
+import argparse
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from PIL import Image
+
+import sd_backends
+from sd_backends import DEFAULT_MODEL, GenerationItem, GenerationParams, random_seed
+
+AUTHKEY_FILE = os.environ.get("ICDATASET_SD_AUTHKEY_FILE",
+                              os.path.join(os.path.expanduser("~"), ".cache", "icdataset", "sd_server.key"))
+
+
+def read_authkey(path=None):
+    """
+    读取认证密钥
+
+    Raises:
+        FileNotFoundError: 密钥文件不存在（服务从未启动过）
+    """
+    with open(path or AUTHKEY_FILE, "rb") as f:
+        return f.read().strip()
+
+
+def ensure_authkey(path=None):
+    """读取认证密钥，不存在时随机生成并写入只有当前用户可读写的文件（0600）"""
+    path = path or AUTHKEY_FILE
+    try:
+        key = read_authkey(path)
+    except FileNotFoundError:
+        key = b""
+    if len(key) < 32:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        key = os.urandom(32).hex().encode("ascii")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        os.replace(tmp_path, path)
+    # 已有的密钥文件也收紧权限（Windows 上 chmod 只影响只读位）
+    os.chmod(path, 0o600)
+    return key
+
+
+def is_local_address(address):
+    """Unix 套接字或主机名只解析到回环地址时为本机地址"""
+    if isinstance(address, str):
+        return True
+    try:
+        infos = socket.getaddrinfo(address[0], None)
+    except socket.gaierror:
+        return False
+    return bool(infos) and all(ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos)
+
+
+def default_address():
+    """环境变量 ICDATASET_SD_SERVER，否则 POSIX 上为临时目录下的套接字，Windows 上为 localhost:8765"""
+    value = os.environ.get("ICDATASET_SD_SERVER")
+    if value:
+        return parse_address(value)
+    if sys.platform == "win32":
+        return ("127.0.0.1", 8765)
+    return os.path.join(tempfile.gettempdir(), "icdataset_sd.sock")
+
+
+def parse_address(value):
+    """'host:port' -> (host, port)，其他视为 Unix 套接字路径"""
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit() and os.sep not in host:
+        return (host or "127.0.0.1", int(port))
+    return value
+
+
+def format_address(address):
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+
+
+def image_to_message(image):
+    """图片以原始像素传输（本机通信，不做 PNG 编解码）"""
+    return {"mode": image.mode, "size": image.size, "data": image.tobytes()}
+
+
+def image_from_message(message):
+    return Image.frombytes(message["mode"], tuple(message["size"]), message["data"])
+
+
+class ResultCache:
+    """
+    生成结果缓存：内存中 LRU，指定目录时同时按键名写入 PNG
+
+    Args:
+        max_items: 内存中最多保留的图片数
+        cache_dir: 磁盘缓存目录，None 不写磁盘
+    """
+
+    def __init__(self, max_items=256, cache_dir=None):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(backend, model_id, item, params):
+        """缓存键：后端名称和变体（设备/精度）、模型、提示词、种子和生成参数"""
+        spec = [backend.name, getattr(backend, "variant", ""), model_id, item.prompt, item.negative_prompt, item.seed, params.width, params.height,
+                params.num_inference_steps, params.guidance_scale]
+        return hashlib.blake2b(json.dumps(spec).encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            image = self.items.get(key)
+            if image is not None:
+                self.items.move_to_end(key)
+                return image
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + ".png")
+            if os.path.exists(path):
+                image = Image.open(path)
+                image.load()
+                self._remember(key, image)
+                return image
+        return None
+
+    def put(self, key, image):
+        self._remember(key, image)
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + ".png")
+            tmp_path = path + ".tmp"
+            image.save(tmp_path, "PNG")
+            os.replace(tmp_path, path)
+
+    def _remember(self, key, image):
+        if not self.max_items:
+            return
+        with self.lock:
+            self.items[key] = image
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+
+class _Unit:
+    """队列中的一张待生成图片"""
+
+    __slots__ = ("model_id", "item", "params", "cache_key", "image", "error", "done", "enqueued")
+
+    def __init__(self, model_id, item, params, cache_key):
+        self.model_id = model_id
+        self.item = item
+        self.params = params
+        self.cache_key = cache_key
+        self.image = None
+        self.error = None
+        self.done = threading.Event()
+        self.enqueued = time.perf_counter()
+
+
+class GenerationScheduler:
+    """
+    生成队列：一个工作线程按到达顺序取图片，把相同 (模型, 生成参数) 的图片合并成批次交给后端
+
+    Args:
+        backend: sd_backends 中的后端实例
+        max_batch: 每个批次最多的图片数
+        batch_wait: 取到第一张图片后最多再等待的秒数，用于凑满批次
+        cache: ResultCache，None 不缓存
+    """
+
+    def __init__(self, backend, max_batch=4, batch_wait=0.05, cache=None):
+        self.backend = backend
+        self.max_batch = max(1, max_batch)
+        self.batch_wait = batch_wait
+        self.cache = cache
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.stats = {"requests": 0, "images": 0, "cache_hits": 0, "batches": 0, "batched_images": 0,
+                      "failed": 0, "generate_seconds": 0.0, "queue_wait_seconds": 0.0}
+        self.thread = threading.Thread(target=self._run, name="sd-scheduler", daemon=True)
+        self.thread.start()
+
+    def submit(self, model_id, items, params):
+        """
+        提交一个请求并等待结果
+
+        Returns:
+            list: 与 items 一一对应的 PIL 图片
+        """
+        units = []
+        results = [None] * len(items)
+        for index, item in enumerate(items):
+            key = ResultCache.key(self.backend, model_id, item, params)
+            image = self.cache.get(key) if self.cache else None
+            if image is not None:
+                results[index] = image
+                continue
+            units.append((index, _Unit(model_id, item, params, key)))
+
+        with self.condition:
+            if not self.running:
+                raise RuntimeError("生成服务正在停止")
+            self.stats["requests"] += 1
+            self.stats["images"] += len(items)
+            self.stats["cache_hits"] += len(items) - len(units)
+            self.queue.extend(unit for _, unit in units)
+            self.condition.notify()
+
+        for index, unit in units:
+            unit.done.wait()
+            if unit.error is not None:
+                raise RuntimeError(unit.error)
+            results[index] = unit.image
+        return results
+
+    def _next_batch(self):
+        """取队首图片，再在 batch_wait 内收集 (模型, 参数) 相同的图片，其他图片保持原顺序"""
+        with self.condition:
+            while self.running and not self.queue:
+                self.condition.wait()
+            if not self.running:
+                return None
+            first = self.queue.popleft()
+            batch = [first]
+            deadline = time.perf_counter() + self.batch_wait
+            while len(batch) < self.max_batch:
+                for unit in list(self.queue):
+                    if unit.model_id == first.model_id and unit.params == first.params:
+                        self.queue.remove(unit)
+                        batch.append(unit)
+                        if len(batch) == self.max_batch:
+                            break
+                remaining = deadline - time.perf_counter()
+                if len(batch) == self.max_batch or remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            try:
+                images = self.backend.generate(batch[0].model_id, [unit.item for unit in batch], batch[0].params)
+            except Exception as e:
+                for unit in batch:
+                    unit.error = f"生成失败: {e}"
+                    unit.done.set()
+                with self.condition:
+                    self.stats["failed"] += len(batch)
+                continue
+            elapsed = time.perf_counter() - start
+            for unit, image in zip(batch, images):
+                if self.cache:
+                    self.cache.put(unit.cache_key, image)
+                unit.image = image
+                unit.done.set()
+            with self.condition:
+                self.stats["batches"] += 1
+                self.stats["batched_images"] += len(batch)
+                self.stats["generate_seconds"] += elapsed
+                self.stats["queue_wait_seconds"] += sum(start - unit.enqueued for unit in batch)
+
+    def snapshot(self):
+        with self.condition:
+            stats = dict(self.stats, queued=len(self.queue))
+        stats["mean_batch"] = round(stats["batched_images"] / stats["batches"], 2) if stats["batches"] else 0.0
+        embeds = getattr(self.backend, "embeds", None)
+        if embeds is not None:
+            stats["prompt_embeds"] = embeds.snapshot()
+        return stats
+
+    def close(self):
+        """停止调度线程（正在生成的批次会完成），队列中尚未开始的图片以错误结束，等待它们的连接不会一直阻塞"""
+        with self.condition:
+            self.running = False
+            pending = list(self.queue)
+            self.queue.clear()
+            self.stats["failed"] += len(pending)
+            self.condition.notify_all()
+        for unit in pending:
+            unit.error = "生成服务已停止"
+            unit.done.set()
+        self.thread.join()
+
+
+class GenerationServer:
+    """
+    生成服务：监听地址，每个连接一个线程，请求交给共享的 GenerationScheduler
+
+    Args:
+        backend: 后端实例
+        address: Unix 套接字路径或 (host, port)
+        preload: 启动时预加载的模型 ID 列表
+        authkey: 认证密钥，None 时读取（不存在时生成）AUTHKEY_FILE
+        allow_remote: 允许监听非回环地址
+    """
+
+    def __init__(self, backend, address=None, max_batch=4, batch_wait=0.05, cache_size=256, cache_dir=None,
+                 preload=(DEFAULT_MODEL,), authkey=None, allow_remote=False):
+        self.backend = backend
+        self.address = address or default_address()
+        if not allow_remote and not is_local_address(self.address):
+            raise ValueError(f"拒绝监听非本机地址 {format_address(self.address)}（确实需要时使用 --allow-remote，"
+                             f"并把密钥文件复制到客户端）")
+        self.authkey = authkey if authkey is not None else ensure_authkey()
+        self.preload = list(preload)
+        self.scheduler = GenerationScheduler(backend, max_batch, batch_wait, ResultCache(cache_size, cache_dir))
+        self.listener = None
+        self.stopping = threading.Event()
+        self.started = time.time()
+
+    def serve_forever(self):
+        for model_id in self.preload:
+            print(f"📥 预加载模型 {model_id} ...")
+            self.backend.load(model_id)
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            # 上次异常退出留下的套接字文件
+            if ping(self.address, self.authkey):
+                raise RuntimeError(f"生成服务已在运行: {self.address}")
+            os.unlink(self.address)
+        self.listener = Listener(self.address, authkey=self.authkey)
+        print(f"🚀 生成服务已启动: {format_address(self.address)}（后端 {self.backend.name}，"
+              f"每批最多 {self.scheduler.max_batch} 张）")
+        try:
+            while not self.stopping.is_set():
+                try:
+                    conn = self.listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    # 认证失败、握手中断等单个连接的错误
+                    continue
+                if self.stopping.is_set():
+                    conn.close()
+                    break
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.listener.close()
+            self.scheduler.close()
+            print(f"👋 生成服务已停止，统计: {self.scheduler.snapshot()}")
+
+    def shutdown(self):
+        """停止接受连接（阻塞中的 accept 需要一个连接才能返回，所以自己连一次）"""
+        self.stopping.set()
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except (OSError, EOFError):
+            pass
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = self._dispatch(message)
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                try:
+                    conn.send(response)
+                except OSError:
+                    return
+                if message.get("op") == "shutdown":
+                    self.shutdown()
+                    return
+
+    def _dispatch(self, message):
+        op = message.get("op")
+        if op == "ping":
+            return {"ok": True, "backend": self.backend.name, "uptime": time.time() - self.started}
+        if op == "stats":
+            return {"ok": True, "stats": self.scheduler.snapshot()}
+        if op == "shutdown":
+            return {"ok": True}
+        if op == "load":
+            self.backend.load(message["model_id"])
+            return {"ok": True}
+        if op == "generate":
+            params = GenerationParams(**message["params"])
+            items = [GenerationItem(**item) for item in message["items"]]
+            images = self.scheduler.submit(message["model_id"], items, params)
+            return {"ok": True, "images": [image_to_message(image) for image in images]}
+        raise ValueError(f"未知操作: {op}")
+
+
+class SDClient:
+    """
+    生成服务客户端（一个连接，线程安全）
+
+    Args:
+        address: 服务地址，None 为 default_address()
+        authkey: 认证密钥，None 时读取 AUTHKEY_FILE（不存在时抛出 FileNotFoundError）
+    """
+
+    def __init__(self, address=None, authkey=None):
+        self.address = address or default_address()
+        self.conn = Client(self.address, authkey=authkey if authkey is not None else read_authkey())
+        self.lock = threading.Lock()
+
+    def request(self, message):
+        with self.lock:
+            self.conn.send(message)
+            response = self.conn.recv()
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "生成服务返回错误"))
+        return response
+
+    def generate(self, model_id, items, params):
+        response = self.request({"op": "generate", "model_id": model_id, "params": params.__dict__,
+                                 "items": [item.__dict__ for item in items]})
+        return [image_from_message(image) for image in response["images"]]
+
+    def load(self, model_id):
+        self.request({"op": "load", "model_id": model_id})
+
+    def stats(self):
+        return self.request({"op": "stats"})["stats"]
+
+    def shutdown(self):
+        self.request({"op": "shutdown"})
+
+    def close(self):
+        self.conn.close()
+
+
+def ping(address=None, authkey=None):
+    """服务是否在运行"""
+    try:
+        client = SDClient(address, authkey)
+    except (OSError, EOFError, AuthenticationError):
+        # 包括密钥文件不存在、密钥与服务不一致
+        return False
+    try:
+        return bool(client.request({"op": "ping"}).get("ok"))
+    except (OSError, EOFError, RuntimeError):
+        return False
+    finally:
+        client.close()
+
+
+class Generator:
+    """
+    生成脚本使用的生成器：把 (提示词, 数量, 种子) 展开成 GenerationItem 交给服务或本进程后端
+
+    Args:
+        target: SDClient 或后端实例（两者都有 load/generate 接口）
+        model_id: 模型 ID
+        description: 打印用的说明（设备或服务地址）
+    """
+
+    def __init__(self, target, model_id=DEFAULT_MODEL, description=""):
+        self.target = target
+        self.model_id = model_id
+        self.description = description
+        self.target.load(model_id)
+
+    def generate(self, prompt, negative_prompt="", count=1, seeds=None, width=512, height=512,
+                 num_inference_steps=20, guidance_scale=7.5):
+        """
+        生成 count 张图片（seeds 指定时数量为 len(seeds)）
+
+        Returns:
+            list: [(PIL 图片, 种子), ...]
+        """
+        seeds = list(seeds) if seeds is not None else [random_seed() for _ in range(count)]
+        return self.generate_many([(prompt, negative_prompt, seed) for seed in seeds], width, height,
+                                  num_inference_steps, guidance_scale)
+
+    def generate_many(self, requests, width=512, height=512, num_inference_steps=20, guidance_scale=7.5):
+        """
+        一次调用生成多张提示词可以不同的图片（同一批次的初始噪声一起送进管道）
+
+        Args:
+            requests: [(提示词, 负面提示词, 种子), ...]
+
+        Returns:
+            list: [(PIL 图片, 种子), ...]
+        """
+        params = GenerationParams(width, height, num_inference_steps, guidance_scale)
+        items = [GenerationItem(prompt, negative_prompt, seed) for prompt, negative_prompt, seed in requests]
+        return list(zip(self.target.generate(self.model_id, items, params), [item.seed for item in items]))
+
+
+def get_generator(model_id=DEFAULT_MODEL, address=None, backend="diffusers"):
+    """
+    取生成器：服务在运行时连接服务（模型已预热），否则在本进程创建后端并加载模型
+
+    Args:
+        address: 服务地址，None 为 default_address()；环境变量 ICDATASET_SD_SERVER=off 时不连接服务
+        backend: 本进程后端名称
+    """
+    if os.environ.get("ICDATASET_SD_SERVER", "").lower() != "off":
+        address = address or default_address()
+        if ping(address):
+            print(f"🔌 使用生成服务: {format_address(address)}")
+            return Generator(SDClient(address), model_id, f"生成服务 {format_address(address)}")
+    local = sd_backends.create_backend(backend)
+    return Generator(local, model_id, getattr(local, "device", backend))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻的 Stable Diffusion 生成服务")
+    parser.add_argument("--address", help="套接字路径或 host:port（默认 ICDATASET_SD_SERVER 或临时目录下的套接字）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="启动服务")
+    serve.add_argument("--backend", choices=list(sd_backends.BACKENDS), default="diffusers")
+    serve.add_argument("--preload", nargs="*", default=[DEFAULT_MODEL], help="启动时加载的模型")
+    serve.add_argument("--max-batch", type=int, default=4, help="每个批次最多的图片数")
+    serve.add_argument("--batch-wait", type=float, default=0.05, help="凑批次的最长等待秒数")
+    serve.add_argument("--cache-size", type=int, default=256, help="内存中缓存的图片数")
+    serve.add_argument("--cache-dir", help="磁盘缓存目录")
+    serve.add_argument("--allow-remote", action="store_true",
+                       help="允许监听非回环地址（任何持有密钥的主机都能在服务进程中执行代码）")
+
+    gen = sub.add_parser("generate", help="提交一次生成请求")
+    gen.add_argument("--prompt", required=True)
+    gen.add_argument("--negative-prompt", default="")
+    gen.add_argument("--model", default=DEFAULT_MODEL)
+    gen.add_argument("--count", type=int, default=1)
+    gen.add_argument("--seeds", type=int, nargs="+")
+    gen.add_argument("--size", default="512x512", metavar="WxH")
+    gen.add_argument("--steps", type=int, default=20)
+    gen.add_argument("--guidance", type=float, default=7.5)
+    gen.add_argument("--output", default=".", help="输出目录")
+
+    sub.add_parser("stats", help="打印服务统计")
+    sub.add_parser("shutdown", help="停止服务")
+    args = parser.parse_args()
+
+    address = parse_address(args.address) if args.address else default_address()
+    if args.command == "serve":
+        try:
+            server = GenerationServer(sd_backends.create_backend(args.backend), address, args.max_batch,
+                                      args.batch_wait, args.cache_size, args.cache_dir, args.preload,
+                                      allow_remote=args.allow_remote)
+        except ValueError as e:
+            parser.error(str(e))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    try:
+        client = SDClient(address)
+    except (OSError, EOFError, AuthenticationError) as e:
+        print(f"❌ 无法连接生成服务: {format_address(address)}（{e}）")
+        sys.exit(1)
+    if args.command == "stats":
+        print(json.dumps(client.stats(), ensure_ascii=False, indent=2))
+    elif args.command == "shutdown":
+        client.shutdown()
+        print("✅ 已请求停止服务")
+    else:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        generator = Generator(client, args.model)
+        os.makedirs(args.output, exist_ok=True)
+        start = time.perf_counter()
+        results = generator.generate(args.prompt, args.negative_prompt, args.count, args.seeds, width, height,
+                                     args.steps, args.guidance)
+        for image, seed in results:
+            path = os.path.join(args.output, f"sd_{seed}.png")
+            image.save(path)
+            print(f"✅ {path}")
+        print(f"⏱️  {len(results)} 张，{time.perf_counter() - start:.1f}s")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
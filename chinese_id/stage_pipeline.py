@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多阶段流水线
+把 读取 → 处理 → 编码 → 写出 这类步骤拆成独立阶段，每个阶段有自己的线程数，
+阶段之间用有界队列连接。读盘、压缩这些会释放 GIL 的操作可以和计算重叠，
+队列有界保证内存占用不会因为某个阶段过快而无限增长。
+
+每个阶段函数接收一个输入，返回可迭代的输出（通常写成生成器）:
+    - yield 一次: 一对一
+    - yield 多次: 扇出（例如一张原图生成多个增强版本）
+    - 不 yield: 丢弃该输入
+阶段函数抛出的异常会被记录并跳过该输入，不会中断整个流水线。
+输入迭代本身抛出的异常会结束输入，已送入的输入处理完后由 run() 重新抛出。
+
+示例:
+    pipeline = StagePipeline([
+        Stage("read", read_func, workers=2),
+        Stage("augment", augment_func, workers=2),
+        Stage("write", write_func, workers=2),
+    ], queue_size=16)
+    for result in pipeline.run(items):
+        ...
+    pipeline.print_summary()
+"""
+
+import queue
+import threading
+import time
+
+# 队列结束标记
+_DONE = object()
+
+
+class Stage:
+    """
+    流水线阶段
+
+    Args:
+        name: 阶段名称（用于统计）
+        func: 阶段函数，func(item) -> 可迭代的输出
+        workers: 该阶段的线程数
+    """
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def _record(self, produced, elapsed, failed):
+        with self._lock:
+            self.items_in += 1
+            self.items_out += produced
+            self.busy += elapsed
+            self.errors += failed
+
+    @property
+    def wall(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def stats(self):
+        """返回阶段统计字典"""
+        wall = self.wall
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy, 3),
+            "wall_seconds": round(wall, 3),
+            "items_per_sec": round(self.items_in / wall, 2) if wall else 0.0,
+            # 线程忙碌比例，接近 1 说明该阶段是瓶颈，可以加线程
+            "utilization": round(self.busy / (wall * self.workers), 3) if wall else 0.0,
+        }
+
+
+class StagePipeline:
+    """
+    有界队列连接的多阶段线程流水线
+
+    Args:
+        stages: Stage 列表，按执行顺序排列
+        queue_size: 每个阶段输入队列的容量
+    """
+
+    def __init__(self, stages, queue_size=8):
+        self.stages = list(stages)
+        self.queue_size = queue_size
+
+    def _worker(self, index, in_queue, out_queue, remaining):
+        stage = self.stages[index]
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            produced = 0
+            failed = 0
+            blocked = 0.0
+            try:
+                for output in stage.func(item):
+                    # 下游队列满时阻塞，这段等待不计入本阶段的忙碌时间
+                    put_start = time.perf_counter()
+                    out_queue.put(output)
+                    blocked += time.perf_counter() - put_start
+                    produced += 1
+            except Exception as e:
+                failed = 1
+                print(f"      ❌ [{stage.name}] {e}")
+            stage._record(produced, time.perf_counter() - start - blocked, failed)
+
+        # 本阶段最后一个线程退出时，通知下游所有线程结束
+        with stage._lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last:
+            stage.finished = time.perf_counter()
+            downstream = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+            for _ in range(downstream):
+                out_queue.put(_DONE)
+
+    def run(self, items):
+        """
+        运行流水线，按完成顺序产出最后一个阶段的输出
+
+        Args:
+            items: 第一个阶段的输入（任意可迭代对象，惰性消费）
+        """
+        queues = [queue.Queue(self.queue_size) for _ in self.stages]
+        queues.append(queue.Queue(self.queue_size))
+        remaining = [stage.workers for stage in self.stages]
+
+        threads = []
+        now = time.perf_counter()
+        for index, stage in enumerate(self.stages):
+            stage.started = now
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._worker, name=f"{stage.name}-{n}", daemon=True,
+                                          args=(index, queues[index], queues[index + 1], remaining))
+                thread.start()
+                threads.append(thread)
+
+        feed_error = []
+
+        def feed():
+            # 输入迭代出错时也要发送结束标记，否则流水线和消费者会一直等待
+            try:
+                for item in items:
+                    queues[0].put(item)
+            except BaseException as e:
+                feed_error.append(e)
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_DONE)
+
+        feeder = threading.Thread(target=feed, name="feeder", daemon=True)
+        feeder.start()
+
+        while True:
+            output = queues[-1].get()
+            if output is _DONE:
+                break
+            yield output
+
+        feeder.join()
+        for thread in threads:
+            thread.join()
+        if feed_error:
+            # 已送入的输入都处理完后，在调用方线程重新抛出输入迭代的异常
+            raise feed_error[0]
+
+    def stats(self):
+        """所有阶段的统计列表"""
+        return [stage.stats() for stage in self.stages]
+
+    def print_summary(self):
+        """打印各阶段吞吐量表"""
+        print(f"\n{'阶段':<12}{'线程':>6}{'输入':>8}{'输出':>8}{'错误':>6}{'个/秒':>10}{'忙碌率':>10}")
+        for s in self.stats():
+            print(f"{s['stage']:<12}{s['workers']:>6}{s['items_in']:>8}{s['items_out']:>8}{s['errors']:>6}"
+                  f"{s['items_per_sec']:>10.2f}{s['utilization'] * 100:>9.1f}%")
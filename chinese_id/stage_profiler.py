@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线分阶段计时工具
+为身份证生成等热点路径提供上下文管理器计时器和计数器，按进程(worker)聚合，
+退出时打印汇总表，并可选导出 Chrome trace JSON（用 chrome://tracing 或 Perfetto 打开）。
+
+用法:
+    from stage_profiler import profiler
+
+    with profiler.stage("text_draw"):
+        ...
+    profiler.count("cards_front")
+
+启用方式:
+    - 环境变量 ID_PROFILE=1 （ID_PROFILE_TRACE=trace.json 同时导出 trace）
+    - 或在代码中调用 profiler.enable(trace_path="trace.json")
+
+未启用时 stage() 直接返回共享的空上下文对象，count() 立即返回，开销接近零。
+"""
+
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+
+class _NullStage:
+    """未启用计时时使用的空上下文"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """单次阶段计时上下文"""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class StageProfiler:
+    """
+    分阶段计时器
+
+    统计数据按 (worker, 阶段名) 聚合，worker 默认为当前进程号。
+    多进程场景下，子进程调用 snapshot() 返回可 pickle 的统计结果，
+    主进程用 merge() 合并后统一打印汇总表或导出 trace。
+    """
+
+    def __init__(self, enabled=False, trace_path=None, max_events=1_000_000):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._stats = {}      # (worker, name) -> [次数, 总耗时ns, 最大耗时ns]
+        self._counters = {}   # (worker, name) -> 累计值
+        self._events = []     # Chrome trace 事件
+        self._atexit_registered = False
+
+    @property
+    def worker(self):
+        return f"pid{os.getpid()}"
+
+    def enable(self, trace_path=None, summary_at_exit=True):
+        """
+        启用计时
+
+        Args:
+            trace_path: Chrome trace JSON 输出路径，None 表示不导出
+            summary_at_exit: 是否在进程退出时打印汇总表（并导出 trace）
+        """
+        self.enabled = True
+        if trace_path:
+            self.trace_path = trace_path
+        if summary_at_exit and not self._atexit_registered:
+            atexit.register(self._report_at_exit)
+            self._atexit_registered = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._counters.clear()
+            self._events.clear()
+
+    def stage(self, name):
+        """返回阶段计时上下文管理器"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        """累加计数器"""
+        if not self.enabled:
+            return
+        key = (self.worker, name)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def _record(self, name, start_ns, end_ns):
+        duration = end_ns - start_ns
+        key = (self.worker, name)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                self._stats[key] = [1, duration, duration]
+            else:
+                stat[0] += 1
+                stat[1] += duration
+                if duration > stat[2]:
+                    stat[2] = duration
+            if self.trace_path and len(self._events) < self.max_events:
+                self._events.append({
+                    "name": name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": start_ns / 1000.0,
+                    "dur": duration / 1000.0,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                })
+
+    def snapshot(self):
+        """
+        导出当前统计数据（可 pickle / JSON 序列化），用于跨进程汇总
+        """
+        with self._lock:
+            return {
+                "stats": [[w, n, *v] for (w, n), v in self._stats.items()],
+                "counters": [[w, n, v] for (w, n), v in self._counters.items()],
+                "events": list(self._events),
+            }
+
+    def merge(self, snapshot):
+        """合并其他进程 snapshot() 的结果"""
+        if not snapshot:
+            return
+        with self._lock:
+            for worker, name, count, total, peak in snapshot.get("stats", []):
+                stat = self._stats.get((worker, name))
+                if stat is None:
+                    self._stats[(worker, name)] = [count, total, peak]
+                else:
+                    stat[0] += count
+                    stat[1] += total
+                    stat[2] = max(stat[2], peak)
+            for worker, name, value in snapshot.get("counters", []):
+                key = (worker, name)
+                self._counters[key] = self._counters.get(key, 0) + value
+            room = self.max_events - len(self._events)
+            if room > 0:
+                self._events.extend(snapshot.get("events", [])[:room])
+
+    def stage_totals(self):
+        """
+        按阶段汇总所有 worker
+
+        Returns:
+            dict: 阶段名 -> {'count', 'total_s', 'mean_ms', 'max_ms'}
+        """
+        totals = {}
+        with self._lock:
+            for (_, name), (count, total, peak) in self._stats.items():
+                item = totals.setdefault(name, [0, 0, 0])
+                item[0] += count
+                item[1] += total
+                item[2] = max(item[2], peak)
+        return {
+            name: {
+                "count": count,
+                "total_s": total / 1e9,
+                "mean_ms": total / count / 1e6 if count else 0.0,
+                "max_ms": peak / 1e6,
+            }
+            for name, (count, total, peak) in totals.items()
+        }
+
+    def summary_table(self):
+        """生成汇总表文本：每个 worker 一节，最后是全部 worker 的合计"""
+        with self._lock:
+            stats = dict(self._stats)
+            counters = dict(self._counters)
+        if not stats and not counters:
+            return "（没有计时数据）"
+
+        lines = []
+        header = f"{'阶段':<20}{'次数':>8}{'总耗时(s)':>12}{'平均(ms)':>12}{'最大(ms)':>12}{'占比':>8}"
+        workers = sorted({w for w, _ in stats} | {w for w, _ in counters})
+        sections = [(w, {n: v for (sw, n), v in stats.items() if sw == w},
+                     {n: v for (cw, n), v in counters.items() if cw == w}) for w in workers]
+        if len(workers) > 1:
+            merged = {name: [v["count"], int(v["total_s"] * 1e9), int(v["max_ms"] * 1e6)]
+                      for name, v in self.stage_totals().items()}
+            merged_counters = {}
+            for (_, name), value in counters.items():
+                merged_counters[name] = merged_counters.get(name, 0) + value
+            sections.append(("合计", merged, merged_counters))
+
+        for worker, worker_stats, worker_counters in sections:
+            lines.append(f"[{worker}]")
+            lines.append(header)
+            grand_total = sum(v[1] for v in worker_stats.values()) or 1
+            for name, (count, total, peak) in sorted(worker_stats.items(), key=lambda kv: -kv[1][1]):
+                lines.append(
+                    f"{name:<20}{count:>8}{total / 1e9:>12.3f}{total / count / 1e6:>12.2f}"
+                    f"{peak / 1e6:>12.2f}{total / grand_total * 100:>7.1f}%"
+                )
+            for name, value in sorted(worker_counters.items()):
+                lines.append(f"  计数 {name}: {value}")
+        return "\n".join(lines)
+
+    def print_summary(self):
+        print("\n⏱️  分阶段耗时统计:")
+        print(self.summary_table())
+
+    def dump_trace(self, path=None):
+        """导出 Chrome trace JSON，返回写入路径"""
+        path = path or self.trace_path
+        if not path:
+            return None
+        with self._lock:
+            events = list(self._events)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+    def _report_at_exit(self):
+        # 子进程的数据由主进程 merge 后统一输出
+        if multiprocessing.parent_process() is not None:
+            return
+        if not (self._stats or self._counters):
+            return
+        self.print_summary()
+        if self.trace_path:
+            path = self.dump_trace()
+            print(f"📄 已导出 Chrome trace: {path}")
+
+
+# 全局实例，供各脚本直接导入使用
+profiler = StageProfiler()
+
+if os.environ.get("ID_PROFILE", "").lower() in ("1", "true", "yes"):
+    profiler.enable(trace_path=os.environ.get("ID_PROFILE_TRACE") or None)
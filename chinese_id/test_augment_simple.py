@@ -1,8 +1,7 @@
 import albumentations as A
 import cv2
 import os
-from pathlib import Path
-import numpy as np
+import image_io
 
 # 设置环境变量解决OpenMP问题
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
@@ -15,16 +14,6 @@ transform = A.Compose([
     A.ColorJitter(brightness=0.2, contrast=0.2, p=0.5),
 ])
 
-def read_image_safe(image_path):
-    """安全地读取图片"""
-    try:
-        image_data = np.fromfile(str(image_path), dtype=np.uint8)
-        image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-        return image
-    except Exception as e:
-        print(f"读取图片失败: {e}")
-        return None
-
 def test_single_image():
     """测试单张图片的增强功能"""
     
@@ -40,7 +29,7 @@ def test_single_image():
     
     # 读取图片
     print("📖 读取图片...")
-    image = read_image_safe(test_image_path)
+    image = image_io.read_image(test_image_path)
     
     if image is None:
         print("❌ 无法读取图片")
@@ -71,7 +60,7 @@ def test_single_image():
             output_filename = f"test_aug_{i+1:02d}.png"
             output_path = os.path.join(output_dir, output_filename)
             
-            success = cv2.imwrite(output_path, augmented_bgr)
+            success = image_io.write_image(output_path, augmented_bgr)
             
             if success:
                 print(f"✅ 保存成功: {output_filename}")
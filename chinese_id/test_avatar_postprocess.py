@@ -0,0 +1,59 @@
+import numpy as np
+from PIL import Image
+
+from face_gen_advanced import create_id_card_avatar, enhance_ear_clarity, fused_avatar_postprocess
+
+# 输出尺寸和允许的最大灰度差
+AVATAR_SIZE = (308, 376)
+TOLERANCE = 1
+
+
+def synthetic_images(mode):
+    """不同尺寸、亮度的合成头像原图（渐变 + 噪声，RGBA 带随机透明度）"""
+    rng = np.random.default_rng(0)
+    for width, height in [(512, 512), (512, 768), (640, 480), (300, 900)]:
+        for level in (40, 128, 230):
+            gradient = np.linspace(-40, 40, width)[None, :, None] + np.linspace(-30, 30, height)[:, None, None]
+            noise = rng.normal(0, 25, (height, width, 3))
+            rgb = np.clip(level + gradient + noise, 0, 255).astype(np.uint8)
+            image = Image.fromarray(rgb)
+            if mode == 'RGBA':
+                image.putalpha(Image.fromarray(rng.integers(0, 256, (height, width), dtype=np.uint8)))
+            elif mode == 'L':
+                image = image.convert('L')
+            yield f"{width}x{height} 亮度{level}", image
+
+
+def max_difference(a, b):
+    assert a.mode == b.mode and a.size == b.size, f"{a.mode}{a.size} != {b.mode}{b.size}"
+    return int(np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max())
+
+
+def check_mode(mode):
+    """fused 与逐步处理（及加锐化）的结果一致"""
+    for name, image in synthetic_images(mode):
+        stepwise = create_id_card_avatar(image, AVATAR_SIZE, fused=False)
+        diff = max_difference(create_id_card_avatar(image, AVATAR_SIZE, fused=True), stepwise)
+        assert diff <= TOLERANCE, f"{mode} {name}: 最大差异 {diff}"
+        diff = max_difference(fused_avatar_postprocess(image, AVATAR_SIZE, sharpen=True),
+                              enhance_ear_clarity(stepwise))
+        assert diff <= TOLERANCE, f"{mode} {name} 锐化: 最大差异 {diff}"
+    print(f"✅ {mode}: fused 与逐步处理一致")
+
+
+def test_fused_rgb():
+    check_mode('RGB')
+
+
+def test_fused_rgba():
+    check_mode('RGBA')
+
+
+def test_fused_gray():
+    check_mode('L')
+
+
+if __name__ == "__main__":
+    test_fused_rgb()
+    test_fused_rgba()
+    test_fused_gray()
@@ -2,6 +2,7 @@ import cv2
 import os
 from pathlib import Path
 import numpy as np
+import image_io
 
 def test_image_read():
     """测试图片读取功能"""
@@ -41,46 +42,37 @@ def test_image_read():
     print(f"\n🔍 测试路径: {image_path}")
     print(f"🔍 绝对路径: {os.path.abspath(image_path)}")
     
-    # 方法1: 直接cv2.imread
-    print("\n📖 方法1: cv2.imread")
-    try:
-        image1 = cv2.imread(image_path)
-        if image1 is not None:
-            print(f"✅ 成功读取，尺寸: {image1.shape}")
-        else:
-            print("❌ 读取失败")
-    except Exception as e:
-        print(f"❌ 异常: {e}")
-    
-    # 方法2: 绝对路径
-    print("\n📖 方法2: 绝对路径")
-    try:
-        abs_path = os.path.abspath(image_path)
-        image2 = cv2.imread(abs_path)
-        if image2 is not None:
-            print(f"✅ 成功读取，尺寸: {image2.shape}")
-        else:
-            print("❌ 读取失败")
-    except Exception as e:
-        print(f"❌ 异常: {e}")
-    
-    # 方法3: numpy读取
-    print("\n📖 方法3: numpy读取")
-    try:
-        image_data = np.fromfile(image_path, dtype=np.uint8)
-        image3 = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
+    # 方法1: image_io 一次读取 + 一次解码（各脚本使用的方式）
+    print("\n📖 方法1: image_io.read_image")
+    image1 = image_io.read_image(image_path)
+    if image1 is not None:
+        print(f"✅ 成功读取，尺寸: {image1.shape}")
+    else:
+        print("❌ 读取失败")
+    
+    # 方法2: 内存映射读取（大文件默认使用），结果应与方法1一致
+    print("\n📖 方法2: 内存映射")
+    image2 = image_io.read_image(image_path, use_mmap=True)
+    if image2 is not None:
+        same = image1 is not None and np.array_equal(image1, image2)
+        print(f"✅ 成功读取，尺寸: {image2.shape}，与方法1{'一致' if same else '不一致'}")
+    else:
+        print("❌ 读取失败")
+    
+    # 方法3: 缩小解码到一半尺寸以内
+    print("\n📖 方法3: 缩小解码")
+    if image1 is not None:
+        target_size = (image1.shape[1] // 2, image1.shape[0] // 2)
+        image3 = image_io.read_image(image_path, target_size=target_size)
         if image3 is not None:
-            print(f"✅ 成功读取，尺寸: {image3.shape}")
+            print(f"✅ 目标 {target_size[0]}x{target_size[1]}，尺寸: {image3.shape}")
         else:
             print("❌ 读取失败")
-    except Exception as e:
-        print(f"❌ 异常: {e}")
     
-    # 方法4: 使用Path对象
-    print("\n📖 方法4: Path对象")
+    # 方法4: 对比 cv2.imread（Windows 下中文路径通常失败，这正是使用 image_io 的原因）
+    print("\n📖 方法4: cv2.imread（对比）")
     try:
-        path_obj = Path(image_path)
-        image4 = cv2.imread(str(path_obj))
+        image4 = cv2.imread(str(Path(image_path)))
         if image4 is not None:
             print(f"✅ 成功读取，尺寸: {image4.shape}")
         else:
@@ -99,6 +91,9 @@ def test_image_read():
             print("❌ 文件不存在")
     except Exception as e:
         print(f"❌ 异常: {e}")
+    
+    print()
+    image_io.print_io_stats()
 
 if __name__ == "__main__":
     test_image_read()
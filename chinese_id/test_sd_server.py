@@ -0,0 +1,183 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from sd_backends import GenerationItem, GenerationParams, StubBackend
+from sd_server import GenerationScheduler, GenerationServer, ResultCache, SDClient, ping
+
+MODEL = "stub-model"
+PARAMS = GenerationParams(64, 48, 2, 7.5)
+
+
+def items(seeds, prompt="wooden desk"):
+    return [GenerationItem(prompt, "blurry", seed) for seed in seeds]
+
+
+def submit_concurrently(scheduler, requests):
+    """每个请求一个线程同时提交，返回与 requests 对应的结果"""
+    results = [None] * len(requests)
+
+    def run(index, model_id, request_items, params):
+        results[index] = scheduler.submit(model_id, request_items, params)
+
+    threads = [threading.Thread(target=run, args=(index, *request)) for index, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    return results
+
+
+def same_image(a, b):
+    return a.size == b.size and np.array_equal(np.asarray(a), np.asarray(b))
+
+
+def test_batching():
+    """不同连接的同参数请求合并成批次，不同参数不混在一个批次里，结果与批次组成无关"""
+    backend = StubBackend(batch_seconds=0.01)
+    scheduler = GenerationScheduler(backend, max_batch=4, batch_wait=0.2)
+    other = GenerationParams(32, 32, 2, 7.5)
+    try:
+        results = submit_concurrently(scheduler, [(MODEL, items(range(0, 3)), PARAMS),
+                                                  (MODEL, items(range(3, 6)), PARAMS),
+                                                  (MODEL, items(range(6, 8)), other)])
+    finally:
+        scheduler.close()
+
+    sizes = [size for _, size, _ in backend.calls]
+    assert sum(sizes) == 8 and max(sizes) <= 4, sizes
+    assert any(size > 1 for _, size, params in backend.calls if params == PARAMS), backend.calls
+    single = StubBackend().generate(MODEL, items([4]), PARAMS)[0]
+    assert same_image(results[1][1], single)
+    assert results[2][0].size == (32, 32)
+    stats = scheduler.snapshot()
+    assert stats["images"] == 8 and stats["mean_batch"] > 1, stats
+    print(f"✅ 批处理: 批次 {sizes}")
+
+
+def test_result_cache():
+    """相同 (提示词, 种子, 参数) 的请求直接从缓存返回，磁盘缓存在新的调度器中仍然有效，不同后端变体不共用"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        backend = StubBackend()
+        scheduler = GenerationScheduler(backend, cache=ResultCache(16, cache_dir))
+        try:
+            first = scheduler.submit(MODEL, items([1, 2]), PARAMS)
+            again = scheduler.submit(MODEL, items([1, 2]), PARAMS)
+        finally:
+            scheduler.close()
+        assert len(backend.calls) == 1 and scheduler.snapshot()["cache_hits"] == 2
+        assert all(same_image(a, b) for a, b in zip(first, again))
+
+        backend = StubBackend()
+        scheduler = GenerationScheduler(backend, cache=ResultCache(16, cache_dir))
+        try:
+            from_disk = scheduler.submit(MODEL, items([1]), PARAMS)
+        finally:
+            scheduler.close()
+        assert not backend.calls and same_image(from_disk[0], first[0])
+
+        backend = StubBackend()
+        backend.variant = "cuda/torch.float16"
+        scheduler = GenerationScheduler(backend, cache=ResultCache(16, cache_dir))
+        try:
+            scheduler.submit(MODEL, items([1]), PARAMS)
+        finally:
+            scheduler.close()
+        assert len(backend.calls) == 1
+    print("✅ 结果缓存: 内存和磁盘命中，按后端变体区分")
+
+
+def test_prompt_embedding_cache():
+    """提示词编码按 (模型, 提示词) 只计算一次，磁盘缓存在新的后端中命中"""
+    with tempfile.TemporaryDirectory() as embed_dir:
+        backend = StubBackend(embed_cache_dir=embed_dir)
+        backend.generate(MODEL, items(range(4)) + items(range(4), prompt="marble"), PARAMS)
+        stats = backend.embeds.snapshot()
+        assert stats["misses"] == 3, stats    # wooden desk、marble、blurry
+
+        backend = StubBackend(embed_cache_dir=embed_dir)
+        backend.generate(MODEL, items([0]), PARAMS)
+        stats = backend.embeds.snapshot()
+        assert stats["misses"] == 0 and stats["disk_hits"] == 2, stats
+    print("✅ 提示词编码缓存: 内存和磁盘命中")
+
+
+def test_concurrent_load():
+    """同时加载同一个新模型只加载一次"""
+    backend = StubBackend(load_seconds=0.2)
+    threads = [threading.Thread(target=backend.load, args=(MODEL,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.loads == [MODEL], backend.loads
+    print("✅ 并发加载: 模型只加载一次")
+
+
+def test_shutdown_fails_queued():
+    """停止调度器时，队列中等待的请求以错误结束而不是一直阻塞"""
+    backend = StubBackend(batch_seconds=0.05)
+    scheduler = GenerationScheduler(backend, max_batch=1, batch_wait=0)
+    errors = []
+
+    def run(seed):
+        try:
+            scheduler.submit(MODEL, items([seed]), PARAMS)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run, args=(seed,)) for seed in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    scheduler.close()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+    assert errors and len(errors) + len(backend.calls) == 5, (errors, backend.calls)
+    print(f"✅ 停止: {len(errors)} 个排队中的请求返回错误")
+
+
+def test_server_roundtrip():
+    """通过套接字生成、认证失败的连接被拒绝、shutdown 后服务退出"""
+    with tempfile.TemporaryDirectory() as tmp:
+        address = ("127.0.0.1", 0) if sys.platform == "win32" else os.path.join(tmp, "sd.sock")
+        if sys.platform == "win32":
+            import socket
+            with socket.socket() as probe:
+                probe.bind(address)
+                address = probe.getsockname()
+        authkey = os.urandom(16).hex().encode("ascii")
+        server = GenerationServer(StubBackend(), address, max_batch=4, preload=[MODEL], authkey=authkey)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        for _ in range(100):
+            if ping(address, authkey):
+                break
+            time.sleep(0.05)
+
+        assert not ping(address, b"wrong key")
+        client = SDClient(address, authkey)
+        try:
+            images = client.generate(MODEL, items([7, 8]), PARAMS)
+            assert same_image(images[0], StubBackend().generate(MODEL, items([7]), PARAMS)[0])
+            assert client.stats()["images"] == 2
+            client.shutdown()
+        finally:
+            client.close()
+        thread.join(10)
+        assert not thread.is_alive()
+    print("✅ 服务: 生成、认证、停止")
+
+
+if __name__ == "__main__":
+    test_batching()
+    test_result_cache()
+    test_prompt_embedding_cache()
+    test_concurrent_load()
+    test_shutdown_fails_queued()
+    test_server_roundtrip()
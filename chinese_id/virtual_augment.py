@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+虚拟增强数据集
+不把增强版本写成 PNG，只在清单（manifest）里记录每个版本的来源图片、随机种子和采样到的变换参数，
+需要时由加载器按种子重新生成，与 batch_augment.py --engine albumentations 在相同种子下写出的图片逐像素一致。
+
+清单里的参数来自 albumentations 的 ReplayCompose，只保留标量和小数组（旋转角度、亮度系数、
+模糊核等），GaussNoise 的整幅噪声图这类大数组由种子重新生成，不写入清单。
+加载时可以用 verify=True 对比重新采样的参数和清单记录，发现库版本变化导致的不一致。
+清单同时记录每张源图片的大小、修改时间和内容哈希（与 batch_augment.py 的 .augment_manifest.json 相同），
+读取源图片时核对，源图片被替换后不会悄悄生成与清单不符的图片。
+
+用法:
+    python virtual_augment.py build --input chinese_ids --manifest augment_manifest.json
+    python virtual_augment.py materialize --manifest augment_manifest.json --output chinese_ids_augmented
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import albumentations as A
+import cv2
+import numpy as np
+
+import augment_registry
+import batch_augment
+import image_io
+import quality_presets
+
+MANIFEST_VERSION = 2
+
+# 清单中保留的数组最大元素数，超过的参数由种子重新生成
+MAX_ARRAY_SIZE = 16
+
+
+def _compact_value(value):
+    if isinstance(value, np.ndarray):
+        if value.size > MAX_ARRAY_SIZE:
+            return None
+        return np.round(value.astype(float), 6).tolist()
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, (int, str, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        items = [_compact_value(v) for v in value]
+        return None if any(v is None and o is not None for v, o in zip(items, value)) else items
+    if isinstance(value, dict):
+        return compact_params_dict(value)
+    return None
+
+
+def compact_params_dict(params):
+    """去掉大数组和不可序列化的值"""
+    compact = {}
+    for key, value in params.items():
+        if key == "shape":
+            continue
+        value = _compact_value(value)
+        if value is not None:
+            compact[key] = value
+    return compact
+
+
+def compact_replay(replay):
+    """
+    把 ReplayCompose 的回放记录压缩成 [{'transform', 'params'}, ...]，只保留实际应用的变换
+    """
+    applied = []
+    for transform in replay["transforms"]:
+        if transform.get("transforms"):
+            applied.extend(compact_replay(transform))
+        elif transform.get("applied"):
+            name = transform["__class_fullname__"].rsplit(".", 1)[-1]
+            applied.append({"transform": name, "params": compact_params_dict(transform.get("params") or {})})
+    return applied
+
+
+def build_replay_pipeline(name=batch_augment.DEFAULT_PIPELINE):
+    """注册表中的管道，包装成 ReplayCompose 以记录采样参数"""
+    return A.ReplayCompose(augment_registry.registry.compile(name).transforms)
+
+
+def sample_variant(pipeline, image_rgb, seed):
+    """按种子执行一次增强，返回 (增强图片, 压缩后的参数)"""
+    batch_augment.seed_transform(pipeline, seed)
+    result = pipeline(image=image_rgb)
+    return result["image"], compact_replay(result["replay"])
+
+
+def source_record(image_file):
+    """源图片的文件大小、修改时间和内容哈希"""
+    stat = image_file.stat()
+    return {"file_size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": batch_augment.file_hash(image_file)}
+
+
+def iter_source_images(input_path, max_users=None):
+    """按名称顺序遍历 用户目录/图片"""
+    person_dirs = sorted(d for d in input_path.iterdir() if d.is_dir())
+    if max_users is not None:
+        person_dirs = person_dirs[:max_users]
+    for person_dir in person_dirs:
+        for image_file in sorted(person_dir.iterdir()):
+            if image_file.suffix.lower() in batch_augment.IMAGE_SUFFIXES:
+                yield person_dir, image_file
+
+
+def build_manifest(input_dir, manifest_path, num_augmentations=3, seed=0, max_users=None,
+                   pipeline_name=batch_augment.DEFAULT_PIPELINE):
+    """
+    扫描源图片，采样每个增强版本的参数并写入清单
+
+    Args:
+        input_dir: 身份证图片根目录（chinese_ids）
+        manifest_path: 清单输出路径
+        num_augmentations: 每张图片的增强版本数量
+        seed: 基础随机种子（与 batch_augment.py --seed 一致）
+        max_users: 最多处理的用户数量
+        pipeline_name: augment_pipelines.json 中的管道名称
+
+    Returns:
+        dict: 清单内容
+    """
+    input_path = Path(input_dir)
+    pipeline = build_replay_pipeline(pipeline_name)
+    images = []
+    start = time.time()
+
+    for person_dir, image_file in iter_source_images(input_path, max_users):
+        image = image_io.read_image(image_file)
+        if image is None:
+            print(f"   ❌ 无法读取图片 {person_dir.name}/{image_file.name}")
+            continue
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        variants = []
+        for j in range(1, num_augmentations + 1):
+            variant_seed = batch_augment.variant_seed(seed, person_dir.name, image_file.name, j)
+            _, params = sample_variant(pipeline, image_rgb, variant_seed)
+            variants.append({"index": j, "seed": variant_seed, "params": params})
+
+        images.append({
+            "source": image_file.relative_to(input_path).as_posix(),
+            "size": [image.shape[1], image.shape[0]],
+            **source_record(image_file),
+            "variants": variants,
+        })
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "pipeline": pipeline_name,
+        "albumentations": A.__version__,
+        "quality": quality_presets.get_preset().name,
+        "seed": seed,
+        "num_augmentations": num_augmentations,
+        "source_root": os.path.abspath(input_dir),
+        "images": images,
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+
+    total = sum(len(entry["variants"]) for entry in images)
+    print(f"📄 清单已写入: {manifest_path}（{len(images)} 张源图，{total} 个增强版本，"
+          f"{os.path.getsize(manifest_path) / 1024:.1f} KB，耗时 {time.time() - start:.1f}s）")
+    return manifest
+
+
+class VirtualAugmentedDataset:
+    """
+    按清单按需生成增强图片的数据集
+
+    Args:
+        manifest_path: build_manifest 写出的清单
+        source_root: 源图片根目录，None 表示使用清单中记录的目录
+        verify: 生成时对比重新采样的参数和清单记录，不一致时抛出 ValueError
+        cache_sources: 缓存解码后的源图片（同一源图片的多个版本只解码一次）
+    """
+
+    def __init__(self, manifest_path, source_root=None, verify=False, cache_sources=True):
+        with open(manifest_path, encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"不支持的清单版本: {self.manifest.get('version')}")
+        if self.manifest.get("albumentations") != A.__version__:
+            print(f"⚠️  清单由 albumentations {self.manifest.get('albumentations')} 生成，"
+                  f"当前为 {A.__version__}，生成结果可能不同（可用 verify=True 检查）")
+
+        self.source_root = Path(source_root or self.manifest["source_root"])
+        self.verify = verify
+        self.cache_sources = cache_sources
+        self._index = [(entry, variant) for entry in self.manifest["images"] for variant in entry["variants"]]
+        self._entries = {entry["source"]: entry for entry in self.manifest["images"]}
+        self._checked = set()
+        self._sources = {}
+        self._pipeline = None
+
+    def __len__(self):
+        return len(self._index)
+
+    def _pipeline_for_manifest(self):
+        if self._pipeline is None:
+            # 插值方式等参数跟随生成清单时的质量档位
+            previous = quality_presets.get_preset().name
+            quality_presets.set_preset(self.manifest.get("quality", previous))
+            try:
+                self._pipeline = build_replay_pipeline(self.manifest["pipeline"])
+            finally:
+                quality_presets.set_preset(previous)
+        return self._pipeline
+
+    def check_source(self, source):
+        """
+        核对源图片与清单记录一致：大小和修改时间未变时直接通过，否则比较内容哈希
+
+        Raises:
+            ValueError: 源图片内容与生成清单时不同
+        """
+        if source in self._checked:
+            return
+        path = self.source_root / source
+        entry = self._entries[source]
+        stat = path.stat()
+        if (stat.st_size, stat.st_mtime_ns) != (entry["file_size"], entry["mtime_ns"]) \
+                and batch_augment.file_hash(path) != entry["hash"]:
+            raise ValueError(f"源图片 {source} 在生成清单后被修改，请重新运行 build")
+        self._checked.add(source)
+
+    def load_source(self, source):
+        """读取源图片（RGB），首次读取时核对内容与清单一致"""
+        image_rgb = self._sources.get(source)
+        if image_rgb is None:
+            self.check_source(source)
+            image = image_io.read_image(self.source_root / source)
+            if image is None:
+                raise IOError(f"无法读取源图片: {self.source_root / source}")
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            if self.cache_sources:
+                self._sources = {source: image_rgb}  # 清单按源图片顺序排列，只保留最近一张
+        return image_rgb
+
+    def __getitem__(self, i):
+        """
+        生成第 i 个增强版本
+
+        Returns:
+            tuple: (RGB 图片, 元数据 {'source', 'index', 'seed'})
+        """
+        entry, variant = self._index[i]
+        image, params = sample_variant(self._pipeline_for_manifest(), self.load_source(entry["source"]),
+                                       variant["seed"])
+        if self.verify and params != variant["params"]:
+            raise ValueError(f"{entry['source']} 版本 {variant['index']} 的变换参数与清单不一致")
+        return image, {"source": entry["source"], "index": variant["index"], "seed": variant["seed"]}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def output_name(self, meta):
+        """与 batch_augment.py 一致的相对输出路径"""
+        source = Path(meta["source"])
+        return source.parent / f"{source.stem}_aug_{meta['index']:02d}.png"
+
+    def materialize(self, output_dir, limit=None):
+        """把增强版本写成 PNG（与 batch_augment.py 的目录结构相同），返回写出数量"""
+        output_path = Path(output_dir)
+        written = 0
+        for i in range(len(self) if limit is None else min(limit, len(self))):
+            image, meta = self[i]
+            target = output_path / self.output_name(meta)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if batch_augment.save_image_safe(cv2.cvtColor(image, cv2.COLOR_RGB2BGR), str(target)):
+                written += 1
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="虚拟增强数据集（只记录参数，按需生成）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="扫描源图片并写入增强清单")
+    build.add_argument("--input", default="chinese_ids", help="身份证图片根目录")
+    build.add_argument("--manifest", default="augment_manifest.json", help="清单输出路径")
+    build.add_argument("--num-augmentations", type=int, default=3)
+    build.add_argument("--seed", type=int, default=0)
+    build.add_argument("--max-users", type=int)
+    build.add_argument("--quality", choices=list(quality_presets.PRESETS))
+    build.add_argument("--pipeline", default=batch_augment.DEFAULT_PIPELINE, help="增强管道名称")
+
+    materialize = subparsers.add_parser("materialize", help="按清单生成增强图片")
+    materialize.add_argument("--manifest", default="augment_manifest.json")
+    materialize.add_argument("--source-root", help="源图片根目录（默认使用清单记录的目录）")
+    materialize.add_argument("--output", required=True, help="输出目录")
+    materialize.add_argument("--limit", type=int, help="最多生成的数量")
+    materialize.add_argument("--verify", action="store_true", help="检查重新采样的参数与清单一致")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        if args.quality:
+            quality_presets.set_preset(args.quality)
+        build_manifest(args.input, args.manifest, args.num_augmentations, args.seed, args.max_users, args.pipeline)
+    else:
+        dataset = VirtualAugmentedDataset(args.manifest, args.source_root, verify=args.verify)
+        start = time.time()
+        written = dataset.materialize(args.output, args.limit)
+        print(f"✅ 生成 {written}/{len(dataset)} 张增强图片到 {args.output}，耗时 {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
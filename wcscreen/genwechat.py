@@ -4,9 +4,17 @@ import math
 from datetime import datetime, timedelta
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import os
+import sys
 import requests
 from io import BytesIO
 
+# 字体解析器与身份证生成共用，位于 chinese_id 目录
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "chinese_id"))
+import font_resolver
+
+# 微信截图优先使用的字体（微软雅黑可能有权限问题，排在后面）
+WECHAT_PREFERRED_FONTS = ["simhei.ttf", "simsun.ttc"] + font_resolver.DEFAULT_PREFERRED_FONTS
+
 class WeChatScreenshotGenerator:
     def __init__(self, width=750, height=1334):
         # 微信风格颜色
@@ -25,32 +33,9 @@ class WeChatScreenshotGenerator:
         self.height = height
         self.image = Image.new("RGB", (width, height), self.colors["background"])
         self.draw = ImageDraw.Draw(self.image)
-        # 尝试多个字体路径
-        font_paths = [
-            # r"C:\Windows\Fonts\msyh.ttf",  # 微软雅黑 - 注释掉，避免权限问题
-            r"C:\Windows\Fonts\simhei.ttf",  # 黑体
-            r"C:\Windows\Fonts\simsun.ttc",  # 宋体
-            r"C:\Windows\Fonts\arial.ttf"   # Arial
-        ]
-        
-        font_loaded = False
-        for font_path in font_paths:
-            try:
-                self.font = ImageFont.truetype(font_path, 18)
-                self.name_font = ImageFont.truetype(font_path, 16)
-                self.time_font = ImageFont.truetype(font_path, 14)
-                print(f"成功加载字体: {font_path}")
-                font_loaded = True
-                break
-            except Exception as e:
-                print(f"尝试加载字体 {font_path} 失败: {e}")
-                continue
-        
-        if not font_loaded:
-            print("所有字体加载失败，使用默认字体")
-            self.font = ImageFont.load_default()
-            self.name_font = ImageFont.load_default()
-            self.time_font = ImageFont.load_default()
+        # 通过共享字体解析器加载字体（结果按进程缓存，重复创建生成器不再重新搜索）
+        self.font, self.name_font, self.time_font = font_resolver.load_fonts(
+            (18, 16, 14), preferred=WECHAT_PREFERRED_FONTS)
         
         # 聊天内容库
         self.messages = [